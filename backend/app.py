@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify, send_from_directory, Response, stream_with_context
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
 from werkzeug.exceptions import RequestEntityTooLarge
@@ -6,18 +6,39 @@ import os
 import uuid
 from datetime import datetime
 from PIL import Image
+import io
 import json
 import base64
+import hashlib
+import unicodedata
 import threading
+import time
+import zipfile
+import math
+import re
+import statistics
+import queue
+import atexit
+import sqlite3
+import gzip
+import shutil
+import heapq
+import itertools
+import random
+import asyncio
+from collections import deque, namedtuple, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
 import yaml
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import (OpenAI, AsyncOpenAI, DefaultAsyncHttpxClient, DEFAULT_CONNECTION_LIMITS,
+                    RateLimitError, InternalServerError, APIConnectionError)
 
 # Load environment variables
 load_dotenv()
 
-# Initialize OpenAI client
-client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+# Initialize OpenAI client (OPENAI_BASE_URL points it at a local stand-in server for testing)
+client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'), base_url=os.getenv('OPENAI_BASE_URL') or None)
 
 # Agent configuration - maps agent names to their prompt files
 AGENT_PROMPTS = {
@@ -25,19 +46,172 @@ AGENT_PROMPTS = {
     'spelling': 'prompts/spelling.txt'
 }
 
+# Compact prompts for the json_schema output format, where the schema replaces the YAML template
+AGENT_JSON_PROMPTS = {
+    'missing_ovals': 'prompts/missing_ovals_json.txt',
+    'spelling': 'prompts/spelling_json.txt'
+}
+OUTPUT_FORMATS = ('yaml', 'json_schema')
+
+# Spelling engines: compare (the model checks names against the contest list) or
+# transcribe (the model only reads the names; match_transcription compares them)
+SPELLING_TRANSCRIBE_PROMPT = 'prompts/spelling_transcribe.txt'
+
+# Model and request parameters shared by all agents
+AGENT_MODEL = 'gpt-4o'
+AGENT_REQUEST_PARAMS = {
+    'max_tokens': 1500,
+    'temperature': 0.1  # Low temperature for consistent analysis
+}
+
 # OpenAI Session Logging
-OPENAI_SESSIONS_DIR = os.path.join(os.path.dirname(__file__), 'openai-sessions')
+OPENAI_SESSIONS_DIR = os.getenv('OPENAI_SESSIONS_DIR', os.path.join(os.path.dirname(__file__), 'openai-sessions'))
 os.makedirs(OPENAI_SESSIONS_DIR, exist_ok=True)
 
+def finding_list_schema(properties):
+    """JSON schema for a list of findings whose fields are all strings"""
+    return {
+        'type': 'array',
+        'items': {
+            'type': 'object',
+            'properties': properties,
+            'required': list(properties),
+            'additionalProperties': False
+        }
+    }
+
+def agent_response_schema(finding_key, finding_properties):
+    """JSON schema for an agent's answer, mirroring what convert_yaml_to_findings reads"""
+    return {
+        'type': 'object',
+        'properties': {
+            'findings': {
+                'type': 'object',
+                'properties': {
+                    finding_key: finding_list_schema(finding_properties),
+                    'other_issues': finding_list_schema({
+                        'description': {'type': 'string'},
+                        'type': {'type': 'string', 'enum': ['formatting', 'layout', 'other']}
+                    })
+                },
+                'required': [finding_key, 'other_issues'],
+                'additionalProperties': False
+            },
+            'summary': {'type': 'string'},
+            'analysis_status': {'type': 'string', 'enum': ['no_issues_found', 'completed']},
+            # Strict schemas cannot leave a field out, so optional prose is nullable instead
+            'notes': {'type': ['string', 'null']}
+        },
+        'required': ['findings', 'summary', 'analysis_status', 'notes'],
+        'additionalProperties': False
+    }
+
+CONFIDENCE_SCHEMA = {'type': 'string', 'enum': ['high', 'medium', 'low']}
+AGENT_RESPONSE_SCHEMAS = {
+    'missing_ovals': agent_response_schema('missing_ovals', {
+        'description': {'type': 'string'},
+        'candidate': {'type': 'string'},
+        'contest': {'type': 'string'},
+        'confidence': CONFIDENCE_SCHEMA
+    }),
+    'spelling': agent_response_schema('spelling_errors', {
+        'description': {'type': 'string'},
+        'candidate_found': {'type': 'string'},
+        'candidate_expected': {'type': 'string'},
+        'contest': {'type': 'string'},
+        'confidence': CONFIDENCE_SCHEMA
+    })
+}
+
+# What the transcribe engine asks for: each contest's names exactly as printed
+TRANSCRIPTION_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'contests': {
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'properties': {
+                    'title': {'type': 'string'},
+                    'candidates': {'type': 'array', 'items': {'type': 'string'}}
+                },
+                'required': ['title', 'candidates'],
+                'additionalProperties': False
+            }
+        }
+    },
+    'required': ['contests'],
+    'additionalProperties': False
+}
+
+def transcribes_names(agent_name):
+    """Whether the agent's requests only transcribe names (spelling agent under SPELLING_ENGINE=transcribe)"""
+    return agent_name == 'spelling' and app.config['SPELLING_ENGINE'] == 'transcribe'
+
+def agent_request_params(agent_name, output_format=None):
+    """
+    Chat completion parameters for one agent
+
+    Args:
+        agent_name: The agent the request is for
+        output_format: 'yaml' or 'json_schema' (defaults to AGENT_OUTPUT_FORMAT;
+            naming one asks for the compare engine's request)
+
+    Returns:
+        AGENT_REQUEST_PARAMS, plus the agent's response_format and the smaller
+        completion budget in json_schema mode, or the transcription schema and
+        budget when the spelling agent transcribes
+    """
+    if output_format is None and transcribes_names(agent_name):
+        return {
+            **AGENT_REQUEST_PARAMS,
+            'max_tokens': app.config['TRANSCRIBE_MAX_TOKENS'],
+            'response_format': {
+                'type': 'json_schema',
+                'json_schema': {'name': 'spelling_transcription', 'strict': True, 'schema': TRANSCRIPTION_SCHEMA}
+            }
+        }
+    if (output_format or app.config['AGENT_OUTPUT_FORMAT']) != 'json_schema':
+        return AGENT_REQUEST_PARAMS
+    return {
+        **AGENT_REQUEST_PARAMS,
+        'max_tokens': app.config['JSON_OUTPUT_MAX_TOKENS'],
+        'response_format': {
+            'type': 'json_schema',
+            'json_schema': {
+                'name': f'{agent_name}_findings',
+                'strict': True,
+                'schema': AGENT_RESPONSE_SCHEMAS[agent_name]
+            }
+        }
+    }
+
+def agent_prompt_file(agent_name, output_format=None):
+    """
+    Prompt file for an agent in the given output format (defaults to AGENT_OUTPUT_FORMAT,
+    or the transcription prompt when the spelling agent transcribes)
+
+    Raises:
+        KeyError: If agent_name not in AGENT_PROMPTS
+    """
+    if agent_name not in AGENT_PROMPTS:
+        raise KeyError(f"Unknown agent: {agent_name}. Available agents: {list(AGENT_PROMPTS.keys())}")
+    if output_format is None and transcribes_names(agent_name):
+        return SPELLING_TRANSCRIBE_PROMPT
+    if (output_format or app.config['AGENT_OUTPUT_FORMAT']) == 'json_schema':
+        return AGENT_JSON_PROMPTS[agent_name]
+    return AGENT_PROMPTS[agent_name]
+
 # Prompt loading cache
 _prompt_cache = {}
 
-def load_agent_prompt(agent_name, **kwargs):
+def load_agent_prompt(agent_name, output_format=None, **kwargs):
     """
     Load prompt for a specific agent from file
     
     Args:
         agent_name: The name of the agent ('missing_ovals', 'spelling', etc.)
+        output_format: 'yaml' or 'json_schema' (defaults to AGENT_OUTPUT_FORMAT)
         **kwargs: Variables to format into the prompt template
         
     Returns:
@@ -47,10 +221,7 @@ def load_agent_prompt(agent_name, **kwargs):
         FileNotFoundError: If prompt file doesn't exist
         KeyError: If agent_name not in AGENT_PROMPTS
     """
-    if agent_name not in AGENT_PROMPTS:
-        raise KeyError(f"Unknown agent: {agent_name}. Available agents: {list(AGENT_PROMPTS.keys())}")
-    
-    prompt_file = AGENT_PROMPTS[agent_name]
+    prompt_file = agent_prompt_file(agent_name, output_format)
     
     # Use cache if available
     if prompt_file not in _prompt_cache:
@@ -69,6 +240,10 @@ def load_agent_prompt(agent_name, **kwargs):
     else:
         return prompt_template
 
+def prompt_sha256(agent_name):
+    """Content hash of an agent's prompt template, so edited prompts invalidate cached results"""
+    return hashlib.sha256(load_agent_prompt(agent_name).encode('utf-8')).hexdigest()
+
 def log_openai_session(job_id, event_type, data, error=None):
     """
     Log OpenAI API interactions to a job-specific file
@@ -79,8 +254,6 @@ def log_openai_session(job_id, event_type, data, error=None):
         data: The data to log (request payload, response content, etc.)
         error: Optional error information
     """
-    log_file = os.path.join(OPENAI_SESSIONS_DIR, f"{job_id}.log")
-    
     timestamp = datetime.now().isoformat()
     log_entry = {
         'timestamp': timestamp,
@@ -93,10 +266,8 @@ def log_openai_session(job_id, event_type, data, error=None):
         log_entry['error'] = error
     
     try:
-        # Use append mode with explicit line separator for thread safety
-        with open(log_file, 'a', encoding='utf-8') as f:
-            f.write(json.dumps(log_entry, indent=2, ensure_ascii=False))
-            f.write('\n---\n')  # Separator between entries
+        # Serialize now (callers may keep mutating data); the file write happens on the writer thread
+        session_logger.write(job_id, json.dumps(log_entry, ensure_ascii=False))
         
     except Exception as e:
         # Fallback logging to prevent crashes
@@ -174,6 +345,329 @@ def log_openai_response(job_id, response):
         # Fallback to raw response logging
         log_openai_session(job_id, 'response', str(response), error=str(e))
 
+class SessionLogWriter:
+    """
+    Background writer for the per-job session logs
+
+    Callers only enqueue one compact JSON line per event. A single writer thread
+    drains the queue, appends each batch to the right files and flushes once per
+    batch, keeping a bounded LRU of open file handles so busy jobs are not
+    reopened for every event.
+    """
+
+    def __init__(self, log_dir, max_open_files=64, queue_size=10000):
+        self.log_dir = log_dir
+        self.max_open_files = max_open_files
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._handles = OrderedDict()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+        self.events_written = 0
+        self.batches_written = 0
+        self.write_errors = 0
+        self.handle_opens = 0
+
+    def write(self, job_id, line):
+        """Queue one JSON line for a job's log (blocks only when the queue is full)"""
+        if self._closed:
+            raise RuntimeError('Session logger is closed')
+        self._ensure_thread()
+        self._queue.put(('write', job_id, line))
+
+    def flush(self, timeout=5):
+        """Wait until everything queued so far is on disk"""
+        self._control('flush', None, timeout)
+
+    def release(self, job_id, timeout=5):
+        """Flush and close a job's log so the file can be moved or deleted"""
+        self._control('release', job_id, timeout)
+
+    def close(self, timeout=5):
+        """Flush everything, close all files and stop the writer thread"""
+        if self._closed:
+            return
+        self._control('close', None, timeout)
+        self._closed = True
+
+    def stats(self):
+        with self._lock:
+            return {
+                'queued_events': self._queue.qsize(),
+                'open_files': len(self._handles),
+                'events_written': self.events_written,
+                'batches_written': self.batches_written,
+                'handle_opens': self.handle_opens,
+                'write_errors': self.write_errors
+            }
+
+    def _control(self, action, job_id, timeout):
+        if self._thread is None or not self._thread.is_alive():
+            # Nothing has been written yet, or the writer is gone; nothing to wait for
+            if action != 'flush':
+                self._close_handles(job_id if action == 'release' else None)
+            return
+        done = threading.Event()
+        self._queue.put((action, job_id, done))
+        done.wait(timeout)
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True, name='session-logger')
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            # Take whatever else is already waiting, so one flush covers many events
+            while len(batch) < 1000:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            lines_by_job = OrderedDict()
+            stop = False
+            for action, job_id, payload in batch:
+                if action == 'write':
+                    lines_by_job.setdefault(job_id, []).append(payload)
+                    continue
+                # Control messages apply after the writes queued before them
+                self._write_lines(lines_by_job)
+                lines_by_job = OrderedDict()
+                if action == 'release':
+                    self._close_handles(job_id)
+                elif action == 'close':
+                    self._close_handles()
+                    stop = True
+                payload.set()
+            self._write_lines(lines_by_job)
+            if stop:
+                return
+
+    def _write_lines(self, lines_by_job):
+        if not lines_by_job:
+            return
+        for job_id, lines in lines_by_job.items():
+            try:
+                handle = self._handle(job_id)
+                handle.write('\n'.join(lines))
+                handle.write('\n')
+                handle.flush()
+                written = len(lines)
+            except Exception as e:
+                print(f"Failed to log OpenAI session for job {job_id}: {e}")
+                self._close_handles(job_id)
+                written = 0
+            with self._lock:
+                self.events_written += written
+                self.write_errors += len(lines) - written
+        with self._lock:
+            self.batches_written += 1
+
+    def _handle(self, job_id):
+        with self._lock:
+            handle = self._handles.get(job_id)
+            if handle is not None:
+                self._handles.move_to_end(job_id)
+                return handle
+        handle = open(os.path.join(self.log_dir, f"{job_id}.log"), 'a', encoding='utf-8')
+        with self._lock:
+            self._handles[job_id] = handle
+            self.handle_opens += 1
+            evicted = []
+            while len(self._handles) > self.max_open_files:
+                evicted.append(self._handles.popitem(last=False)[1])
+        for old in evicted:
+            old.close()
+        return handle
+
+    def _close_handles(self, job_id=None):
+        with self._lock:
+            if job_id is None:
+                handles = list(self._handles.values())
+                self._handles.clear()
+            else:
+                handles = [self._handles.pop(job_id)] if job_id in self._handles else []
+        for handle in handles:
+            try:
+                handle.close()
+            except OSError:
+                pass
+
+def parse_session_log(log_content):
+    """
+    Split a session log into its entries
+
+    Logs are JSON lines; older logs hold indented JSON entries separated by
+    `---` lines, and a log may contain both. Unparseable entries are kept as
+    {'raw': text}.
+    """
+    log_entries = []
+    for chunk in log_content.split('\n---\n'):
+        chunk = chunk.strip()
+        if not chunk:
+            continue
+        try:
+            log_entries.append(json.loads(chunk))
+            continue
+        except json.JSONDecodeError:
+            pass
+        for line in chunk.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                log_entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                log_entries.append({'raw': line})
+    return log_entries
+
+# Leading fields of a log entry, read without parsing the (possibly very large) rest of it
+JSONL_ENTRY_HEAD = re.compile(rb'^\{"timestamp": "([^"]*)", "job_id": "[^"]*", "event_type": "([^"]*)"')
+LEGACY_ENTRY_FIELD = re.compile(rb'^  "(timestamp|event_type)": "([^"]*)"')
+
+LogEntryRef = namedtuple('LogEntryRef', ['source', 'offset', 'length', 'event_type', 'timestamp'])
+
+class SessionLogIndex:
+    """
+    Byte-offset index of the entries in each job's session log
+
+    The plain log is indexed incrementally: each request only scans the bytes
+    appended since the last one. A compressed (.gz) part is indexed once per
+    version of the archive. Entries are then read individually by seeking, so
+    a page of a large log never loads the rest of it. Indexes are kept for the
+    most recently used logs only.
+    """
+
+    def __init__(self, log_dir, max_logs=128):
+        self.log_dir = log_dir
+        self.max_logs = max_logs
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def entries(self, job_id):
+        """
+        Refresh and return the index of a job's log
+
+        Returns:
+            List of LogEntryRef in log order, or None if the job has no log
+        """
+        log_file = os.path.join(self.log_dir, f"{job_id}.log")
+        with self._lock:
+            index = self._indexes.pop(job_id, None) or {'gz': None, 'gz_entries': [], 'log': None, 'log_entries': []}
+            self._indexes[job_id] = index
+            while len(self._indexes) > self.max_logs:
+                self._indexes.popitem(last=False)
+
+            gz_stat = self._stat(log_file + '.gz')
+            if gz_stat is None:
+                index['gz'], index['gz_entries'] = None, []
+            elif gz_stat != index['gz']:
+                with gzip.open(log_file + '.gz', 'rb') as f:
+                    index['gz_entries'], _ = self._scan(f, 'gz', 0)
+                index['gz'] = gz_stat
+
+            log_stat = self._stat(log_file)
+            if log_stat is None:
+                index['log'], index['log_entries'] = None, []
+            else:
+                indexed_to = index['log'] or 0
+                if log_stat[0] < indexed_to:
+                    # The file was replaced (compressed away and started again)
+                    index['log_entries'], indexed_to = [], 0
+                if log_stat[0] > indexed_to:
+                    with open(log_file, 'rb') as f:
+                        f.seek(indexed_to)
+                        new_entries, indexed_to = self._scan(f, 'log', indexed_to)
+                    index['log_entries'].extend(new_entries)
+                index['log'] = indexed_to
+
+            if gz_stat is None and log_stat is None:
+                del self._indexes[job_id]
+                return None
+            return index['gz_entries'] + index['log_entries']
+
+    def read(self, job_id, refs):
+        """Parse the given entries of a job's log"""
+        log_file = os.path.join(self.log_dir, f"{job_id}.log")
+        entries = []
+        handles = {}
+        try:
+            for ref in refs:
+                if ref.source not in handles:
+                    handles[ref.source] = gzip.open(log_file + '.gz', 'rb') if ref.source == 'gz' \
+                        else open(log_file, 'rb')
+                handle = handles[ref.source]
+                handle.seek(ref.offset)
+                raw = handle.read(ref.length).decode('utf-8', errors='replace')
+                try:
+                    entries.append(json.loads(raw))
+                except json.JSONDecodeError:
+                    # Keep malformed entries as raw text
+                    entries.append({'raw': raw.strip()})
+        finally:
+            for handle in handles.values():
+                handle.close()
+        return entries
+
+    def forget(self, job_id):
+        with self._lock:
+            self._indexes.pop(job_id, None)
+
+    def _stat(self, path):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_size, stat.st_mtime_ns)
+
+    def _scan(self, f, source, offset):
+        """
+        Index the complete entries readable from f, starting at byte `offset`
+
+        Returns:
+            Tuple of (entries, offset just past the last complete entry)
+        """
+        entries = []
+        indexed_to = offset
+        legacy = None
+        for line in f:
+            line_start = offset
+            offset += len(line)
+            if not line.endswith(b'\n'):
+                # An entry still being written; pick it up next time
+                break
+            if legacy is not None:
+                if line == b'---\n':
+                    entries.append(LogEntryRef(source, legacy['offset'], line_start - legacy['offset'],
+                                               legacy.get('event_type'), legacy.get('timestamp')))
+                    legacy = None
+                    indexed_to = offset
+                else:
+                    match = LEGACY_ENTRY_FIELD.match(line)
+                    if match:
+                        legacy.setdefault(match.group(1).decode(), match.group(2).decode())
+                continue
+            if line.rstrip() == b'{':
+                legacy = {'offset': line_start}
+                continue
+            if line.strip() and line != b'---\n':
+                match = JSONL_ENTRY_HEAD.match(line)
+                if match:
+                    timestamp, event_type = match.group(1).decode(), match.group(2).decode()
+                else:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        entry = {}
+                    entry = entry if isinstance(entry, dict) else {}
+                    timestamp, event_type = entry.get('timestamp'), entry.get('event_type')
+                entries.append(LogEntryRef(source, line_start, len(line), event_type, timestamp))
+            indexed_to = offset
+        return entries, indexed_to
+
 app = Flask(__name__)
 CORS(app)
 
@@ -183,131 +677,3194 @@ app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('MAX_CONTENT_LENGTH', 52428800)
 app.config['UPLOAD_FOLDER'] = os.getenv('UPLOAD_FOLDER', './uploads')
 app.config['ALLOWED_EXTENSIONS'] = set(os.getenv('ALLOWED_EXTENSIONS', 'png').split(','))
 app.config['MAX_IMAGE_DIMENSION'] = int(os.getenv('MAX_IMAGE_DIMENSION', 4096))
+app.config['AGENT_MAX_WORKERS'] = int(os.getenv('AGENT_MAX_WORKERS', 8))
+app.config['ANALYSIS_WORKERS'] = int(os.getenv('ANALYSIS_WORKERS', 4))
+app.config['ANALYSIS_QUEUE_SIZE'] = int(os.getenv('ANALYSIS_QUEUE_SIZE', 100))
+app.config['ANALYSIS_ENGINE'] = os.getenv('ANALYSIS_ENGINE', 'threads')
+app.config['ASYNC_MAX_IN_FLIGHT'] = int(os.getenv('ASYNC_MAX_IN_FLIGHT', 256))
+app.config['ASYNC_CPU_WORKERS'] = int(os.getenv('ASYNC_CPU_WORKERS', 4))
+app.config['ASYNC_HTTP_MAX_CONNECTIONS'] = int(os.getenv('ASYNC_HTTP_MAX_CONNECTIONS', 512))
+app.config['ASYNC_HTTP_MAX_KEEPALIVE'] = int(os.getenv('ASYNC_HTTP_MAX_KEEPALIVE', 64))
+app.config['IMAGE_PREPROCESS_MODE'] = os.getenv('IMAGE_PREPROCESS_MODE', 'none')
+app.config['IMAGE_TRIM_MARGINS'] = os.getenv('IMAGE_TRIM_MARGINS', 'false').lower() == 'true'
+app.config['IMAGE_FIT_TILES'] = os.getenv('IMAGE_FIT_TILES', 'false').lower() == 'true'
+app.config['IMAGE_TILE_SLACK'] = float(os.getenv('IMAGE_TILE_SLACK', 0.10))
+app.config['IMAGE_BILEVEL_THRESHOLD'] = int(os.getenv('IMAGE_BILEVEL_THRESHOLD', 160))
+app.config['ANALYSIS_TILING'] = os.getenv('ANALYSIS_TILING', 'page')
+app.config['BALLOT_MAX_COLUMNS'] = int(os.getenv('BALLOT_MAX_COLUMNS', 4))
+app.config['COLUMN_TILE_OVERLAP'] = float(os.getenv('COLUMN_TILE_OVERLAP', 0.02))
+app.config['OVAL_PREPASS'] = os.getenv('OVAL_PREPASS', 'true').lower() == 'true'
+app.config['SSE_KEEPALIVE_SECONDS'] = float(os.getenv('SSE_KEEPALIVE_SECONDS', 15))
+app.config['LONG_POLL_MAX_SECONDS'] = float(os.getenv('LONG_POLL_MAX_SECONDS', 30))
+app.config['STREAM_COMPLETIONS'] = os.getenv('STREAM_COMPLETIONS', 'true').lower() == 'true'
+app.config['STREAM_UPDATE_INTERVAL'] = float(os.getenv('STREAM_UPDATE_INTERVAL', 0.25))
+app.config['AGENT_OUTPUT_FORMAT'] = os.getenv('AGENT_OUTPUT_FORMAT', 'yaml')
+app.config['JSON_OUTPUT_MAX_TOKENS'] = int(os.getenv('JSON_OUTPUT_MAX_TOKENS', 600))
+app.config['SPELLING_ENGINE'] = os.getenv('SPELLING_ENGINE', 'compare')
+app.config['TRANSCRIBE_MAX_TOKENS'] = int(os.getenv('TRANSCRIBE_MAX_TOKENS', 2000))
+app.config['IMAGE_CACHE_MAX_BYTES'] = int(os.getenv('IMAGE_CACHE_MAX_BYTES', 268435456))
+app.config['BATCH_MAX_IMAGES'] = int(os.getenv('BATCH_MAX_IMAGES', 1000))
+app.config['DEFERRED_BATCH_DIR'] = os.getenv('DEFERRED_BATCH_DIR', os.path.join(os.path.dirname(__file__), 'deferred-batches'))
+app.config['DEFERRED_BATCH_MAX_REQUESTS'] = int(os.getenv('DEFERRED_BATCH_MAX_REQUESTS', 1000))
+app.config['DEFERRED_BATCH_MAX_BYTES'] = int(os.getenv('DEFERRED_BATCH_MAX_BYTES', 150 * 1024 * 1024))
+app.config['DEFERRED_BATCH_FLUSH_SECONDS'] = float(os.getenv('DEFERRED_BATCH_FLUSH_SECONDS', 60))
+app.config['DEFERRED_BATCH_POLL_SECONDS'] = float(os.getenv('DEFERRED_BATCH_POLL_SECONDS', 60))
+app.config['SESSION_LOG_MAX_OPEN_FILES'] = int(os.getenv('SESSION_LOG_MAX_OPEN_FILES', 64))
+app.config['SESSION_LOG_QUEUE_SIZE'] = int(os.getenv('SESSION_LOG_QUEUE_SIZE', 10000))
+# USD per million tokens, for the estimated cost metric (defaults: gpt-4o list prices)
+app.config['OPENAI_INPUT_PRICE_PER_MTOK'] = float(os.getenv('OPENAI_INPUT_PRICE_PER_MTOK', 2.50))
+app.config['OPENAI_CACHED_INPUT_PRICE_PER_MTOK'] = float(os.getenv('OPENAI_CACHED_INPUT_PRICE_PER_MTOK', 1.25))
+app.config['OPENAI_OUTPUT_PRICE_PER_MTOK'] = float(os.getenv('OPENAI_OUTPUT_PRICE_PER_MTOK', 10.00))
+app.config['OPENAI_BATCH_PRICE_FACTOR'] = float(os.getenv('OPENAI_BATCH_PRICE_FACTOR', 0.5))
+app.config['OPENAI_RPM_LIMIT'] = int(os.getenv('OPENAI_RPM_LIMIT', 500))
+app.config['OPENAI_TPM_LIMIT'] = int(os.getenv('OPENAI_TPM_LIMIT', 30000))
+app.config['OPENAI_MAX_RETRIES'] = int(os.getenv('OPENAI_MAX_RETRIES', 5))
+app.config['OPENAI_BACKOFF_BASE_SECONDS'] = float(os.getenv('OPENAI_BACKOFF_BASE_SECONDS', 1.0))
+app.config['OPENAI_BACKOFF_MAX_SECONDS'] = float(os.getenv('OPENAI_BACKOFF_MAX_SECONDS', 60))
+app.config['RESULT_CACHE_DIR'] = os.getenv('RESULT_CACHE_DIR', os.path.join(os.path.dirname(__file__), 'result-cache'))
+app.config['DATABASE_PATH'] = os.getenv('DATABASE_PATH', os.path.join(os.path.dirname(__file__), 'jobs.db'))
+app.config['JOB_CACHE_SIZE'] = int(os.getenv('JOB_CACHE_SIZE', 256))
+app.config['RETENTION_INTERVAL_SECONDS'] = float(os.getenv('RETENTION_INTERVAL_SECONDS', 3600))
+app.config['JOB_TTL_HOURS'] = float(os.getenv('JOB_TTL_HOURS', 720))
+app.config['JOB_MAX_BYTES'] = int(os.getenv('JOB_MAX_BYTES', 0))
+app.config['UPLOAD_TTL_HOURS'] = float(os.getenv('UPLOAD_TTL_HOURS', 168))
+app.config['UPLOAD_MAX_BYTES'] = int(os.getenv('UPLOAD_MAX_BYTES', 0))
+app.config['SESSION_LOG_TTL_HOURS'] = float(os.getenv('SESSION_LOG_TTL_HOURS', 720))
+app.config['SESSION_LOG_MAX_BYTES'] = int(os.getenv('SESSION_LOG_MAX_BYTES', 0))
+app.config['RESULT_CACHE_TTL_HOURS'] = float(os.getenv('RESULT_CACHE_TTL_HOURS', 720))
+app.config['RESULT_CACHE_MAX_BYTES'] = int(os.getenv('RESULT_CACHE_MAX_BYTES', 536870912))
+app.config['SESSION_LOG_COMPRESS_HOURS'] = float(os.getenv('SESSION_LOG_COMPRESS_HOURS', 24))
 
 # Ensure upload directory exists
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
-# In-memory storage for demo (replace with database in production)
-analysis_jobs = {}
-uploaded_files = {}
+session_logger = SessionLogWriter(OPENAI_SESSIONS_DIR,
+                                  max_open_files=app.config['SESSION_LOG_MAX_OPEN_FILES'],
+                                  queue_size=app.config['SESSION_LOG_QUEUE_SIZE'])
+# Queued log lines would be lost if the interpreter exited first
+atexit.register(session_logger.close)
+session_log_index = SessionLogIndex(OPENAI_SESSIONS_DIR)
 
-def allowed_file(filename):
-    """Check if file extension is allowed"""
-    return '.' in filename and \
-           filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
+class Metric:
+    """A named family of samples keyed by label values"""
 
-def validate_and_resize_image(filepath):
-    """Validate image and resize if necessary"""
-    try:
-        with Image.open(filepath) as img:
-            # Check if image is valid
-            img.verify()
-            
-        # Reopen for processing (verify closes the file)
-        with Image.open(filepath) as img:
-            # Check dimensions and resize if needed
-            max_dim = app.config['MAX_IMAGE_DIMENSION']
-            if img.width > max_dim or img.height > max_dim:
-                img.thumbnail((max_dim, max_dim), Image.Resampling.LANCZOS)
-                img.save(filepath, 'PNG', optimize=True)
-                
-            return {
-                'width': img.width,
-                'height': img.height,
-                'format': img.format,
-                'mode': img.mode
-            }
-    except Exception as e:
-        raise ValueError(f"Invalid image file: {str(e)}")
+    type_name = 'untyped'
 
-def parse_contest_text(text):
-    """Parse contest and candidate data from text format"""
-    contests = []
-    current_contest = None
-    
-    lines = text.strip().split('\n')
-    i = 0
-    
-    while i < len(lines):
-        line = lines[i].rstrip()
-        
-        # Skip empty lines
-        if not line:
-            i += 1
-            continue
-            
-        # If line doesn't start with space, it's a contest name
-        if not line.startswith(' ') and not line.startswith('\t'):
-            # Save previous contest if exists
-            if current_contest:
-                contests.append(current_contest)
-            
-            # Extract vote count from parentheses if present
-            vote_for = 1
-            contest_name = line
-            if '(' in line and ')' in line:
-                parts = line.split('(')
-                contest_name = parts[0].strip()
-                vote_count_str = parts[1].split(')')[0].strip()
-                try:
-                    vote_for = int(vote_count_str)
-                except ValueError:
-                    pass  # Keep default of 1
-            
-            current_contest = {
-                'title': contest_name,
-                'candidates': [],
-                'reporting_units': '',
-                'vote_for': vote_for
-            }
-        else:
-            # Line starts with space/tab - it's either a candidate or reporting units
-            content = line.strip()
-            if content.startswith('Reporting Units:'):
-                if current_contest:
-                    current_contest['reporting_units'] = content.replace('Reporting Units:', '').strip()
-            else:
-                # It's a candidate name
-                if current_contest and content:
-                    current_contest['candidates'].append(content)
-        
-        i += 1
-    
-    # Don't forget the last contest
-    if current_contest:
-        contests.append(current_contest)
-    
-    return {'contests': contests}
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
 
-def extract_structured_output(analysis_text):
-    """Extract YAML from structured output block"""
-    start_marker = "-- BEGIN STRUCTURED OUTPUT --"
-    end_marker = "-- END STRUCTURED OUTPUT --"
-    
-    start_idx = analysis_text.find(start_marker)
-    if start_idx == -1:
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _format_labels(self, key, extra=()):
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+        if not pairs:
+            return ''
+        escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+        return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+    def samples(self):
+        """(suffix, key, extra labels, value) tuples for the exposition format"""
+        with self._lock:
+            return [('', key, (), value) for key, value in self._values.items()]
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type_name}']
+        for suffix, key, extra, value in self.samples():
+            lines.append(f'{self.name}{suffix}{self._format_labels(key, extra)} {format_metric_value(value)}')
+        return '\n'.join(lines)
+
+class Counter(Metric):
+    """Monotonically increasing total"""
+
+    type_name = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(Metric):
+    """Value that goes up and down; can be sampled from a callback at scrape time"""
+
+    type_name = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), function=None):
+        super().__init__(name, documentation, labelnames)
+        self._function = function
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def samples(self):
+        if self._function is None:
+            return super().samples()
+        try:
+            value = self._function()
+        except Exception:
+            return []
+        if isinstance(value, dict):
+            return [('', key if isinstance(key, tuple) else (key,), (), sample) for key, sample in value.items()]
+        return [('', (), (), value)]
+
+class Histogram(Metric):
+    """Distribution of observations in cumulative buckets, with their sum and count"""
+
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60)):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state['counts'][index] += 1
+                    break
+            state['sum'] += value
+            state['count'] += 1
+
+    def samples(self):
+        with self._lock:
+            states = [(key, list(state['counts']), state['sum'], state['count'])
+                      for key, state in self._values.items()]
+        samples = []
+        for key, counts, total, count in states:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                samples.append(('_bucket', key, (('le', format_metric_value(bound)),), cumulative))
+            samples.append(('_bucket', key, (('le', '+Inf'),), count))
+            samples.append(('_sum', key, (), total))
+            samples.append(('_count', key, (), count))
+        return samples
+
+def format_metric_value(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+class MetricsRegistry:
+    """Every metric exposed by /api/metrics, in registration order"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=(), function=None):
+        return self.register(Gauge(name, documentation, labelnames, function))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=None):
+        if buckets is None:
+            return self.register(Histogram(name, documentation, labelnames))
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        return '\n'.join(metric.render() for metric in self._metrics) + '\n'
+
+metrics = MetricsRegistry()
+openai_request_seconds = metrics.histogram(
+    'ballot_openai_request_seconds', 'Latency of OpenAI chat completion requests',
+    ('agent', 'mode'), buckets=(0.5, 1, 2, 5, 10, 20, 30, 60, 120))
+openai_requests = metrics.counter(
+    'ballot_openai_requests_total', 'OpenAI chat completion requests by outcome',
+    ('agent', 'mode', 'outcome', 'output_format'))
+openai_tokens = metrics.counter(
+    'ballot_openai_tokens_total', 'Tokens billed by OpenAI (cached is a subset of prompt)',
+    ('agent', 'kind', 'output_format'))
+openai_cost = metrics.counter(
+    'ballot_openai_estimated_cost_usd_total', 'Estimated OpenAI spend from token usage and configured prices', ('agent',))
+parse_outcomes = metrics.counter(
+    'ballot_parse_results_total', 'Agent responses by the parser that produced their findings', ('agent', 'method'))
+jobs_finished = metrics.counter(
+    'ballot_jobs_finished_total', 'Analysis jobs that reached a final status', ('status',))
+upload_count = metrics.counter('ballot_uploads_total', 'Ballot images stored')
+upload_bytes = metrics.counter('ballot_upload_bytes_total', 'Bytes of ballot images stored (after resizing)')
+image_resize_seconds = metrics.histogram(
+    'ballot_image_resize_seconds', 'Time spent validating and resizing uploaded images', ('resized',),
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5))
+
+def record_openai_usage(agent_name, mode, usage, seconds=None, outcome='success'):
+    """
+    Count one OpenAI request, its latency and the tokens and estimated cost in its usage
+
+    Args:
+        agent_name: Agent the request was made for
+        mode: 'blocking', 'stream' or 'batch'
+        usage: The response's usage as a dict, or None
+        seconds: Request latency (None when unknown, as for Batch API results)
+        outcome: 'success' or 'error'
+    """
+    output_format = 'transcribe' if transcribes_names(agent_name) else app.config['AGENT_OUTPUT_FORMAT']
+    openai_requests.inc(agent=agent_name, mode=mode, outcome=outcome, output_format=output_format)
+    if seconds is not None:
+        openai_request_seconds.observe(seconds, agent=agent_name, mode=mode)
+    if not usage:
+        return
+    counts = token_usage(usage)
+    prompt_tokens, cached_tokens, completion_tokens = (
+        counts['prompt_tokens'], counts['cached_tokens'], counts['completion_tokens'])
+    openai_tokens.inc(prompt_tokens, agent=agent_name, kind='prompt', output_format=output_format)
+    openai_tokens.inc(completion_tokens, agent=agent_name, kind='completion', output_format=output_format)
+    openai_tokens.inc(cached_tokens, agent=agent_name, kind='cached', output_format=output_format)
+    cost = ((prompt_tokens - cached_tokens) * app.config['OPENAI_INPUT_PRICE_PER_MTOK'] +
+            cached_tokens * app.config['OPENAI_CACHED_INPUT_PRICE_PER_MTOK'] +
+            completion_tokens * app.config['OPENAI_OUTPUT_PRICE_PER_MTOK']) / 1_000_000
+    if mode == 'batch':
+        cost *= app.config['OPENAI_BATCH_PRICE_FACTOR']
+    openai_cost.inc(cost, agent=agent_name)
+
+def token_usage(usage):
+    """Prompt, cached prompt and completion token counts of a response's usage dict (None without usage)"""
+    if not usage:
         return None
-        
-    start_idx += len(start_marker)
-    end_idx = analysis_text.find(end_marker, start_idx)
-    if end_idx == -1:
+    return {
+        'prompt_tokens': usage.get('prompt_tokens') or 0,
+        'cached_tokens': (usage.get('prompt_tokens_details') or {}).get('cached_tokens') or 0,
+        'completion_tokens': usage.get('completion_tokens') or 0
+    }
+
+def summarize_token_usage(requests):
+    """
+    Totals and prompt cache hit rate over OpenAI requests
+
+    Args:
+        requests: Iterable of (usage, seconds) pairs, usage as from token_usage
+
+    Returns:
+        Dict of request and token totals, the share of prompt tokens served from
+        the cache and the mean latency of requests with and without cache hits
+    """
+    summary = {'requests': 0, 'prompt_tokens': 0, 'cached_tokens': 0, 'completion_tokens': 0}
+    seconds = {'cache_hit': [], 'cache_miss': []}
+    for usage, request_seconds in requests:
+        summary['requests'] += 1
+        for key in ('prompt_tokens', 'cached_tokens', 'completion_tokens'):
+            summary[key] += usage.get(key) or 0
+        if request_seconds is not None:
+            seconds['cache_hit' if usage.get('cached_tokens') else 'cache_miss'].append(request_seconds)
+    summary['cache_hit_rate'] = (round(summary['cached_tokens'] / summary['prompt_tokens'], 3)
+                                 if summary['prompt_tokens'] else None)
+    summary['mean_request_seconds'] = {
+        outcome: round(statistics.mean(values), 3) if values else None for outcome, values in seconds.items()
+    }
+    return summary
+
+def agent_request_usage(agent_results):
+    """(usage, seconds) of every OpenAI request behind a job's agent results"""
+    for results in agent_results.values():
+        for tile in results.get('tiles') or []:
+            if tile.get('prompt_tokens') is not None:
+                yield {key: tile.get(key) for key in ('prompt_tokens', 'cached_tokens', 'completion_tokens')}, \
+                    tile.get('seconds')
+        timing = results.get('timing') or {}
+        if timing.get('usage'):
+            yield timing['usage'], timing.get('total_seconds')
+
+openai_scheduler_wait_seconds = metrics.histogram(
+    'ballot_openai_scheduler_wait_seconds', 'Time requests spent waiting for rate limit capacity or backing off',
+    ('priority',), buckets=(0.01, 0.1, 0.5, 1, 2, 5, 10, 30, 60, 120))
+openai_retries = metrics.counter(
+    'ballot_openai_retries_total', 'OpenAI requests retried after a retryable failure', ('agent', 'reason'))
+
+RATE_LIMIT_DURATION = re.compile(r'(\d+(?:\.\d+)?)(ms|h|m|s)')
+RATE_LIMIT_DURATION_UNITS = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+
+def parse_rate_limit_duration(value):
+    """Seconds in an x-ratelimit-reset-* header value such as '1s', '6m0s' or '20ms', or None"""
+    matches = RATE_LIMIT_DURATION.findall(value or '')
+    if not matches:
         return None
-        
-    yaml_content = analysis_text[start_idx:end_idx].strip()
-    try:
-        return yaml.safe_load(yaml_content)
-    except yaml.YAMLError:
+    return sum(float(amount) * RATE_LIMIT_DURATION_UNITS[unit] for amount, unit in matches)
+
+def parse_retry_after(headers):
+    """Seconds to wait from retry-after-ms / retry-after headers, or None"""
+    if headers is None:
         return None
+    for name, scale in (('retry-after-ms', 0.001), ('retry-after', 1)):
+        try:
+            return float(headers.get(name)) * scale
+        except (TypeError, ValueError):
+            continue
+    return None
 
-def convert_yaml_to_findings(structured_data, agent_name):
-    """Convert YAML structured data to our internal findings format"""
-    if not structured_data or 'findings' not in structured_data:
+def data_url_png_size(url):
+    """Width and height from the IHDR chunk of a base64 PNG data URL, or None"""
+    _, _, payload = url.partition('base64,')
+    try:
+        header = base64.b64decode(payload[:32])
+    except ValueError:
         return None
-    
-    yaml_findings = structured_data['findings']
-    summary = structured_data.get('summary', '')
-    analysis_status = structured_data.get('analysis_status', 'completed')
-    
+    if header[:8] != b'\x89PNG\r\n\x1a\n' or len(header) < 24:
+        return None
+    return int.from_bytes(header[16:20], 'big'), int.from_bytes(header[20:24], 'big')
+
+def estimate_tokens(text):
+    """Rough token count: about four characters per token for English prose and JSON"""
+    return math.ceil(len(text) / 4)
+
+def estimate_request_tokens(messages, max_tokens=0):
+    """
+    Tokens a chat request counts against the tokens-per-minute limit
+
+    OpenAI counts the prompt text, the images and the whole completion budget
+    (max_tokens) when the request is admitted, so all three are included.
+    """
+    tokens = max_tokens or 0
+    for message in messages:
+        content = message.get('content')
+        if isinstance(content, str):
+            tokens += estimate_tokens(content)
+            continue
+        for part in content or []:
+            if part.get('type') == 'text':
+                tokens += estimate_tokens(part.get('text', ''))
+            elif part.get('type') == 'image_url':
+                image_url = part.get('image_url', {})
+                width, height = data_url_png_size(image_url.get('url', '')) or (VISION_MAX_SIDE, VISION_MAX_SIDE)
+                tokens += estimate_image_tokens(width, height, image_url.get('detail', 'high'))
+    return tokens
+
+class OpenAIRequestScheduler:
+    """
+    Process-wide gate in front of every chat completion request
+
+    A request waits until two token buckets, requests per minute and tokens per
+    minute, both have room for it; waiting interactive requests are admitted
+    ahead of bulk (batch upload) ones, first come first served within each.
+    Bucket sizes follow the x-ratelimit-* headers of each response, a 429 holds
+    back every request until its retry-after passes, and retryable failures
+    (429, 5xx, timeouts and connection errors) are retried with jittered
+    exponential backoff. Time spent waiting is reported apart from model latency.
+    """
+
+    PRIORITIES = ('interactive', 'bulk')
+    ASYNC_POLL_SECONDS = 0.05
+
+    def __init__(self, rpm_limit, tpm_limit, max_retries=5, backoff_base=1.0, backoff_max=60.0):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._cond = threading.Condition()
+        self._limits = {'requests': rpm_limit, 'tokens': tpm_limit}
+        self._available = {'requests': float(rpm_limit), 'tokens': float(tpm_limit)}
+        self._refilled_at = time.monotonic()
+        self._paused_until = 0.0
+        self._waiting = []
+        self._sequence = itertools.count()
+        self._stats = {'admitted': 0, 'retries': 0, 'rate_limited': 0, 'wait_seconds': 0.0}
+
+    def _refill(self, now):
+        elapsed = now - self._refilled_at
+        self._refilled_at = now
+        for kind, limit in self._limits.items():
+            if limit:
+                self._available[kind] = min(limit, self._available[kind] + elapsed * limit / 60)
+
+    def _delay(self, cost, now):
+        """Seconds until a request of the given cost could be admitted"""
+        delay = self._paused_until - now
+        for kind, limit in self._limits.items():
+            if limit:
+                # A request larger than the whole bucket waits for a full one
+                deficit = min(cost[kind], limit) - self._available[kind]
+                delay = max(delay, deficit * 60 / limit)
+        return delay
+
+    def _admit(self, ticket, cost):
+        """
+        Admit the ticket if it is first in line and the buckets have room; call with the lock held
+
+        Returns:
+            None once admitted, otherwise seconds to wait before checking again
+        """
+        now = time.monotonic()
+        self._refill(now)
+        if self._waiting[0] != ticket:
+            return 1.0
+        delay = self._delay(cost, now)
+        if delay > 0:
+            return delay
+        heapq.heappop(self._waiting)
+        for kind, limit in self._limits.items():
+            if limit:
+                self._available[kind] -= min(cost[kind], limit)
+        self._stats['admitted'] += 1
+        self._cond.notify_all()
+        return None
+
+    def _withdraw(self, ticket):
+        """Take a ticket that gave up waiting out of line; call with the lock held"""
+        if ticket in self._waiting:
+            self._waiting.remove(ticket)
+            heapq.heapify(self._waiting)
+            self._cond.notify_all()
+
+    def _ticket(self, tokens, priority):
+        return {'requests': 1, 'tokens': tokens}, (self.PRIORITIES.index(priority), next(self._sequence))
+
+    def acquire(self, tokens, priority='interactive'):
+        """
+        Block until a request estimated at `tokens` may be sent
+
+        Returns:
+            Seconds spent waiting
+        """
+        cost, ticket = self._ticket(tokens, priority)
+        started = time.monotonic()
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    delay = self._admit(ticket, cost)
+                    if delay is None:
+                        break
+                    self._cond.wait(min(delay, 1.0))
+            except BaseException:
+                self._withdraw(ticket)
+                raise
+        waited = time.monotonic() - started
+        openai_scheduler_wait_seconds.observe(waited, priority=priority)
+        return waited
+
+    async def acquire_async(self, tokens, priority='interactive'):
+        """
+        acquire() for coroutines: waits with asyncio.sleep instead of blocking the event loop
+
+        Returns:
+            Seconds spent waiting
+        """
+        cost, ticket = self._ticket(tokens, priority)
+        started = time.monotonic()
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+        try:
+            while True:
+                with self._cond:
+                    delay = self._admit(ticket, cost)
+                if delay is None:
+                    break
+                # Coroutines cannot wait on the condition, so poll; thread waiters are still notified
+                await asyncio.sleep(min(delay, self.ASYNC_POLL_SECONDS))
+        except BaseException:
+            with self._cond:
+                self._withdraw(ticket)
+            raise
+        waited = time.monotonic() - started
+        openai_scheduler_wait_seconds.observe(waited, priority=priority)
+        return waited
+
+    def observe_headers(self, headers):
+        """Follow the account's limits and remaining capacity reported by OpenAI"""
+        if headers is None:
+            return
+        now = time.monotonic()
+        with self._cond:
+            self._refill(now)
+            for kind in self._limits:
+                try:
+                    limit = int(headers.get(f'x-ratelimit-limit-{kind}'))
+                    remaining = int(headers.get(f'x-ratelimit-remaining-{kind}'))
+                except (TypeError, ValueError):
+                    continue
+                self._limits[kind] = limit
+                # The local bucket refills continuously; only ever lower it to what the server reports
+                self._available[kind] = min(self._available[kind], remaining, limit)
+                if remaining <= 0:
+                    reset = parse_rate_limit_duration(headers.get(f'x-ratelimit-reset-{kind}'))
+                    if reset:
+                        self._paused_until = max(self._paused_until, now + reset)
+            self._cond.notify_all()
+
+    def pause(self, seconds):
+        """Hold back every request for `seconds` (after a 429)"""
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._stats['rate_limited'] += 1
+
+    def backoff(self, attempt, retry_after=None):
+        """Full-jitter exponential backoff, never shorter than the server's retry-after"""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        return max(delay, retry_after or 0)
+
+    def _retry_delay(self, error, attempt, agent_name):
+        """
+        Decide whether a failed attempt is retried
+
+        Returns:
+            Seconds to back off before the next attempt
+
+        Raises:
+            The error itself once it is not retryable or retries are exhausted
+        """
+        if not isinstance(error, (RateLimitError, InternalServerError, APIConnectionError)):
+            raise error
+        response = getattr(error, 'response', None)
+        headers = response.headers if response is not None else None
+        self.observe_headers(headers)
+        if attempt >= self.max_retries:
+            raise error
+        delay = self.backoff(attempt, parse_retry_after(headers))
+        if isinstance(error, RateLimitError):
+            self.pause(delay)
+        reason = 'rate_limit' if isinstance(error, RateLimitError) else (
+            'server_error' if isinstance(error, InternalServerError) else 'connection')
+        openai_retries.inc(agent=agent_name or 'unknown', reason=reason)
+        with self._cond:
+            self._stats['retries'] += 1
+        return delay
+
+    def _succeeded(self, raw, waited, attempt, model_seconds):
+        self.observe_headers(raw.headers)
+        with self._cond:
+            self._stats['wait_seconds'] += waited
+        return raw, {
+            'scheduler_wait_seconds': round(waited, 3),
+            'retries': attempt,
+            'model_seconds': model_seconds
+        }
+
+    def run(self, send, tokens, priority='interactive', agent_name=None, on_wait=None):
+        """
+        Send a request through the scheduler, retrying retryable failures
+
+        Args:
+            send: Callable making the request and returning a raw API response (with headers)
+            tokens: Estimated tokens the request counts against the TPM limit
+            priority: 'interactive' or 'bulk'
+            agent_name: Agent the request is for (metrics label)
+            on_wait: Optional callable(start, end) given each wall-clock span spent waiting
+
+        Returns:
+            Tuple of (raw response, info) where info has scheduler_wait_seconds,
+            retries and model_seconds (latency of the attempt that succeeded)
+
+        Raises:
+            The last error once it is not retryable or retries are exhausted
+        """
+        waited = 0.0
+        attempt = 0
+        while True:
+            wait_started = time.time()
+            wait_seconds = self.acquire(tokens, priority)
+            if wait_seconds > 0.001 and on_wait:
+                on_wait(wait_started, time.time())
+            waited += wait_seconds
+
+            started = time.perf_counter()
+            try:
+                raw = send()
+            except Exception as e:
+                delay = self._retry_delay(e, attempt, agent_name)
+                attempt += 1
+                wait_started = time.time()
+                time.sleep(delay)
+                if on_wait:
+                    on_wait(wait_started, time.time())
+                waited += delay
+                continue
+            return self._succeeded(raw, waited, attempt, time.perf_counter() - started)
+
+    async def run_async(self, send, tokens, priority='interactive', agent_name=None, on_wait=None):
+        """
+        run() for coroutines: `send` is a coroutine function and every wait is an asyncio.sleep
+
+        Returns:
+            Tuple of (raw response, info), as run()
+        """
+        waited = 0.0
+        attempt = 0
+        while True:
+            wait_started = time.time()
+            wait_seconds = await self.acquire_async(tokens, priority)
+            if wait_seconds > 0.001 and on_wait:
+                on_wait(wait_started, time.time())
+            waited += wait_seconds
+
+            started = time.perf_counter()
+            try:
+                raw = await send()
+            except Exception as e:
+                delay = self._retry_delay(e, attempt, agent_name)
+                attempt += 1
+                wait_started = time.time()
+                await asyncio.sleep(delay)
+                if on_wait:
+                    on_wait(wait_started, time.time())
+                waited += delay
+                continue
+            return self._succeeded(raw, waited, attempt, time.perf_counter() - started)
+
+    def stats(self):
+        with self._cond:
+            self._refill(time.monotonic())
+            return {
+                'limits': dict(self._limits),
+                'available': {kind: round(value, 1) for kind, value in self._available.items()},
+                'waiting': len(self._waiting),
+                'paused_for_seconds': round(max(0.0, self._paused_until - time.monotonic()), 3),
+                **{key: round(value, 3) if isinstance(value, float) else value for key, value in self._stats.items()}
+            }
+
+openai_scheduler = OpenAIRequestScheduler(app.config['OPENAI_RPM_LIMIT'], app.config['OPENAI_TPM_LIMIT'],
+                                          max_retries=app.config['OPENAI_MAX_RETRIES'],
+                                          backoff_base=app.config['OPENAI_BACKOFF_BASE_SECONDS'],
+                                          backoff_max=app.config['OPENAI_BACKOFF_MAX_SECONDS'])
+# The scheduler owns retries for chat completions; the client's own would bypass its backoff
+scheduled_client = client.with_options(max_retries=0)
+
+def job_priority(job_id):
+    """Jobs from a batch upload are bulk work; single ballots are interactive"""
+    job = job_store.get_job(job_id)
+    return 'bulk' if job and job.get('batch_id') else 'interactive'
+
+# Agents of the same job update it from different threads
+jobs_lock = threading.RLock()
+
+# Jobs, uploads and contest data live in SQLite so they survive restarts and can
+# be shared by several processes; only active jobs and a few recent entries stay in memory
+JOB_FINAL_STATUSES = ('completed', 'error')
+
+STORE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS uploads (
+    file_id TEXT PRIMARY KEY,
+    original_filename TEXT,
+    filename TEXT NOT NULL,
+    filepath TEXT NOT NULL,
+    sha256 TEXT,
+    size INTEGER,
+    image_info TEXT,
+    uploaded_at TEXT NOT NULL,
+    last_used_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_uploads_sha256 ON uploads (sha256);
+
+CREATE TABLE IF NOT EXISTS contest_datasets (
+    data_id TEXT PRIMARY KEY,
+    raw_text TEXT NOT NULL,
+    parsed_data TEXT NOT NULL,
+    uploaded_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    progress INTEGER NOT NULL DEFAULT 0,
+    message TEXT,
+    image_file_id TEXT,
+    contest_data_id TEXT,
+    batch_id TEXT,
+    execution_mode TEXT,
+    owner TEXT,
+    error TEXT,
+    total_issues INTEGER,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    completed_at TEXT,
+    extra TEXT NOT NULL DEFAULT '{}',
+    results TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status);
+CREATE INDEX IF NOT EXISTS idx_jobs_batch ON jobs (batch_id);
+CREATE INDEX IF NOT EXISTS idx_jobs_image ON jobs (image_file_id);
+CREATE INDEX IF NOT EXISTS idx_jobs_created ON jobs (created_at);
+
+CREATE TABLE IF NOT EXISTS job_agents (
+    job_id TEXT NOT NULL,
+    agent TEXT NOT NULL,
+    status TEXT NOT NULL,
+    progress INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    extra TEXT NOT NULL DEFAULT '{}',
+    results TEXT,
+    PRIMARY KEY (job_id, agent)
+);
+
+CREATE TABLE IF NOT EXISTS batches (
+    batch_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    contest_data_id TEXT,
+    all_submitted INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT NOT NULL,
+    completed_at TEXT,
+    extra TEXT NOT NULL DEFAULT '{}'
+);
+
+CREATE TABLE IF NOT EXISTS openai_batches (
+    batch_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    custom_ids TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    submitted_at TEXT NOT NULL
+);
+"""
+
+JOB_COLUMNS = ('status', 'progress', 'message', 'image_file_id', 'contest_data_id', 'batch_id',
+               'execution_mode', 'owner', 'error', 'created_at', 'completed_at')
+AGENT_COLUMNS = ('status', 'progress', 'error')
+BATCH_COLUMNS = ('status', 'contest_data_id', 'all_submitted', 'created_at', 'completed_at')
+
+# Rewritten many times a second while a response streams; only ever needed live
+VOLATILE_AGENT_FIELDS = ('partial_raw_analysis', 'partial_findings')
+
+PROCESS_OWNER = f"{os.uname().nodename}:{os.getpid()}" if hasattr(os, 'uname') else f"localhost:{os.getpid()}"
+
+class JobStore:
+    """
+    SQLite (WAL mode) store for uploads, contest datasets, jobs, per-agent state and batches
+
+    Every change is written through to the database. Jobs that are still running
+    are also kept in memory (with their streaming fields) so status reads do not
+    touch the disk; finished jobs, uploads and contest datasets are held in small
+    LRU caches only, so memory stays flat however many jobs have run.
+    """
+
+    def __init__(self, path, lock, cache_size=256):
+        self.path = path
+        self._lock = lock
+        self._local = threading.local()
+        self._hot = {}
+        self._recent = OrderedDict()
+        self._uploads = OrderedDict()
+        self._contests = OrderedDict()
+        self.cache_size = cache_size
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        db = self._db()
+        # Lets the retention reaper hand freed pages back to the filesystem
+        db.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        db.executescript(STORE_SCHEMA)
+        if 'last_used_at' not in {row['name'] for row in db.execute('PRAGMA table_info(uploads)')}:
+            db.execute('ALTER TABLE uploads ADD COLUMN last_used_at TEXT')
+
+    def _db(self):
+        """One connection per thread"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.row_factory = sqlite3.Row
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute('PRAGMA busy_timeout=30000')
+            self._local.connection = connection
+        return connection
+
+    def _remember(self, cache, key, value):
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > self.cache_size:
+            cache.popitem(last=False)
+
+    # Uploads
+
+    def create_upload(self, file_info):
+        self._db().execute(
+            'INSERT INTO uploads (file_id, original_filename, filename, filepath, sha256, size, image_info, uploaded_at, last_used_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (file_info['file_id'], file_info['original_filename'], file_info['filename'], file_info['filepath'],
+             file_info['sha256'], file_info['size'], json.dumps(file_info.get('image_info')), file_info['uploaded_at'],
+             file_info['uploaded_at']))
+        with self._lock:
+            self._remember(self._uploads, file_info['file_id'], file_info)
+
+    def get_upload(self, file_id):
+        """Stored file info for an upload, or None"""
+        with self._lock:
+            if file_id in self._uploads:
+                self._uploads.move_to_end(file_id)
+                return self._uploads[file_id]
+        row = self._db().execute('SELECT * FROM uploads WHERE file_id = ?', (file_id,)).fetchone()
+        if row is None:
+            return None
+        file_info = dict(row)
+        file_info.pop('last_used_at', None)
+        file_info['image_info'] = json.loads(file_info['image_info']) if file_info['image_info'] else None
+        with self._lock:
+            self._remember(self._uploads, file_id, file_info)
+        return file_info
+
+    def touch_upload(self, file_id):
+        """Record that an upload was used, for least-recently-used eviction"""
+        self._db().execute('UPDATE uploads SET last_used_at = ? WHERE file_id = ?',
+                           (datetime.now().isoformat(), file_id))
+
+    def unreferenced_uploads(self):
+        """Uploads no job points at, least recently used first"""
+        rows = self._db().execute(
+            'SELECT file_id, filepath, size, last_used_at FROM uploads u '
+            'WHERE NOT EXISTS (SELECT 1 FROM jobs j WHERE j.image_file_id = u.file_id) '
+            'ORDER BY COALESCE(last_used_at, uploaded_at)').fetchall()
+        return [dict(row) for row in rows]
+
+    def delete_upload(self, file_id):
+        self._db().execute('DELETE FROM uploads WHERE file_id = ?', (file_id,))
+        with self._lock:
+            self._uploads.pop(file_id, None)
+
+    # Contest datasets
+
+    def create_contest_data(self, contest_data):
+        self._db().execute(
+            'INSERT INTO contest_datasets (data_id, raw_text, parsed_data, uploaded_at) VALUES (?, ?, ?, ?)',
+            (contest_data['data_id'], contest_data['raw_text'], json.dumps(contest_data['parsed_data']),
+             contest_data['uploaded_at']))
+        with self._lock:
+            self._remember(self._contests, contest_data['data_id'], contest_data)
+
+    def get_contest_data(self, data_id):
+        """Stored contest dataset, or None"""
+        with self._lock:
+            if data_id in self._contests:
+                self._contests.move_to_end(data_id)
+                return self._contests[data_id]
+        row = self._db().execute('SELECT * FROM contest_datasets WHERE data_id = ?', (data_id,)).fetchone()
+        if row is None:
+            return None
+        contest_data = dict(row)
+        contest_data['parsed_data'] = json.loads(contest_data['parsed_data'])
+        with self._lock:
+            self._remember(self._contests, data_id, contest_data)
+        return contest_data
+
+    # Jobs
+
+    def create_job(self, job):
+        job = dict(job, owner=PROCESS_OWNER)
+        job.setdefault('agents', {})
+        with self._lock:
+            self._write_job(job, insert=True)
+            self._hot[job['job_id']] = job
+        if job.get('image_file_id'):
+            self.touch_upload(job['image_file_id'])
+        return job
+
+    def get_job(self, job_id):
+        """
+        The job as a dict, or None
+
+        Running jobs come back as the live in-memory entry; treat it as read-only
+        and change it through update_job/update_agent_status.
+        """
+        with self._lock:
+            job = self._hot.get(job_id)
+            if job is None and job_id in self._recent:
+                self._recent.move_to_end(job_id)
+                job = self._recent[job_id]
+            if job is not None:
+                return job
+        job = self._load_job(job_id)
+        if job is not None:
+            with self._lock:
+                if job['status'] in JOB_FINAL_STATUSES:
+                    self._remember(self._recent, job_id, job)
+        return job
+
+    def is_local(self, job_id):
+        """True when this process is running the job, so its changes are published here"""
+        with self._lock:
+            return job_id in self._hot
+
+    def update_job(self, job_id, fields):
+        with self._lock:
+            job = self.get_job(job_id)
+            if job is None:
+                return None
+            job.update(fields)
+            # Agent rows (with their results) are rewritten only when the agents or results change;
+            # update_agent keeps them current otherwise
+            self._write_job(job, write_agents='agents' in fields or 'results' in fields)
+            self._settle(job)
+            return job
+
+    def update_agent(self, job_id, agent_name, fields):
+        with self._lock:
+            job = self.get_job(job_id)
+            if job is None or agent_name not in job.get('agents', {}):
+                return None
+            agent = job['agents'][agent_name]
+            agent.update(fields)
+            if any(key not in VOLATILE_AGENT_FIELDS for key in fields):
+                self._write_agent(job_id, agent_name, agent)
+            return job
+
+    def delete_job(self, job_id):
+        with self._lock:
+            self._hot.pop(job_id, None)
+            self._recent.pop(job_id, None)
+            db = self._db()
+            db.execute('DELETE FROM jobs WHERE job_id = ?', (job_id,))
+            db.execute('DELETE FROM job_agents WHERE job_id = ?', (job_id,))
+
+    def finished_jobs(self, updated_before=None):
+        """
+        Finished jobs oldest first, with the bytes their stored results take up
+
+        Args:
+            updated_before: Only jobs last changed before this ISO timestamp
+
+        Returns:
+            List of dicts with job_id, updated_at and bytes
+        """
+        query = (
+            'SELECT j.job_id, j.updated_at, '
+            'LENGTH(j.extra) + COALESCE(LENGTH(j.results), 0) + COALESCE('
+            '(SELECT SUM(LENGTH(a.extra) + COALESCE(LENGTH(a.results), 0)) FROM job_agents a WHERE a.job_id = j.job_id), 0'
+            ') AS bytes '
+            "FROM jobs j WHERE j.status IN ('completed', 'error')")
+        params = []
+        if updated_before is not None:
+            query += ' AND j.updated_at < ?'
+            params.append(updated_before)
+        rows = self._db().execute(query + ' ORDER BY j.updated_at', params).fetchall()
+        return [dict(row) for row in rows]
+
+    def delete_orphans(self, created_before):
+        """
+        Remove contest datasets and batches that no job refers to any more
+
+        Returns:
+            Number of rows removed
+        """
+        db = self._db()
+        removed = db.execute(
+            'DELETE FROM contest_datasets WHERE uploaded_at < ? AND NOT EXISTS '
+            '(SELECT 1 FROM jobs WHERE jobs.contest_data_id = contest_datasets.data_id)', (created_before,)).rowcount
+        removed += db.execute(
+            'DELETE FROM batches WHERE created_at < ? AND NOT EXISTS '
+            '(SELECT 1 FROM jobs WHERE jobs.batch_id = batches.batch_id)', (created_before,)).rowcount
+        with self._lock:
+            self._contests.clear()
+        return removed
+
+    def usage(self):
+        """Row counts and stored payload bytes per table"""
+        db = self._db()
+        row = db.execute(
+            'SELECT (SELECT COUNT(*) FROM jobs) AS jobs, '
+            '(SELECT COALESCE(SUM(LENGTH(extra) + COALESCE(LENGTH(results), 0)), 0) FROM jobs) + '
+            '(SELECT COALESCE(SUM(LENGTH(extra) + COALESCE(LENGTH(results), 0)), 0) FROM job_agents) AS job_bytes, '
+            '(SELECT COUNT(*) FROM uploads) AS uploads, '
+            '(SELECT COALESCE(SUM(size), 0) FROM uploads) AS upload_bytes, '
+            '(SELECT COUNT(*) FROM contest_datasets) AS contest_datasets, '
+            '(SELECT COUNT(*) FROM batches) AS batches').fetchone()
+        usage = dict(row)
+        page_size = db.execute('PRAGMA page_size').fetchone()[0]
+        usage['database_bytes'] = page_size * db.execute('PRAGMA page_count').fetchone()[0]
+        return usage
+
+    def compact(self):
+        """Return pages freed by deletes to the filesystem"""
+        self._db().execute('PRAGMA incremental_vacuum')
+
+    def recover_interrupted_jobs(self):
+        """
+        Fail jobs left unfinished by a process on this host that is no longer running
+
+        Queued jobs never started, so they are taken over by this process instead
+        and returned for the caller to hand to the scheduler again. Deferred jobs
+        whose requests reached an OpenAI batch are left alone: the batch is
+        resumed by DeferredBatchRunner.resume().
+
+        Returns:
+            Tuple of (number of jobs marked as interrupted, ids of the queued jobs
+            taken over, oldest first)
+        """
+        host = PROCESS_OWNER.split(':')[0]
+        rows = self._db().execute(
+            "SELECT job_id, status, owner FROM jobs WHERE status NOT IN ('completed', 'error') AND owner LIKE ? "
+            "ORDER BY created_at",
+            (f'{host}:%',)).fetchall()
+        batched_jobs = {custom_id.rsplit(':', 1)[0]
+                        for batch in self.openai_batches() for custom_id in batch['custom_ids']}
+        interrupted = 0
+        requeued = []
+        for row in rows:
+            pid = int(row['owner'].rsplit(':', 1)[1])
+            if row['owner'] == PROCESS_OWNER or process_alive(pid):
+                continue
+            if row['status'] == 'deferred' and row['job_id'] in batched_jobs:
+                continue
+            if row['status'] == 'queued':
+                # Another restarted process may take over the same job; only one update matches
+                claimed = self._db().execute('UPDATE jobs SET owner = ? WHERE job_id = ? AND owner = ?',
+                                             (PROCESS_OWNER, row['job_id'], row['owner'])).rowcount
+                if claimed:
+                    with self._lock:
+                        self._hot[row['job_id']] = self._load_job(row['job_id'])
+                    requeued.append(row['job_id'])
+                continue
+            self._db().execute(
+                "UPDATE jobs SET status = 'error', progress = 0, message = ?, error = ?, updated_at = ? WHERE job_id = ?",
+                ('Analysis interrupted by a server restart', 'Interrupted by a server restart',
+                 datetime.now().isoformat(), row['job_id']))
+            interrupted += 1
+        return interrupted, requeued
+
+    def adopt_job(self, job_id):
+        """Take over an unfinished job from a process that is gone, so its updates are published here"""
+        with self._lock:
+            job = self.get_job(job_id)
+            if job is None or job['status'] in JOB_FINAL_STATUSES:
+                return None
+            job['owner'] = PROCESS_OWNER
+            self._write_job(job, write_agents=False)
+            self._hot[job_id] = job
+            return job
+
+    # OpenAI batches of deferred jobs, kept until their results are collected
+
+    def save_openai_batch(self, batch_id, custom_ids, status, submitted_at):
+        self._db().execute(
+            'INSERT INTO openai_batches (batch_id, status, custom_ids, owner, submitted_at) VALUES (?, ?, ?, ?, ?)',
+            (batch_id, status, json.dumps(custom_ids), PROCESS_OWNER, submitted_at))
+
+    def update_openai_batch(self, batch_id, status):
+        self._db().execute('UPDATE openai_batches SET status = ? WHERE batch_id = ?', (status, batch_id))
+
+    def delete_openai_batch(self, batch_id):
+        self._db().execute('DELETE FROM openai_batches WHERE batch_id = ?', (batch_id,))
+
+    def openai_batches(self):
+        """Every stored OpenAI batch as a dict, oldest first"""
+        rows = self._db().execute('SELECT * FROM openai_batches ORDER BY submitted_at').fetchall()
+        return [dict(row, custom_ids=json.loads(row['custom_ids'])) for row in rows]
+
+    def claim_openai_batches(self):
+        """
+        Take over the OpenAI batches of processes on this host that are no longer running
+
+        Returns:
+            The claimed batches, as from openai_batches()
+        """
+        host = PROCESS_OWNER.split(':')[0]
+        claimed = []
+        for batch in self.openai_batches():
+            if batch['owner'] == PROCESS_OWNER or not batch['owner'].startswith(f'{host}:'):
+                continue
+            if process_alive(int(batch['owner'].rsplit(':', 1)[1])):
+                continue
+            # Another restarted process may claim the same batch; only one update matches
+            if self._db().execute('UPDATE openai_batches SET owner = ? WHERE batch_id = ? AND owner = ?',
+                                  (PROCESS_OWNER, batch['batch_id'], batch['owner'])).rowcount:
+                claimed.append(batch)
+        return claimed
+
+    def stats(self):
+        counts = {row['status']: row['count'] for row in self._db().execute(
+            'SELECT status, COUNT(*) AS count FROM jobs GROUP BY status')}
+        with self._lock:
+            return {
+                'path': self.path,
+                'jobs_by_status': counts,
+                'hot_jobs': len(self._hot),
+                'cached_jobs': len(self._recent),
+                'cached_uploads': len(self._uploads),
+                'cached_contest_datasets': len(self._contests)
+            }
+
+    def _settle(self, job):
+        """Move a job that just finished from the hot set to the recent LRU"""
+        if job['status'] in JOB_FINAL_STATUSES and job['job_id'] in self._hot:
+            del self._hot[job['job_id']]
+            for agent in job.get('agents', {}).values():
+                for key in VOLATILE_AGENT_FIELDS:
+                    agent.pop(key, None)
+            self._remember(self._recent, job['job_id'], job)
+
+    def _write_job(self, job, insert=False, write_agents=True):
+        results = job.get('results')
+        stored_results = None
+        total_issues = None
+        if results is not None:
+            # Agent results go to job_agents; the job row keeps the rest
+            stored_results = json.dumps({key: value for key, value in results.items() if key != 'agent_results'})
+            total_issues = results.get('combined_analysis', {}).get('total_issues')
+        extra = {key: value for key, value in job.items()
+                 if key not in JOB_COLUMNS and key not in ('job_id', 'agents', 'results')}
+        values = [job.get(column) for column in JOB_COLUMNS]
+        db = self._db()
+        if insert:
+            db.execute(
+                f"INSERT INTO jobs (job_id, {', '.join(JOB_COLUMNS)}, total_issues, updated_at, extra, results) "
+                f"VALUES ({', '.join('?' * (len(JOB_COLUMNS) + 5))})",
+                [job['job_id'], *values, total_issues, datetime.now().isoformat(), json.dumps(extra), stored_results])
+        else:
+            db.execute(
+                f"UPDATE jobs SET {', '.join(f'{column} = ?' for column in JOB_COLUMNS)}, "
+                f"total_issues = ?, updated_at = ?, extra = ?, results = ? WHERE job_id = ?",
+                [*values, total_issues, datetime.now().isoformat(), json.dumps(extra), stored_results, job['job_id']])
+        if not write_agents:
+            return
+        agent_results = (results or {}).get('agent_results', {})
+        for agent_name, agent in job.get('agents', {}).items():
+            self._write_agent(job['job_id'], agent_name, agent, agent_results.get(agent_name))
+
+    def _write_agent(self, job_id, agent_name, agent, results=None):
+        extra = {key: value for key, value in agent.items()
+                 if key not in AGENT_COLUMNS and key != 'results' and key not in VOLATILE_AGENT_FIELDS}
+        if results is None:
+            results = agent.get('results')
+        self._db().execute(
+            'INSERT INTO job_agents (job_id, agent, status, progress, error, extra, results) VALUES (?, ?, ?, ?, ?, ?, ?) '
+            'ON CONFLICT (job_id, agent) DO UPDATE SET status = excluded.status, progress = excluded.progress, '
+            'error = excluded.error, extra = excluded.extra, results = excluded.results',
+            (job_id, agent_name, agent.get('status', 'pending'), agent.get('progress', 0), agent.get('error'),
+             json.dumps(extra), json.dumps(results) if results is not None else None))
+
+    def _load_job(self, job_id):
+        db = self._db()
+        row = db.execute('SELECT * FROM jobs WHERE job_id = ?', (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = {'job_id': job_id}
+        job.update(json.loads(row['extra']))
+        job.update({column: row[column] for column in JOB_COLUMNS})
+        job['agents'] = {}
+        agent_results = {}
+        for agent_row in db.execute('SELECT * FROM job_agents WHERE job_id = ? ORDER BY rowid', (job_id,)):
+            agent = json.loads(agent_row['extra'])
+            agent.update({column: agent_row[column] for column in AGENT_COLUMNS})
+            agent['results'] = json.loads(agent_row['results']) if agent_row['results'] else None
+            job['agents'][agent_row['agent']] = agent
+            if agent['results'] is not None:
+                agent_results[agent_row['agent']] = agent['results']
+        if row['results']:
+            job['results'] = json.loads(row['results'])
+            job['results']['agent_results'] = agent_results
+        return job
+
+    # Batches
+
+    def create_batch(self, batch):
+        extra = {key: value for key, value in batch.items() if key not in BATCH_COLUMNS and key != 'batch_id'}
+        self._db().execute(
+            f"INSERT INTO batches (batch_id, {', '.join(BATCH_COLUMNS)}, extra) VALUES ({', '.join('?' * (len(BATCH_COLUMNS) + 2))})",
+            [batch['batch_id'], *[batch.get(column) for column in BATCH_COLUMNS], json.dumps(extra)])
+
+    def get_batch(self, batch_id):
+        row = self._db().execute('SELECT * FROM batches WHERE batch_id = ?', (batch_id,)).fetchone()
+        if row is None:
+            return None
+        batch = {'batch_id': batch_id}
+        batch.update(json.loads(row['extra']))
+        batch.update({column: row[column] for column in BATCH_COLUMNS})
+        batch['all_submitted'] = bool(batch['all_submitted'])
+        return batch
+
+    def update_batch(self, batch_id, **fields):
+        columns = [column for column in fields if column in BATCH_COLUMNS]
+        if columns:
+            self._db().execute(
+                f"UPDATE batches SET {', '.join(f'{column} = ?' for column in columns)} WHERE batch_id = ?",
+                [*[fields[column] for column in columns], batch_id])
+
+    def batch_jobs(self, batch_id):
+        """Status columns of a batch's jobs in submission order (no results are loaded)"""
+        rows = self._db().execute(
+            'SELECT job_id, status, progress, image_file_id, error, total_issues FROM jobs '
+            'WHERE batch_id = ? ORDER BY rowid', (batch_id,)).fetchall()
+        jobs = [dict(row) for row in rows]
+        # Jobs running here may be ahead of what was last read back from disk
+        with self._lock:
+            for job in jobs:
+                live = self._hot.get(job['job_id'])
+                if live is not None:
+                    job['status'] = live['status']
+                    job['progress'] = live.get('progress', 0)
+        return jobs
+
+def process_alive(pid):
+    """True if a process with this pid exists on this host"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+job_store = JobStore(app.config['DATABASE_PATH'], jobs_lock, cache_size=app.config['JOB_CACHE_SIZE'])
+
+# Jobs whose worker died with a previous server process would otherwise stay "processing" forever;
+# its queued jobs are queued again here once the scheduler is up (requeue_jobs)
+interrupted_jobs, requeued_job_ids = job_store.recover_interrupted_jobs()
+if interrupted_jobs:
+    print(f"Marked {interrupted_jobs} interrupted analysis job(s) as failed")
+
+# How often status streams re-read jobs that another server process is running
+STORE_POLL_SECONDS = 1.0
+
+# Shared pool that runs the individual agents of every job
+agent_executor = ThreadPoolExecutor(
+    max_workers=app.config['AGENT_MAX_WORKERS'],
+    thread_name_prefix='agent'
+)
+
+class JobEventBroker:
+    """
+    Change counter per job that status streams can block on
+
+    update_job and update_agent_status publish after every change, so a stream
+    wakes up as soon as the job moves instead of on a polling interval.
+    """
+
+    def __init__(self, max_closed=1024):
+        self._lock = threading.Lock()
+        self._conditions = {}
+        self._versions = {}
+        # Recently finished jobs, so a late waiter returns at once instead of timing out
+        self._closed = OrderedDict()
+        self.max_closed = max_closed
+
+    def publish(self, job_id):
+        """Record a change to a job and wake everything waiting on it"""
+        with self._lock:
+            self._versions[job_id] = self._versions.get(job_id, 0) + 1
+            condition = self._conditions.get(job_id)
+            if condition is not None:
+                condition.notify_all()
+
+    def version(self, job_id):
+        """Number of changes published for a job so far"""
+        with self._lock:
+            return self._versions.get(job_id, 0)
+
+    def wait(self, job_id, since, timeout):
+        """
+        Block until the job changes past version `since` or the timeout expires
+
+        Returns:
+            The job's current version
+        """
+        with self._lock:
+            if job_id in self._closed:
+                return self._versions.get(job_id, 0)
+            condition = self._conditions.get(job_id)
+            if condition is None:
+                condition = self._conditions[job_id] = threading.Condition(self._lock)
+            condition.wait_for(lambda: self._versions.get(job_id, 0) > since or job_id in self._closed, timeout)
+            return self._versions.get(job_id, 0)
+
+    def forget(self, job_id):
+        """Drop the bookkeeping for a job that has finished or no longer exists, waking its waiters"""
+        with self._lock:
+            self._versions.pop(job_id, None)
+            self._closed[job_id] = True
+            while len(self._closed) > self.max_closed:
+                self._closed.popitem(last=False)
+            condition = self._conditions.pop(job_id, None)
+            if condition is not None:
+                condition.notify_all()
+
+job_events = JobEventBroker()
+
+class JobTimelines:
+    """
+    Start and end times of the stages of running jobs
+
+    Spans are appended in memory (one lock, one list append per stage) and only
+    written to the job store with the job's final status.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._spans = {}
+
+    def record(self, job_id, stage, start, end, track='job', **args):
+        span = {'stage': stage, 'track': track, 'start': start, 'end': end}
+        if args:
+            span['args'] = args
+        with self._lock:
+            self._spans.setdefault(job_id, []).append(span)
+
+    @contextmanager
+    def stage(self, job_id, stage, track='job', **args):
+        """Record the time spent in the with-block as one stage of a job"""
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.record(job_id, stage, start, time.time(), track, **args)
+
+    def spans(self, job_id):
+        with self._lock:
+            return list(self._spans.get(job_id, ()))
+
+    def pop(self, job_id):
+        with self._lock:
+            return self._spans.pop(job_id, [])
+
+job_timelines = JobTimelines()
+
+def format_job_timeline(job):
+    """
+    A job's stages in start order, timed in seconds from the job's creation
+
+    Returns:
+        Dict with the origin timestamp and the list of stages
+    """
+    origin = datetime.fromisoformat(job['created_at']).timestamp()
+    spans = (job.get('timeline') or []) + job_timelines.spans(job['job_id'])
+    stages = []
+    for span in sorted(spans, key=lambda span: span['start']):
+        stage = {
+            'stage': span['stage'],
+            'track': span['track'],
+            'start': round(span['start'] - origin, 4),
+            'end': round(span['end'] - origin, 4),
+            'seconds': round(span['end'] - span['start'], 4)
+        }
+        if span.get('args'):
+            stage['args'] = span['args']
+        stages.append(stage)
+    return {'origin': job['created_at'], 'stages': stages}
+
+def update_job(job_id, **fields):
+    """Thread-safe update of top-level fields on an analysis job, written through to the job store"""
+    if fields.get('status') in JOB_FINAL_STATUSES:
+        # The stage timeline is persisted once, with the final status
+        spans = job_timelines.pop(job_id)
+        if spans:
+            existing = (job_store.get_job(job_id) or {}).get('timeline') or []
+            fields['timeline'] = existing + spans
+    job = job_store.update_job(job_id, fields)
+    if job is None:
+        return None
+    job_events.publish(job_id)
+    if job['status'] in JOB_FINAL_STATUSES:
+        job_events.forget(job_id)
+        if 'status' in fields:
+            jobs_finished.inc(status=job['status'])
+    return job
+
+def update_agent_status(job_id, agent_name, **fields):
+    """Thread-safe update of a single agent's entry in the job's agents"""
+    job = job_store.update_agent(job_id, agent_name, fields)
+    if job is None:
+        return None
+    job_events.publish(job_id)
+    return job
+
+class JobUpdateWriter:
+    """
+    Applies job and agent status updates, and other small blocking calls such as
+    session logging, on one background thread in the order they were posted
+
+    Meant for code on the asyncio engine's event loop, which must not take the
+    job store's locks or write to SQLite itself. Updates to the same job (or the
+    same agent of a job) that are still waiting are merged, later fields
+    winning, so a burst of progress updates costs one write.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._tasks = deque()
+        self._pending_fields = {}
+        self._posted = 0
+        self._applied = 0
+        self._thread = None
+        self.updates_posted = 0
+        self.updates_merged = 0
+        self.errors = 0
+
+    def update_job(self, job_id, **fields):
+        """update_job() on the writer thread"""
+        self._post_update((job_id, None), fields)
+
+    def update_agent_status(self, job_id, agent_name, **fields):
+        """update_agent_status() on the writer thread"""
+        self._post_update((job_id, agent_name), fields)
+
+    def call(self, func, *args, **kwargs):
+        """Run func(*args, **kwargs) on the writer thread, after everything posted before it"""
+        with self._condition:
+            self._append(('call', func, args, kwargs))
+
+    def flush(self, timeout=5):
+        """Wait until everything posted so far has been applied"""
+        with self._condition:
+            target = self._posted
+            self._condition.wait_for(lambda: self._applied >= target, timeout)
+
+    async def flush_async(self, timeout=5):
+        """flush() without blocking the event loop"""
+        await asyncio.to_thread(self.flush, timeout)
+
+    def stats(self):
+        with self._condition:
+            return {
+                'queued': len(self._tasks),
+                'updates_posted': self.updates_posted,
+                'updates_merged': self.updates_merged,
+                'errors': self.errors
+            }
+
+    def _post_update(self, key, fields):
+        with self._condition:
+            self.updates_posted += 1
+            if key in self._pending_fields:
+                self._pending_fields[key].update(fields)
+                self.updates_merged += 1
+                return
+            self._pending_fields[key] = dict(fields)
+            self._append(('update', key))
+
+    def _append(self, task):
+        # Called with the condition held
+        self._tasks.append(task)
+        self._posted += 1
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, daemon=True, name='job-updates')
+            self._thread.start()
+        self._condition.notify_all()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._tasks)
+                task = self._tasks.popleft()
+                if task[0] == 'update':
+                    fields = self._pending_fields.pop(task[1])
+            try:
+                if task[0] == 'update':
+                    job_id, agent_name = task[1]
+                    if agent_name is None:
+                        update_job(job_id, **fields)
+                    else:
+                        update_agent_status(job_id, agent_name, **fields)
+                else:
+                    task[1](*task[2], **task[3])
+            except Exception as e:
+                self.errors += 1
+                print(f"Failed to apply job update {task[1]!r}: {e}")
+            with self._condition:
+                self._applied += 1
+                self._condition.notify_all()
+
+job_updates = JobUpdateWriter()
+# Apply the updates still queued before the session log closes
+atexit.register(job_updates.flush)
+
+class JobQueueFullError(Exception):
+    """Raised when the analysis queue cannot accept another job"""
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class AnalysisJobScheduler:
+    """
+    Fixed pool of worker threads fed from a bounded FIFO queue of analysis jobs
+
+    Jobs stay in the queue until a worker picks them up, so a worker that dies
+    only loses the job it was running. A supervisor thread replaces dead workers.
+    """
+
+    # Used for start time estimates until real job durations are known
+    DEFAULT_JOB_SECONDS = 30.0
+
+    def __init__(self, num_workers, max_queue_size, on_worker_crash=None):
+        self.num_workers = max(1, num_workers)
+        self.max_queue_size = max(1, max_queue_size)
+        self.on_worker_crash = on_worker_crash
+        self._queue = deque()
+        self._running = {}
+        self._durations = deque(maxlen=50)
+        self._workers = []
+        self._cond = threading.Condition()
+        self._supervisor = None
+
+    def submit(self, job_id, func, *args, block=False, timeout=None, max_depth=None):
+        """
+        Queue a job for execution
+
+        Args:
+            job_id: Unique job identifier
+            func: Callable run by a worker as func(*args)
+            block: Wait for queue space instead of failing when the queue is full
+            timeout: Maximum seconds to wait when block is True
+            max_depth: Treat the queue as full at this depth (lets bulk submitters leave room)
+
+        Returns:
+            1-based position of the job in the queue
+
+        Raises:
+            JobQueueFullError: If the queue is full (and block is False or the wait timed out)
+        """
+        limit = min(max_depth or self.max_queue_size, self.max_queue_size)
+        self._ensure_workers()
+        with self._cond:
+            if block:
+                has_space = self._cond.wait_for(
+                    lambda: len(self._queue) < limit, timeout=timeout)
+            else:
+                has_space = len(self._queue) < limit
+            if not has_space:
+                raise JobQueueFullError(
+                    f'Analysis queue is full ({self.max_queue_size} jobs waiting)',
+                    retry_after=self.retry_after())
+
+            self._queue.append({
+                'job_id': job_id,
+                'func': func,
+                'args': args,
+                'queued_at': time.time()
+            })
+            self._cond.notify_all()
+            return len(self._queue)
+
+    def queue_position(self, job_id):
+        """1-based position of a waiting job, or None if it is not queued"""
+        with self._cond:
+            for index, entry in enumerate(self._queue):
+                if entry['job_id'] == job_id:
+                    return index + 1
+        return None
+
+    def average_job_seconds(self):
+        with self._cond:
+            if not self._durations:
+                return self.DEFAULT_JOB_SECONDS
+            return sum(self._durations) / len(self._durations)
+
+    def estimated_wait_seconds(self, position):
+        """Estimate how long until the job at the given queue position starts"""
+        with self._cond:
+            idle_workers = self.num_workers - len(self._running)
+            running_started = sorted(self._running.values())
+        if position <= idle_workers:
+            return 0.0
+
+        average = self.average_job_seconds()
+        # Jobs ahead start as running jobs finish, one "round" per worker slot
+        now = time.time()
+        remaining = sorted(max(0.0, average - (now - started)) for started in running_started)
+        ahead = position - max(0, idle_workers) - 1
+        rounds, slot = divmod(ahead, self.num_workers)
+        first_free = remaining[slot] if slot < len(remaining) else 0.0
+        return first_free + rounds * average
+
+    def retry_after(self):
+        """Seconds a rejected client should wait before retrying"""
+        with self._cond:
+            depth = len(self._queue)
+        return max(1, math.ceil(self.average_job_seconds() * depth / self.num_workers / 2))
+
+    def stats(self):
+        with self._cond:
+            return {
+                'engine': 'threads',
+                'workers': self.num_workers,
+                'alive_workers': sum(1 for worker in self._workers if worker.is_alive()),
+                'queue_depth': len(self._queue),
+                'max_queue_size': self.max_queue_size,
+                'running': len(self._running),
+                'average_job_seconds': round(sum(self._durations) / len(self._durations), 2)
+                if self._durations else None
+            }
+
+    def _ensure_workers(self):
+        """Start the worker pool, replacing any worker thread that has died"""
+        with self._cond:
+            self._workers = [worker for worker in self._workers if worker.is_alive()]
+            while len(self._workers) < self.num_workers:
+                worker = threading.Thread(target=self._worker_loop, daemon=True,
+                                          name=f'analysis-worker-{len(self._workers)}')
+                worker.start()
+                self._workers.append(worker)
+
+            if self._supervisor is None or not self._supervisor.is_alive():
+                self._supervisor = threading.Thread(target=self._supervise, daemon=True,
+                                                    name='analysis-supervisor')
+                self._supervisor.start()
+
+    def _supervise(self):
+        while True:
+            time.sleep(5)
+            self._ensure_workers()
+
+    def _worker_loop(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: len(self._queue) > 0)
+                entry = self._queue.popleft()
+                started_at = time.time()
+                self._running[entry['job_id']] = started_at
+                self._cond.notify_all()
+
+            try:
+                entry['func'](*entry['args'])
+            except BaseException as e:
+                if self.on_worker_crash:
+                    self.on_worker_crash(entry['job_id'], e)
+                if not isinstance(e, Exception):
+                    # Let the thread die; the supervisor starts a replacement
+                    raise
+            finally:
+                with self._cond:
+                    self._running.pop(entry['job_id'], None)
+                    self._durations.append(time.time() - started_at)
+
+def mark_job_crashed(job_id, error):
+    """Record a job whose worker died without reporting a result"""
+    log_openai_session(job_id, 'error', {
+        'action': 'analysis_worker_crashed',
+        'error_message': str(error),
+        'error_type': type(error).__name__
+    })
+    update_job(job_id,
+               status='error',
+               progress=0,
+               message=f'Analysis worker crashed: {str(error)}',
+               error=str(error))
+
+class AsyncAnalysisEngine(AnalysisJobScheduler):
+    """
+    Runs analysis jobs as coroutines on one dedicated event-loop thread
+
+    Same queue, positions and wait estimates as AnalysisJobScheduler, but a job
+    in flight costs a coroutine instead of a worker thread: up to max_in_flight
+    jobs await their OpenAI requests at once over a single async client and
+    connection pool. Blocking stages (image work, parsing, the result cache)
+    go to a small fixed executor. Jobs without a coroutine version in
+    ASYNC_JOB_FUNCTIONS (and the thread-based execution modes) run whole on a
+    separate executor of legacy_workers threads, so they cannot hold up the
+    blocking stages of every other job.
+    """
+
+    def __init__(self, max_in_flight, max_queue_size, cpu_workers=4, max_connections=512,
+                 max_keepalive_connections=64, legacy_workers=4, on_worker_crash=None):
+        super().__init__(max_in_flight, max_queue_size, on_worker_crash=on_worker_crash)
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.cpu_workers = max(1, cpu_workers)
+        self.cpu_executor = ThreadPoolExecutor(max_workers=self.cpu_workers, thread_name_prefix='analysis-cpu')
+        self.legacy_workers = max(1, legacy_workers)
+        self.legacy_executor = ThreadPoolExecutor(max_workers=self.legacy_workers,
+                                                  thread_name_prefix='analysis-legacy')
+        self.loop = None
+        self.openai_client = None
+        self._loop_thread = None
+        self._loop_ready = threading.Event()
+
+    def submit(self, job_id, func, *args, block=False, timeout=None, max_depth=None):
+        position = super().submit(job_id, func, *args, block=block, timeout=timeout, max_depth=max_depth)
+        self.loop.call_soon_threadsafe(self._dispatch)
+        return position
+
+    def stats(self):
+        stats = super().stats()
+        stats.update(engine='asyncio',
+                     alive_workers=1 if self._loop_thread and self._loop_thread.is_alive() else 0,
+                     cpu_workers=self.cpu_workers,
+                     legacy_workers=self.legacy_workers,
+                     max_connections=self.max_connections)
+        return stats
+
+    def _ensure_workers(self):
+        """Start the event-loop thread and wait until its client is ready"""
+        with self._cond:
+            if self._loop_thread is None or not self._loop_thread.is_alive():
+                self._loop_ready.clear()
+                self._loop_thread = threading.Thread(target=self._run_loop, daemon=True,
+                                                     name='analysis-event-loop')
+                self._loop_thread.start()
+        self._loop_ready.wait()
+
+    def _run_loop(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        loop.set_default_executor(self.cpu_executor)
+        # DEFAULT_CONNECTION_LIMITS is an instance of the client library's Limits type
+        limits = type(DEFAULT_CONNECTION_LIMITS)(max_connections=self.max_connections,
+                                                 max_keepalive_connections=self.max_keepalive_connections)
+        # The scheduler owns retries, as for the thread engine's scheduled_client
+        self.openai_client = AsyncOpenAI(api_key=client.api_key, base_url=client.base_url, max_retries=0,
+                                         http_client=DefaultAsyncHttpxClient(limits=limits))
+        self.loop = loop
+        # Jobs queued before a restart of the loop thread are picked up again
+        loop.call_soon(self._dispatch)
+        self._loop_ready.set()
+        loop.run_forever()
+
+    def _dispatch(self):
+        """Start queued jobs while fewer than max_in_flight are running; loop thread only"""
+        with self._cond:
+            while self._queue and len(self._running) < self.num_workers:
+                entry = self._queue.popleft()
+                self._running[entry['job_id']] = time.time()
+                self.loop.create_task(self._run_job(entry))
+            self._cond.notify_all()
+
+    def run_legacy(self, func, *args):
+        """
+        Run a whole thread-based job function on the legacy executor
+
+        Returns:
+            Awaitable for the function's result
+        """
+        return self.loop.run_in_executor(self.legacy_executor, func, *args)
+
+    async def _run_job(self, entry):
+        started_at = time.time()
+        try:
+            coroutine_function = ASYNC_JOB_FUNCTIONS.get(entry['func'])
+            if coroutine_function:
+                await coroutine_function(*entry['args'])
+            else:
+                await self.run_legacy(entry['func'], *entry['args'])
+        except Exception as e:
+            if self.on_worker_crash:
+                # Recording the crash writes the job store; it goes after the job's queued updates
+                job_updates.call(self.on_worker_crash, entry['job_id'], e)
+        finally:
+            with self._cond:
+                self._running.pop(entry['job_id'], None)
+                self._durations.append(time.time() - started_at)
+            self._dispatch()
+
+if app.config['ANALYSIS_ENGINE'] == 'asyncio':
+    job_scheduler = AsyncAnalysisEngine(
+        max_in_flight=app.config['ASYNC_MAX_IN_FLIGHT'],
+        max_queue_size=app.config['ANALYSIS_QUEUE_SIZE'],
+        cpu_workers=app.config['ASYNC_CPU_WORKERS'],
+        max_connections=app.config['ASYNC_HTTP_MAX_CONNECTIONS'],
+        max_keepalive_connections=app.config['ASYNC_HTTP_MAX_KEEPALIVE'],
+        legacy_workers=app.config['ANALYSIS_WORKERS'],
+        on_worker_crash=mark_job_crashed
+    )
+else:
+    job_scheduler = AnalysisJobScheduler(
+        num_workers=app.config['ANALYSIS_WORKERS'],
+        max_queue_size=app.config['ANALYSIS_QUEUE_SIZE'],
+        on_worker_crash=mark_job_crashed
+    )
+metrics.gauge('ballot_job_queue_depth', 'Jobs waiting for an analysis worker',
+              function=lambda: job_scheduler.stats()['queue_depth'])
+metrics.gauge('ballot_jobs_in_flight', 'Jobs being analyzed right now',
+              function=lambda: job_scheduler.stats()['running'])
+
+def allowed_file(filename):
+    """Check if file extension is allowed"""
+    return '.' in filename and \
+           filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
+
+def validate_and_resize_image(filepath):
+    """Validate image and resize if necessary"""
+    started_at = time.time()
+    started = time.perf_counter()
+    try:
+        with Image.open(filepath) as img:
+            # Check if image is valid
+            img.verify()
+            
+        # Reopen for processing (verify closes the file)
+        with Image.open(filepath) as img:
+            # Check dimensions and resize if needed
+            max_dim = app.config['MAX_IMAGE_DIMENSION']
+            resized = img.width > max_dim or img.height > max_dim
+            if resized:
+                img.thumbnail((max_dim, max_dim), Image.Resampling.LANCZOS)
+                img.save(filepath, 'PNG', optimize=True)
+            seconds = time.perf_counter() - started
+            image_resize_seconds.observe(seconds, resized=str(resized).lower())
+                
+            return {
+                'width': img.width,
+                'height': img.height,
+                'format': img.format,
+                'mode': img.mode,
+                'validation': {'started_at': started_at, 'seconds': round(seconds, 4), 'resized': resized}
+            }
+    except Exception as e:
+        raise ValueError(f"Invalid image file: {str(e)}")
+
+# Vision token accounting for "detail: high" images (OpenAI GPT-4o)
+VISION_MAX_SIDE = 2048
+VISION_SHORT_SIDE = 768
+VISION_TILE_SIZE = 512
+VISION_BASE_TOKENS = 85
+VISION_TILE_TOKENS = 170
+
+IMAGE_PREPROCESS_MODES = ('none', 'grayscale', 'bilevel')
+
+def model_vision_size(width, height):
+    """Size the model actually looks at after its own downscaling"""
+    scale = min(1.0, VISION_MAX_SIDE / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, VISION_SHORT_SIDE / min(width, height))
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+def estimate_image_tokens(width, height, detail='high'):
+    """Estimate the input tokens an image costs at the given detail level"""
+    if detail == 'low':
+        return VISION_BASE_TOKENS
+    width, height = model_vision_size(width, height)
+    tiles = math.ceil(width / VISION_TILE_SIZE) * math.ceil(height / VISION_TILE_SIZE)
+    return VISION_BASE_TOKENS + VISION_TILE_TOKENS * tiles
+
+def fit_to_tile_grid(width, height, slack):
+    """
+    Pick the output size for an image so it lands on the model's tile grid
+
+    Starts from the size the model would downscale to anyway, then shrinks by at
+    most `slack` (a fraction) if that drops a partially used row or column of tiles.
+    """
+    vision_width, vision_height = model_vision_size(width, height)
+    best_tokens = estimate_image_tokens(vision_width, vision_height)
+    best_scale = 1.0
+    for dimension in (vision_width, vision_height):
+        for tiles in range(1, math.ceil(dimension / VISION_TILE_SIZE)):
+            scale = VISION_TILE_SIZE * tiles / dimension
+            if scale < 1 - slack:
+                continue
+            tokens = estimate_image_tokens(int(vision_width * scale), int(vision_height * scale))
+            if tokens < best_tokens or (tokens == best_tokens and scale > best_scale):
+                best_tokens, best_scale = tokens, scale
+    return int(vision_width * best_scale), int(vision_height * best_scale)
+
+def ink_profile(gray_image, axis, threshold):
+    """Count of dark pixels per column (axis=0) or per row (axis=1), scaled to 0-255"""
+    ink = gray_image.point(lambda p: 255 if p < threshold else 0)
+    if axis == 0:
+        profile = ink.resize((ink.width, 1), Image.Resampling.BOX)
+    else:
+        profile = ink.resize((1, ink.height), Image.Resampling.BOX)
+    return list(profile.tobytes())
+
+def find_content_edge(profile, from_end, max_strip, min_gap, max_trim):
+    """
+    Find where ballot content starts, scanning in from one edge of an ink profile
+
+    White margin is skipped, and so are narrow strips of ink separated from the
+    rest by white space (corner marks, timing marks and their labels), up to max_trim.
+    """
+    values = profile[::-1] if from_end else profile
+    length = len(values)
+    position = 0
+    content_start = 0
+    while position < min(length, max_trim):
+        # Skip white space
+        while position < length and values[position] == 0:
+            position += 1
+        run_start = position
+        while position < length and values[position] > 0:
+            position += 1
+        run_width = position - run_start
+        gap_start = position
+        while position < length and values[position] == 0:
+            position += 1
+        gap_width = position - gap_start
+        content_start = run_start
+        if run_width > max_strip or gap_width < min_gap or position >= max_trim:
+            break
+        content_start = position
+    content_start = min(content_start, max_trim)
+    return length - content_start if from_end else content_start
+
+def find_content_box(gray_image, threshold):
+    """
+    Bounding box of the printed ballot content, without margins or registration marks
+
+    Returns:
+        (left, top, right, bottom) tuple, or None when there is nothing to trim
+    """
+    width, height = gray_image.size
+    columns = ink_profile(gray_image, 0, threshold)
+    rows = ink_profile(gray_image, 1, threshold)
+    strip_width, strip_height = max(4, width // 25), max(4, height // 25)
+    gap_width, gap_height = max(2, width // 250), max(2, height // 250)
+    left = find_content_edge(columns, False, strip_width, gap_width, width // 10)
+    right = find_content_edge(columns, True, strip_width, gap_width, width // 10)
+    top = find_content_edge(rows, False, strip_height, gap_height, height // 10)
+    bottom = find_content_edge(rows, True, strip_height, gap_height, height // 10)
+    padding = max(2, min(width, height) // 150)
+    box = (max(0, left - padding), max(0, top - padding),
+           min(width, right + padding), min(height, bottom + padding))
+    if box[2] <= box[0] or box[3] <= box[1] or box == (0, 0, width, height):
+        return None
+    return box
+
+def preprocess_ballot_image(image_path, mode='grayscale', trim_margins=True, fit_tiles=True,
+                            tile_slack=0.10, bilevel_threshold=160, crop_box=None):
+    """
+    Reduce a ballot image to what the model needs to read it
+
+    Args:
+        image_path: Path to the uploaded PNG
+        mode: 'none' (keep colour), 'grayscale' or 'bilevel' (1-bit)
+        trim_margins: Crop white margins and the registration/timing marks around the ballot
+        fit_tiles: Resize to the model's effective resolution, snapped to its tile grid
+        tile_slack: Largest extra downscale (fraction) allowed to save a row/column of tiles
+        bilevel_threshold: Gray level below which a pixel becomes black in bilevel mode
+        crop_box: Region (left, top, right, bottom) of the original to keep instead of trimming
+
+    Returns:
+        Tuple of (png_bytes, report)
+    """
+    started = time.perf_counter()
+    with Image.open(image_path) as img:
+        img.load()
+    original_size = img.size
+    steps = []
+
+    # Flatten transparency onto white so it does not read as black
+    if img.mode in ('RGBA', 'LA', 'P'):
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        background.paste(img.convert('RGBA'), mask=img.convert('RGBA').split()[-1])
+        img = background
+
+    if mode in ('grayscale', 'bilevel'):
+        img = img.convert('L')
+        steps.append('grayscale')
+
+    trim_box = None
+    if crop_box:
+        trim_box = tuple(crop_box)
+        img = img.crop(trim_box)
+        steps.append('crop')
+    elif trim_margins:
+        trim_box = find_content_box(img.convert('L'), bilevel_threshold)
+        if trim_box:
+            img = img.crop(trim_box)
+            steps.append('trim_margins')
+
+    if fit_tiles:
+        target = fit_to_tile_grid(img.width, img.height, tile_slack)
+        if target != img.size:
+            img = img.resize(target, Image.Resampling.LANCZOS)
+            steps.append('fit_tiles')
+
+    if mode == 'bilevel':
+        img = img.point(lambda p: 255 if p >= bilevel_threshold else 0).convert('1', dither=Image.Dither.NONE)
+        steps.append('bilevel')
+
+    buffer = io.BytesIO()
+    img.save(buffer, 'PNG', optimize=True)
+    png_bytes = buffer.getvalue()
+
+    report = {
+        'steps': steps,
+        'mode': mode,
+        'original_size': list(original_size),
+        'processed_size': list(img.size),
+        'trim_box': list(trim_box) if trim_box else None,
+        'bytes_before': os.path.getsize(image_path),
+        'bytes_after': len(png_bytes),
+        'estimated_tokens_before': estimate_image_tokens(*original_size),
+        'estimated_tokens_after': estimate_image_tokens(*img.size),
+        'seconds': round(time.perf_counter() - started, 3)
+    }
+    return png_bytes, report
+
+def image_preprocess_options():
+    """Preprocessing options from the app configuration, or None when disabled"""
+    options = {
+        'mode': app.config['IMAGE_PREPROCESS_MODE'],
+        'trim_margins': app.config['IMAGE_TRIM_MARGINS'],
+        'fit_tiles': app.config['IMAGE_FIT_TILES'],
+        'tile_slack': app.config['IMAGE_TILE_SLACK'],
+        'bilevel_threshold': app.config['IMAGE_BILEVEL_THRESHOLD']
+    }
+    if options['mode'] not in IMAGE_PREPROCESS_MODES:
+        raise ValueError(f"IMAGE_PREPROCESS_MODE must be one of: {', '.join(IMAGE_PREPROCESS_MODES)}")
+    if options['mode'] == 'none' and not options['trim_margins'] and not options['fit_tiles']:
+        return None
+    return options
+
+TILING_MODES = ('page', 'columns')
+
+def detect_ballot_columns(image_path, threshold=160, max_columns=4, overlap=0.02):
+    """
+    Find the ballot's columns from a vertical projection profile of its content area
+
+    Columns are split at white gutters or at the full-height rules drawn between
+    boxed columns. Each box is widened by `overlap` (a fraction of the content width)
+    so ovals sitting on a boundary appear whole in at least one crop.
+
+    Returns:
+        List of (left, top, right, bottom) boxes in original image coordinates,
+        a single content box when no column structure is found
+    """
+    with Image.open(image_path) as img:
+        gray = img.convert('L')
+    content_box = find_content_box(gray, threshold) or (0, 0, gray.width, gray.height)
+    profile = ink_profile(gray.crop(content_box), 0, threshold)
+    width = len(profile)
+    min_column = width // (max_columns * 2)
+    min_gutter = max(2, width // 100)
+
+    # Runs of (nearly) blank columns, or columns inked on at least half the rows
+    separators = []
+    position = 0
+    while position < width:
+        is_gutter = profile[position] <= 2
+        is_rule = profile[position] >= 128
+        if not (is_gutter or is_rule):
+            position += 1
+            continue
+        run_start = position
+        while position < width and (profile[position] <= 2) == is_gutter and (profile[position] >= 128) == is_rule:
+            position += 1
+        if is_gutter and position - run_start < min_gutter:
+            continue
+        center = (run_start + position) // 2
+        if center < min_column or center > width - min_column:
+            continue
+        if separators and center - separators[-1] < min_column:
+            continue
+        separators.append(center)
+
+    if not separators or len(separators) >= max_columns:
+        return [content_box]
+
+    left, top, right, bottom = content_box
+    margin = int(width * overlap)
+    edges = [0] + separators + [width]
+    return [
+        (max(left, left + edges[i] - margin), top, min(right, left + edges[i + 1] + margin), bottom)
+        for i in range(len(edges) - 1)
+    ]
+
+INK_RUN_PATTERN = re.compile(rb'\x00+')
+
+def find_ink_components(pixels, width, height):
+    """
+    Label the 8-connected ink components of a binarized image
+
+    Args:
+        pixels: Row-major bytes, 0 for ink and 255 for paper
+        width: Image width
+        height: Image height
+
+    Returns:
+        List of [left, top, right, bottom, pixel_count] boxes (right/bottom exclusive)
+    """
+    parent = []
+
+    def find(label):
+        while parent[label] != label:
+            parent[label] = parent[parent[label]]
+            label = parent[label]
+        return label
+
+    runs = []
+    previous = []
+    for y in range(height):
+        current = []
+        start_index = 0
+        for match in INK_RUN_PATTERN.finditer(pixels, y * width, (y + 1) * width):
+            start, end = match.start() - y * width, match.end() - y * width
+            label = None
+            # Runs on the previous row touching this one, diagonals included
+            while start_index < len(previous) and previous[start_index][1] < start:
+                start_index += 1
+            index = start_index
+            while index < len(previous) and previous[index][0] <= end:
+                root = find(previous[index][2])
+                if label is None:
+                    label = root
+                elif root != label:
+                    parent[root] = label
+                index += 1
+            if label is None:
+                label = len(parent)
+                parent.append(label)
+            current.append((start, end, label))
+            runs.append((y, start, end, label))
+        previous = current
+
+    components = {}
+    for y, start, end, label in runs:
+        root = find(label)
+        box = components.get(root)
+        if box is None:
+            components[root] = [start, y, end, y + 1, end - start]
+        else:
+            box[0] = min(box[0], start)
+            box[2] = max(box[2], end)
+            box[3] = y + 1
+            box[4] += end - start
+    return list(components.values())
+
+def is_oval_outline(pixels, width, box):
+    """True when the ink inside a box forms a hollow ellipse touching its bounding box"""
+    left, top, right, bottom = box[:4]
+    radius_x, radius_y = (right - left) / 2, (bottom - top) / 2
+    center_x, center_y = left + radius_x, top + radius_y
+    ring_pixels = ring_ink = 0
+    for y in range(top, bottom):
+        for x in range(left, right):
+            distance = ((x + 0.5 - center_x) / radius_x) ** 2 + ((y + 0.5 - center_y) / radius_y) ** 2
+            ink = pixels[y * width + x] == 0
+            if distance < 0.3 and ink:
+                return False
+            if distance > 1.4 and ink:
+                return False
+            if 0.55 <= distance <= 1.0:
+                ring_pixels += 1
+                ring_ink += ink
+    return ring_pixels > 0 and ring_ink / ring_pixels >= 0.6
+
+def detect_missing_ovals(image_path, contest_data=None, threshold=160):
+    """
+    Check every candidate row for a voting oval without calling the model
+
+    Ovals are found as hollow elliptical ink components that line up in a
+    vertical "target" column with nothing printed just to their left. The
+    candidate names start at a fixed indent to the right of that column, so
+    any text line starting at the name indent with no oval in front of it is
+    a candidate row missing its oval.
+
+    Args:
+        image_path: Path to the ballot PNG
+        contest_data: Output of parse_contest_text; when given, the oval count is checked
+            against its candidates plus one write-in line per seat
+        threshold: Gray level below which a pixel counts as ink
+
+    Returns:
+        Report dict; 'status' is 'clean' (every row has an oval and the counts
+        agree), 'anomaly' (problems found) or 'uncertain' (the layout could not
+        be read confidently), and 'findings' uses the agent findings structure
+    """
+    started = time.perf_counter()
+    with Image.open(image_path) as img:
+        img = img.convert('RGBA')
+    page = Image.new('RGB', img.size, (255, 255, 255))
+    page.paste(img, mask=img.split()[-1])
+    gray = page.convert('L')
+    width, height = gray.size
+    pixels = gray.point(lambda p: 0 if p < threshold else 255).tobytes()
+
+    def ink_in(left, top, right, bottom):
+        left, right = max(0, left), min(width, right)
+        return any(pixels[y * width + left:y * width + right].count(0) for y in range(max(0, top), min(height, bottom)))
+
+    # Registration and timing marks outside the printed area are not candidates
+    content_left, content_top, content_right, content_bottom = find_content_box(gray, threshold) or (0, 0, width, height)
+    components = [
+        box for box in find_ink_components(pixels, width, height)
+        if box[0] >= content_left and box[1] >= content_top and box[2] <= content_right and box[3] <= content_bottom
+    ]
+
+    # Hollow ellipses of a plausible size with white space on their left
+    ovals = []
+    for box in components:
+        box_width, box_height = box[2] - box[0], box[3] - box[1]
+        if not (width / 150 <= box_width <= width / 25 and box_width / 2.5 <= box_height <= box_width / 1.1):
+            continue
+        if not is_oval_outline(pixels, width, box):
+            continue
+        if ink_in(box[0] - max(2, box_width // 2), box[1], box[0], box[3]):
+            continue
+        ovals.append(box)
+
+    reasons = []
+    missing = []
+    irregular = []
+    candidate_rows = 0
+    target_columns = []
+    if ovals:
+        oval_width = statistics.median(box[2] - box[0] for box in ovals)
+        oval_height = statistics.median(box[3] - box[1] for box in ovals)
+        tolerance = max(2, int(oval_width // 4))
+
+        # Ovals sharing a left edge form one target column
+        for box in sorted(ovals):
+            if target_columns and box[0] - target_columns[-1]['x'] <= tolerance:
+                target_columns[-1]['ovals'].append(box)
+            else:
+                target_columns.append({'x': box[0], 'ovals': [box]})
+        target_columns = [column for column in target_columns if len(column['ovals']) >= 2]
+
+        for box in ovals:
+            if abs((box[2] - box[0]) - oval_width) > oval_width * 0.35 or \
+                    abs((box[3] - box[1]) - oval_height) > oval_height * 0.35:
+                irregular.append(box)
+
+        for column in target_columns:
+            # Where the candidate names start: first ink to the right of each oval
+            starts = []
+            for box in column['ovals']:
+                row = (box[1] + box[3]) // 2
+                for x in range(box[2] + 1, min(width, box[2] + int(oval_width * 4))):
+                    if pixels[row * width + x] == 0:
+                        starts.append(x)
+                        break
+            if not starts:
+                continue
+            name_x = int(statistics.median(starts))
+            column['name_x'] = name_x
+            span_top = min(box[1] for box in column['ovals']) - int(oval_height * 3)
+            span_bottom = max(box[3] for box in column['ovals']) + int(oval_height * 3)
+
+            # Text lines whose first letter sits at the name indent
+            lines = []
+            for box in components:
+                if abs(box[0] - name_x) > tolerance or box in column['ovals']:
+                    continue
+                if not span_top <= box[1] <= span_bottom:
+                    continue
+                if not (oval_height * 0.5 <= box[3] - box[1] <= oval_height * 3):
+                    continue
+                if lines and box[1] <= lines[-1][1] and box[3] >= lines[-1][0]:
+                    lines[-1] = [min(lines[-1][0], box[1]), max(lines[-1][1], box[3])]
+                else:
+                    lines.append([box[1], box[3]])
+                lines.sort()
+
+            previous_line = None
+            for line_top, line_bottom in lines:
+                has_oval = any(line_top - oval_height <= (box[1] + box[3]) / 2 <= line_bottom + oval_height
+                               for box in column['ovals'])
+                slot = (column['x'] - tolerance, line_top, column['x'] + int(oval_width) + tolerance, line_bottom)
+                # Text running through the gap before the name indent is a heading or
+                # instructions, not a candidate row
+                if not has_oval and ink_in(slot[2], line_top, name_x - 1, line_bottom):
+                    continue
+                # A second line of a long name: no rule separates it from the row above
+                continuation = (not has_oval and previous_line is not None and previous_line[2]
+                                and line_top - previous_line[1] < (line_bottom - line_top)
+                                and not any(pixels[y * width + name_x:y * width + name_x + int(oval_width * 3)].count(0)
+                                            >= oval_width * 3 * 0.9
+                                            for y in range(previous_line[1], line_top)))
+                previous_line = (line_top, line_bottom, has_oval)
+                if continuation:
+                    continue
+                candidate_rows += 1
+                if not has_oval:
+                    missing.append({
+                        'box': [slot[0], line_top, name_x + int(oval_width * 3), line_bottom],
+                        'malformed': ink_in(*slot)
+                    })
+
+    ballot_columns = detect_ballot_columns(image_path, threshold=threshold)
+    oval_count = sum(len(column['ovals']) for column in target_columns)
+    expected_oval_count = None
+    if not target_columns:
+        reasons.append('No column of voting ovals was found')
+    else:
+        empty_columns = [
+            index for index, (left, _, right, _) in enumerate(ballot_columns, start=1)
+            if not any(left <= column['x'] < right for column in target_columns)
+        ]
+        if empty_columns:
+            reasons.append(f"No voting ovals found in ballot column{'s' if len(empty_columns) != 1 else ''} "
+                           f"{', '.join(str(index) for index in empty_columns)}")
+    if contest_data and contest_data.get('contests'):
+        expected_oval_count = sum(len(contest['candidates']) + contest.get('vote_for', 1)
+                                  for contest in contest_data['contests'])
+        if oval_count + len(missing) != expected_oval_count:
+            reasons.append(f'Found {oval_count + len(missing)} candidate rows but the contest data '
+                           f'lists {expected_oval_count} candidates and write-in lines')
+
+    def column_of(x):
+        for index, (left, _, right, _) in enumerate(ballot_columns, start=1):
+            if left <= x < right:
+                return index
+        return None
+
+    missing_ovals = [
+        {
+            'description': (f"Candidate row at x={row['box'][0]}, y={row['box'][1]} "
+                            + ('has a mark in the oval position that is not a proper oval'
+                               if row['malformed'] else 'has no voting oval')),
+            'confidence': 'medium',
+            'column': column_of(row['box'][0]),
+            'box': row['box']
+        }
+        for row in missing
+    ]
+    other_issues = [
+        {
+            'description': f"Oval at x={box[0]}, y={box[1]} is {box[2] - box[0]}x{box[3] - box[1]} px, "
+                           f"unlike the other ovals",
+            'type': 'layout',
+            'column': column_of(box[0]),
+            'box': box[:4]
+        }
+        for box in irregular
+    ]
+    total_issues = len(missing_ovals) + len(other_issues)
+    if total_issues:
+        status = 'anomaly'
+        summary = (f"Local detector found {len(missing_ovals)} candidate row{'s' if len(missing_ovals) != 1 else ''} "
+                   f"without an oval and {len(other_issues)} irregular oval{'s' if len(other_issues) != 1 else ''}.")
+    elif reasons:
+        status = 'uncertain'
+        summary = 'Local detector could not confirm the ballot: ' + '; '.join(reasons)
+    else:
+        status = 'clean'
+        summary = f'No issues detected. All {candidate_rows} candidate rows have voting ovals.'
+
+    return {
+        'status': status,
+        'reasons': reasons,
+        'oval_count': oval_count,
+        'candidate_rows': candidate_rows,
+        'expected_oval_count': expected_oval_count,
+        'target_columns': [{'x': column['x'], 'name_x': column.get('name_x'), 'ovals': len(column['ovals'])}
+                           for column in target_columns],
+        'seconds': round(time.perf_counter() - started, 3),
+        'findings': {
+            'summary': summary,
+            'total_issues': total_issues,
+            'confidence_summary': ('Geometric check of every candidate row.' if status == 'clean'
+                                   else 'Local detector result; confirm with the model.'),
+            'detailed_analysis': '',
+            'analysis_status': 'no_issues_found' if status == 'clean' else 'completed',
+            'parsing_method': 'local_detector',
+            'missing_ovals': missing_ovals,
+            'other_issues': other_issues,
+            'sections': {
+                'general_observations': [],
+                'specific_findings': [],
+                'recommendations': []
+            }
+        }
+    }
+
+def parse_contest_text(text):
+    """Parse contest and candidate data from text format"""
+    contests = []
+    current_contest = None
+    
+    lines = text.strip().split('\n')
+    i = 0
+    
+    while i < len(lines):
+        line = lines[i].rstrip()
+        
+        # Skip empty lines
+        if not line:
+            i += 1
+            continue
+            
+        # If line doesn't start with space, it's a contest name
+        if not line.startswith(' ') and not line.startswith('\t'):
+            # Save previous contest if exists
+            if current_contest:
+                contests.append(current_contest)
+            
+            # Extract vote count from parentheses if present
+            vote_for = 1
+            contest_name = line
+            if '(' in line and ')' in line:
+                parts = line.split('(')
+                contest_name = parts[0].strip()
+                vote_count_str = parts[1].split(')')[0].strip()
+                try:
+                    vote_for = int(vote_count_str)
+                except ValueError:
+                    pass  # Keep default of 1
+            
+            current_contest = {
+                'title': contest_name,
+                'candidates': [],
+                'reporting_units': '',
+                'vote_for': vote_for
+            }
+        else:
+            # Line starts with space/tab - it's either a candidate or reporting units
+            content = line.strip()
+            if content.startswith('Reporting Units:'):
+                if current_contest:
+                    current_contest['reporting_units'] = content.replace('Reporting Units:', '').strip()
+            else:
+                # It's a candidate name
+                if current_contest and content:
+                    current_contest['candidates'].append(content)
+        
+        i += 1
+    
+    # Don't forget the last contest
+    if current_contest:
+        contests.append(current_contest)
+    
+    return {'contests': contests}
+
+def format_contest_text(contest_data):
+    """Format stored contest data as the text block sent to the spelling agent"""
+    if contest_data and 'raw_text' in contest_data:
+        return contest_data['raw_text']
+    if not contest_data or 'parsed_data' not in contest_data:
+        return ""
+
+    # Reconstruct text from parsed data
+    contests = contest_data['parsed_data'].get('contests', [])
+    text_parts = []
+    for contest in contests:
+        title = contest['title']
+        if contest['vote_for'] > 1:
+            title += f" ({contest['vote_for']})"
+        text_parts.append(title)
+        for candidate in contest['candidates']:
+            text_parts.append(f"  {candidate}")
+        if contest['reporting_units']:
+            text_parts.append(f"  Reporting Units: {contest['reporting_units']}")
+        text_parts.append("")  # Empty line between contests
+    return "\n".join(text_parts)
+
+def normalize_contest_text(contest_text):
+    """Normalize contest text so whitespace-only edits map to the same cache entry"""
+    text = unicodedata.normalize('NFC', contest_text or '')
+    lines = []
+    for line in text.replace('\r\n', '\n').split('\n'):
+        line = line.replace('\t', '  ').rstrip()
+        if line.strip():
+            # Keep the indented/not-indented distinction the parser relies on
+            lines.append(('  ' if line[0] == ' ' else '') + ' '.join(line.split()))
+        elif lines and lines[-1]:
+            lines.append('')
+    return '\n'.join(lines).strip()
+
+# One reporting unit, e.g. "V Maple Bluff Wds 1-2": municipality type (City/Town/Village), name and wards
+REPORTING_UNIT_PATTERN = re.compile(
+    r"\b([CTVctv])\s+([^,;]+?)\s+(?i:wds?|wards?)\.?\s+(\d+(?:\s*-\s*\d+)?(?:\s*,\s*\d+(?:\s*-\s*\d+)?)*)")
+# "Wd"/"Wards" left over once every ward list the pattern understands is taken out
+WARD_WORD_PATTERN = re.compile(r'\b(?:wds?|wards?)\b', re.IGNORECASE)
+
+# Wards are kept as (low, high) ranges and never expanded, but the numbers are still bounded
+MAX_WARD_NUMBER = 9999
+MAX_WARD_RANGE = 1000
+
+def merge_ward_ranges(ranges):
+    """Sorted, non-overlapping (low, high) ranges covering the same wards; adjacent ranges are joined"""
+    merged = []
+    for low, high in sorted(ranges):
+        if merged and low <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], high))
+        else:
+            merged.append((low, high))
+    return merged
+
+def parse_ward_ranges(text):
+    """
+    Wards listed as "1-4, 7" -> [(1, 4), (7, 7)]
+
+    Raises:
+        ValueError: If a bound is not a ward number, a range runs backwards, or a
+            ward or range exceeds MAX_WARD_NUMBER / MAX_WARD_RANGE
+    """
+    ranges = []
+    for part in text.split(','):
+        shown = part.strip()[:40]
+        bounds = [bound.strip() for bound in part.split('-')]
+        if len(bounds) > 2 or not all(bound.isdigit() for bound in bounds):
+            raise ValueError(f'Ward range not understood: {shown}')
+        if any(len(bound) > len(str(MAX_WARD_NUMBER)) for bound in bounds):
+            raise ValueError(f'Ward numbers must be between 1 and {MAX_WARD_NUMBER}: {shown}')
+        low, high = int(bounds[0]), int(bounds[-1])
+        if low < 1 or high > MAX_WARD_NUMBER:
+            raise ValueError(f'Ward numbers must be between 1 and {MAX_WARD_NUMBER}: {shown}')
+        if low > high:
+            raise ValueError(f'Ward range runs backwards: {shown}')
+        if high - low + 1 > MAX_WARD_RANGE:
+            raise ValueError(f'Ward range covers more than {MAX_WARD_RANGE} wards: {shown}')
+        ranges.append((low, high))
+    return merge_ward_ranges(ranges)
+
+def format_ward_ranges(ranges):
+    """[(1, 4), (7, 7)] -> "1-4, 7" """
+    return ', '.join(str(low) if low == high else f'{low}-{high}' for low, high in merge_ward_ranges(ranges))
+
+def subtract_ward_ranges(ranges, covered):
+    """The parts of ranges not in covered (both merged range lists)"""
+    remaining = []
+    for low, high in ranges:
+        for covered_low, covered_high in covered:
+            if covered_high < low or covered_low > high:
+                continue
+            if covered_low > low:
+                remaining.append((low, covered_low - 1))
+            low = covered_high + 1
+            if low > high:
+                break
+        if low <= high:
+            remaining.append((low, high))
+    return remaining
+
+def parse_reporting_units(text):
+    """
+    Parse a contest's reporting units
+
+    Args:
+        text: The contest's "Reporting Units:" value, e.g. "T Albion Wds 1-4, V Maple Bluff Wds 1-2"
+
+    Returns:
+        None when the contest is on every ballot ("All Reporting Units" or blank),
+        otherwise a dict mapping each municipality ("V Maple Bluff") to its merged
+        list of (low, high) ward ranges, or to None when no wards are listed (the
+        whole municipality)
+
+    Raises:
+        ValueError: If a ward list is malformed or out of bounds (see parse_ward_ranges)
+    """
+    text = ' '.join((text or '').split())
+    if not text or text.lower() == 'all reporting units':
+        return None
+    units = {}
+    unmatched = []
+    last = 0
+    for match in REPORTING_UNIT_PATTERN.finditer(text):
+        unmatched.append(text[last:match.start()])
+        last = match.end()
+        municipality = f'{match.group(1)} {match.group(2)}'
+        if municipality not in units or units[municipality] is not None:
+            units[municipality] = merge_ward_ranges((units.get(municipality) or []) +
+                                                    parse_ward_ranges(match.group(3)))
+    unmatched.append(text[last:])
+    # Anything else names a whole municipality
+    for piece in re.split(r'[,;]', ','.join(unmatched)):
+        piece = piece.strip()
+        if WARD_WORD_PATTERN.search(piece) or piece[:1].isdigit() or piece.startswith('-'):
+            raise ValueError(f'Ward list not understood: {piece[:40]}')
+        if piece:
+            units[piece] = None
+    return units
+
+class ReportingUnitIndex:
+    """
+    Which contests are on which ballots, from the contests' reporting units
+
+    Contests for all reporting units are on every ballot; the rest are indexed
+    by municipality and ward range. Ward ranges are cut at every point where a
+    contest starts or stops, so each resulting segment of wards sees the same
+    contests. Segments that see the same contests share a ballot style,
+    numbered from 1 in municipality and ward order.
+
+    Raises:
+        ValueError: If a contest's reporting units cannot be parsed
+    """
+
+    def __init__(self, contests):
+        self.contests = contests
+        self._everywhere = []
+        self._ward_ranges = {}
+        self._whole_municipality = {}
+        self._wards = {}
+        # Municipalities are matched case-insensitively; keep the spelling from the contest list
+        self._names = {}
+        for position, contest in enumerate(contests):
+            try:
+                units = parse_reporting_units(contest.get('reporting_units'))
+            except ValueError as e:
+                raise ValueError(f"{contest['title']}: {e}")
+            if units is None:
+                self._everywhere.append(position)
+                continue
+            for municipality, wards in units.items():
+                key = municipality.lower()
+                self._names.setdefault(key, municipality)
+                self._wards.setdefault(key, [])
+                if wards is None:
+                    self._whole_municipality.setdefault(key, []).append(position)
+                    continue
+                self._wards[key] = merge_ward_ranges(self._wards[key] + wards)
+                self._ward_ranges.setdefault(key, []).extend((low, high, position) for low, high in wards)
+
+        self.ballot_styles = []
+        style_by_positions = {}
+        for key in sorted(self._wards):
+            for segment in self._segments(key) or [None]:
+                positions = tuple(self._positions(key, [segment] if segment else None))
+                style = style_by_positions.get(positions)
+                if style is None:
+                    style = style_by_positions[positions] = {
+                        'ballot_style': len(self.ballot_styles) + 1,
+                        'wards': {},
+                        'positions': positions
+                    }
+                    self.ballot_styles.append(style)
+                style['wards'].setdefault(key, [])
+                if segment is not None:
+                    style['wards'][key].append(segment)
+
+    def _segments(self, key):
+        """A municipality's known wards cut into ranges whose wards all see the same contests"""
+        cuts = sorted({low for low, _, _ in self._ward_ranges.get(key, [])} |
+                      {high + 1 for _, high, _ in self._ward_ranges.get(key, [])})
+        segments = []
+        for low, high in self._wards[key]:
+            starts = [low] + [cut for cut in cuts if low < cut <= high]
+            segments.extend((start, end - 1) for start, end in zip(starts, starts[1:] + [high + 1]))
+        return segments
+
+    def _positions(self, key, wards):
+        """Positions, in contest list order, of the contests on a ballot for some ward ranges (None: any ward)"""
+        positions = set(self._everywhere) | set(self._whole_municipality.get(key, []))
+        wards = self._wards[key] if wards is None else wards
+        for contest_low, contest_high, position in self._ward_ranges.get(key, []):
+            if any(low <= contest_high and contest_low <= high for low, high in wards):
+                positions.add(position)
+        return sorted(positions)
+
+    def describe(self):
+        """Ballot styles with their reporting units and contest titles"""
+        return [{
+            'ballot_style': style['ballot_style'],
+            'reporting_units': [
+                f"{self._names[key]} Wds {format_ward_ranges(wards)}" if wards else self._names[key]
+                for key, wards in style['wards'].items()
+            ],
+            'contests': [self.contests[position]['title'] for position in style['positions']]
+        } for style in self.ballot_styles]
+
+    def select(self, ballot_style=None, reporting_unit=None):
+        """
+        Contests on the ballots of one ballot style or reporting unit
+
+        Args:
+            ballot_style: Ballot style number, as listed by describe()
+            reporting_unit: Reporting unit(s) in the contest list's notation, e.g.
+                "V Maple Bluff Wd 2" or "T Albion" (every ward of the town)
+
+        Returns:
+            The matching contests, in contest list order
+
+        Raises:
+            ValueError: If the ballot style or a reporting unit or ward is unknown,
+                or the ward list is malformed
+        """
+        if ballot_style is not None:
+            try:
+                style = self.ballot_styles[int(ballot_style) - 1] if int(ballot_style) >= 1 else None
+            except (IndexError, TypeError, ValueError):
+                style = None
+            if style is None:
+                raise ValueError(f'Unknown ballot style: {ballot_style} '
+                                 f'(this contest list has {len(self.ballot_styles)})')
+            return [self.contests[position] for position in style['positions']]
+
+        units = parse_reporting_units(str(reporting_unit))
+        if units is None:
+            return list(self.contests)
+        positions = set()
+        for municipality, wards in units.items():
+            key = municipality.lower()
+            if key not in self._wards:
+                raise ValueError(f'Unknown reporting unit: {municipality}')
+            unknown = subtract_ward_ranges(wards or [], self._wards[key])
+            if unknown:
+                raise ValueError(f'{self._names[key]} has no ward {format_ward_ranges(unknown)} in this contest list')
+            positions.update(self._positions(key, wards))
+        return [self.contests[position] for position in sorted(positions)]
+
+# Indexes of recently used contest lists (contest data never changes once stored)
+_reporting_unit_indexes = OrderedDict()
+_reporting_unit_indexes_lock = threading.Lock()
+REPORTING_UNIT_INDEX_CACHE_SIZE = 32
+
+def reporting_unit_index(contest_data):
+    """The ReportingUnitIndex of a stored contest list, built on first use"""
+    data_id = contest_data['data_id']
+    with _reporting_unit_indexes_lock:
+        index = _reporting_unit_indexes.get(data_id)
+        if index is not None:
+            _reporting_unit_indexes.move_to_end(data_id)
+            return index
+    index = ReportingUnitIndex(contest_data['parsed_data'].get('contests', []))
+    with _reporting_unit_indexes_lock:
+        _reporting_unit_indexes[data_id] = index
+        while len(_reporting_unit_indexes) > REPORTING_UNIT_INDEX_CACHE_SIZE:
+            _reporting_unit_indexes.popitem(last=False)
+    return index
+
+CONTEST_SELECTORS = ('ballot_style', 'reporting_unit')
+
+def select_contest_data(contest_data, selector):
+    """
+    Contest data narrowed to one ballot style or reporting unit
+
+    Args:
+        contest_data: A stored contest list
+        selector: Dict with one of CONTEST_SELECTORS
+
+    Returns:
+        A contest data dict holding only the matching contests (its text is
+        rebuilt from them by format_contest_text)
+
+    Raises:
+        ValueError: If the selector matches nothing in the contest list
+    """
+    contests = reporting_unit_index(contest_data).select(**selector)
+    return {
+        'data_id': contest_data['data_id'],
+        'parsed_data': {'contests': contests},
+        'contest_selector': selector,
+        'uploaded_at': contest_data.get('uploaded_at')
+    }
+
+# Spelling "transcribe" engine: the model reads the names off the ballot and they
+# are compared with the official list here
+NAME_MATCH_THRESHOLD = 0.5
+CONTEST_MATCH_THRESHOLD = 0.35
+IndexedName = namedtuple('IndexedName', ['contest', 'name', 'key'])
+
+def normalize_candidate_name(name):
+    """
+    Lookup form of a name or contest title: case-folded, accents and punctuation
+    dropped, whitespace collapsed
+
+    Only used to find the official name a transcription stands for; whether the
+    two differ is decided on the names as printed.
+    """
+    decomposed = unicodedata.normalize('NFKD', unicodedata.normalize('NFKC', name).casefold())
+    letters = ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return ' '.join(re.sub(r'[^\w\s]|_', ' ', letters).split())
+
+def name_trigrams(key):
+    """Character trigrams of a normalized name, padded so short names still have some"""
+    padded = f'  {key} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def edit_distance(a, b):
+    """Levenshtein distance between two strings"""
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+def name_similarity(key_a, key_b):
+    """Edit-distance similarity of two normalized names, from 0 (nothing alike) to 1 (identical)"""
+    longest = max(len(key_a), len(key_b))
+    return 1 - edit_distance(key_a, key_b) / longest if longest else 1.0
+
+class CandidateIndex:
+    """
+    Official candidate names of a contest list, indexed for fuzzy lookup
+
+    Names are keyed by normalize_candidate_name. A lookup across the whole list
+    returns exact key matches straight from a dict; otherwise it shortlists the
+    names sharing the most trigrams through an inverted index and ranks only
+    those by edit distance, so it stays cheap for county-wide lists. A lookup
+    within one contest ranks all of that contest's candidates.
+    """
+
+    def __init__(self, contests):
+        self.contests = contests
+        self.names = []
+        self._by_contest = []
+        self._by_key = {}
+        self._by_trigram = {}
+        self._title_trigrams = [name_trigrams(normalize_candidate_name(contest['title'])) for contest in contests]
+        for position, contest in enumerate(contests):
+            name_ids = []
+            for name in contest['candidates']:
+                name_ids.append(len(self.names))
+                self.names.append(IndexedName(position, name, normalize_candidate_name(name)))
+                self._by_key.setdefault(self.names[-1].key, []).append(name_ids[-1])
+                for gram in name_trigrams(self.names[-1].key):
+                    self._by_trigram.setdefault(gram, []).append(name_ids[-1])
+            self._by_contest.append(name_ids)
+
+    def contest_names(self, contest):
+        """Ids of a contest's candidates in self.names, in list order"""
+        return self._by_contest[contest]
+
+    def lookup(self, name, contest=None, shortlist=8):
+        """
+        Official names closest to a name as transcribed
+
+        Args:
+            name: The name as printed on the ballot
+            contest: Position of the contest to search (None: the whole list)
+            shortlist: How many trigram matches to rank by edit distance in a whole-list lookup
+
+        Returns:
+            List of (similarity, name_id) pairs, most similar first (only the
+            exact matches when a whole-list lookup has any)
+        """
+        key = normalize_candidate_name(name)
+        if contest is not None:
+            name_ids = self._by_contest[contest]
+        elif key in self._by_key:
+            return [(1.0, name_id) for name_id in self._by_key[key]]
+        else:
+            shared = {}
+            for gram in name_trigrams(key):
+                for name_id in self._by_trigram.get(gram, ()):
+                    shared[name_id] = shared.get(name_id, 0) + 1
+            name_ids = heapq.nlargest(shortlist, shared, key=shared.get)
+        return sorted(((name_similarity(key, self.names[name_id].key), name_id) for name_id in name_ids),
+                      reverse=True)
+
+    def match_contest(self, title, names):
+        """
+        Position of the official contest a transcribed contest is, or None
+
+        Titles are compared by trigram overlap, since ballots often print them
+        shorter or longer than the list does; the candidates' own best matches
+        vote too, which tells apart contests with the same title in different towns.
+        Only the contests that got votes are scored unless none of them qualifies.
+        """
+        title_trigrams = name_trigrams(normalize_candidate_name(title))
+        votes = {}
+        for name in names:
+            ranked = self.lookup(name)
+            if ranked and ranked[0][0] >= NAME_MATCH_THRESHOLD:
+                position = self.names[ranked[0][1]].contest
+                votes[position] = votes.get(position, 0) + 1
+
+        def best_of(positions):
+            best, best_score = None, CONTEST_MATCH_THRESHOLD
+            for position in positions:
+                contest_trigrams = self._title_trigrams[position]
+                union = len(title_trigrams | contest_trigrams)
+                title_score = len(title_trigrams & contest_trigrams) / union if union else 0
+                score = 0.5 * title_score + 0.5 * votes.get(position, 0) / max(len(names), 1)
+                if score > best_score:
+                    best, best_score = position, score
+            return best
+
+        best = best_of(sorted(votes))
+        return best if best is not None else best_of(range(len(self.contests)))
+
+# Indexes of recently used contest lists, keyed by contest data and ballot style or reporting unit
+_candidate_indexes = OrderedDict()
+_candidate_indexes_lock = threading.Lock()
+CANDIDATE_INDEX_CACHE_SIZE = 32
+
+def candidate_index(contest_data):
+    """The CandidateIndex of a stored (possibly narrowed) contest list, built on first use"""
+    key = (contest_data.get('data_id'), json.dumps(contest_data.get('contest_selector'), sort_keys=True))
+    with _candidate_indexes_lock:
+        index = _candidate_indexes.get(key)
+        if index is not None:
+            _candidate_indexes.move_to_end(key)
+            return index
+    index = CandidateIndex(contest_data['parsed_data'].get('contests', []))
+    with _candidate_indexes_lock:
+        _candidate_indexes[key] = index
+        while len(_candidate_indexes) > CANDIDATE_INDEX_CACHE_SIZE:
+            _candidate_indexes.popitem(last=False)
+    return index
+
+def parse_transcription(analysis_text):
+    """
+    Contests and names of a transcription answer
+
+    Returns:
+        List of {'title', 'candidates'} dicts, or None if the text is not a transcription
+    """
+    data = AgentResponse(analysis_text).json_data()
+    if data is None or not isinstance(data.get('contests'), list):
+        return None
+    return [{
+        'title': str(contest.get('title') or ''),
+        'candidates': [printed_name(name) for name in contest.get('candidates') or [] if str(name).strip()]
+    } for contest in data['contests'] if isinstance(contest, dict)]
+
+def printed_name(name):
+    """A name exactly as printed, apart from Unicode composition and runs of whitespace"""
+    return ' '.join(unicodedata.normalize('NFC', str(name)).split())
+
+def describe_name_difference(found, expected):
+    """What differs between a name as printed and its official spelling, and how sure that is an error"""
+    if found.casefold() == expected.casefold():
+        return 'wrong capitalization', 'high'
+    found_key, expected_key = normalize_candidate_name(found), normalize_candidate_name(expected)
+    if found_key == expected_key:
+        return 'punctuation or accents differ', 'high'
+    distance = edit_distance(found_key, expected_key)
+    similarity = name_similarity(found_key, expected_key)
+    kind = f"{distance} letter{'s differ' if distance != 1 else ' differs'}"
+    return kind, 'high' if similarity >= 0.8 else 'medium' if similarity >= 0.65 else 'low'
+
+def match_transcription(transcription, contest_data, report_missing=True):
+    """
+    Compare transcribed ballot names with the official contest list
+
+    Each transcribed contest is matched to an official one, then its names are
+    paired with that contest's candidates, most similar pairs first. A pair that
+    is not identical as printed (whitespace aside) is a spelling error.
+
+    Args:
+        transcription: Contests as returned by parse_transcription
+        contest_data: The job's contest data
+        report_missing: Report official candidates missing from a matched contest
+            (off for column crops, which may hold only part of a contest)
+
+    Returns:
+        Structured data in the shape convert_yaml_to_findings reads
+    """
+    index = candidate_index(contest_data)
+    spelling_errors = []
+    other_issues = []
+    name_count = 0
+    for transcribed in transcription:
+        names = transcribed['candidates']
+        name_count += len(names)
+        position = index.match_contest(transcribed['title'], names)
+        if position is None:
+            other_issues.append({
+                'description': f"Contest '{transcribed['title']}' on the ballot does not match any contest in the official list",
+                'type': 'other'
+            })
+            continue
+        contest_title = index.contests[position]['title']
+
+        pairs = sorted(((similarity, n, name_id)
+                        for n, name in enumerate(names)
+                        for similarity, name_id in index.lookup(name, contest=position)
+                        if similarity >= NAME_MATCH_THRESHOLD), reverse=True)
+        paired = {}
+        used = set()
+        for similarity, n, name_id in pairs:
+            if n not in paired and name_id not in used:
+                paired[n] = name_id
+                used.add(name_id)
+
+        for n, name in enumerate(names):
+            if n not in paired:
+                description = f"'{name}' in {contest_title} is not on the official list"
+                ranked = index.lookup(name)
+                if ranked and ranked[0][0] >= NAME_MATCH_THRESHOLD:
+                    closest = index.names[ranked[0][1]]
+                    description += f" (closest official name: '{closest.name}' in {index.contests[closest.contest]['title']})"
+                other_issues.append({'description': description, 'type': 'other'})
+                continue
+            expected = index.names[paired[n]].name
+            if name == printed_name(expected):
+                continue
+            kind, confidence = describe_name_difference(name, expected)
+            spelling_errors.append({
+                'description': f"'{name}' does not match the official spelling '{expected}' ({kind})",
+                'candidate_found': name,
+                'candidate_expected': expected,
+                'contest': contest_title,
+                'confidence': confidence
+            })
+
+        if report_missing:
+            for name_id in index.contest_names(position):
+                if name_id not in used:
+                    other_issues.append({
+                        'description': f"Official candidate '{index.names[name_id].name}' for {contest_title} was not found on the ballot",
+                        'type': 'other'
+                    })
+
+    issue_count = len(spelling_errors) + len(other_issues)
+    if issue_count:
+        summary = (f"Compared {name_count} transcribed names in {len(transcription)} contests with the official list: "
+                   f"{len(spelling_errors)} spelling error{'s' if len(spelling_errors) != 1 else ''} and "
+                   f"{len(other_issues)} other issue{'s' if len(other_issues) != 1 else ''}.")
+    else:
+        summary = f"All {name_count} transcribed names in {len(transcription)} contests match the official list."
+    return {
+        'findings': {'spelling_errors': spelling_errors, 'other_issues': other_issues},
+        'summary': summary,
+        'analysis_status': 'completed' if issue_count else 'no_issues_found'
+    }
+
+def parse_transcription_results(analysis_text, job_id):
+    """Spelling findings for a transcription answer, matched against the job's current contest data"""
+    transcription = parse_transcription(analysis_text)
+    if transcription is None:
+        log_openai_session(job_id, 'error', {
+            'action': 'transcription_parsing_failed',
+            'agent': 'spelling'
+        })
+        return unparsed_findings(analysis_text, 'spelling')
+
+    contest_data = get_job_contest_data(job_id)
+    if not contest_data or not contest_data['parsed_data'].get('contests'):
+        structured_data = {
+            'findings': {'spelling_errors': [], 'other_issues': []},
+            'summary': 'No official contest list to compare the transcribed names with.',
+            'analysis_status': 'no_issues_found'
+        }
+    else:
+        started = time.perf_counter()
+        report_missing = job_store.get_job(job_id).get('tiling', 'page') == 'page'
+        structured_data = match_transcription(transcription, contest_data, report_missing=report_missing)
+        log_openai_session(job_id, 'metadata', {
+            'action': 'transcription_matched',
+            'contests': len(transcription),
+            'names': sum(len(contest['candidates']) for contest in transcription),
+            'spelling_errors': len(structured_data['findings']['spelling_errors']),
+            'other_issues': len(structured_data['findings']['other_issues']),
+            'seconds': round(time.perf_counter() - started, 4)
+        })
+
+    findings = convert_yaml_to_findings(structured_data, 'spelling')
+    findings['parsing_method'] = 'transcribe_match'
+    findings['detailed_analysis'] = analysis_text
+    findings['transcription'] = transcription
+    return findings
+
+STRUCTURED_OUTPUT_START = "-- BEGIN STRUCTURED OUTPUT --"
+STRUCTURED_OUTPUT_END = "-- END STRUCTURED OUTPUT --"
+
+# libyaml's loader when PyYAML was built with it; same results, several times faster
+YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+def keyword_pattern(keywords):
+    """Compile keywords into one alternation so a line is searched once rather than once per keyword"""
+    return re.compile('|'.join(re.escape(keyword) for keyword in keywords))
+
+# Keyword tables for the legacy (free-text) parser; section headers are checked in order
+SECTION_HEADER_PATTERNS = (
+    ('general_observations', keyword_pattern(['general observation', 'overall', 'summary'])),
+    ('specific_findings', keyword_pattern(['specific finding', 'findings', 'issues found'])),
+    ('recommendations', keyword_pattern(['recommendation', 'suggest', 'next steps']))
+)
+ISSUE_PATTERN = keyword_pattern(['issue', 'problem', 'error', 'anomaly', 'concern'])
+CONFIDENCE_LINE_PATTERN = keyword_pattern(['confidence:', 'confidence level:', 'high confidence',
+                                           'medium confidence', 'low confidence'])
+CONTEST_KEYWORDS = ('contest', 'race', 'election', 'office', 'position')
+CONTEST_PATTERN = keyword_pattern(CONTEST_KEYWORDS)
+ISSUE_TYPE_PATTERNS = (
+    ('formatting', keyword_pattern(['format', 'layout', 'alignment'])),
+    ('spelling', keyword_pattern(['spelling', 'misspell', 'typo'])),
+    ('missing_content', keyword_pattern(['missing', 'absent', 'not found']))
+)
+HIGH_SEVERITY_PATTERN = keyword_pattern(['critical', 'severe', 'major'])
+LOW_SEVERITY_PATTERN = keyword_pattern(['minor', 'small', 'slight'])
+
+LEGACY_PARSE_RULES = {
+    'missing_ovals': {
+        'finding_key': 'missing_ovals',
+        'finding_pattern': keyword_pattern(['missing oval', 'no oval', 'oval missing', 'without oval', 'lacks oval']),
+        'finding_label': 'missing oval',
+        # Lines stating a confidence level belong to the finding before them, not to other_issues
+        'skip_confidence_lines': True,
+        'clean_summary': 'No issues detected. All candidates and choices appear to have proper voting ovals.',
+        'clean_confidence_summary': 'Analysis completed successfully with no concerns found.'
+    },
+    'spelling': {
+        'finding_key': 'spelling_errors',
+        'finding_pattern': keyword_pattern(['misspell', 'spelling', 'typo', 'incorrect', 'wrong name',
+                                            'name error', 'discrepancy']),
+        'finding_label': 'spelling error',
+        'skip_confidence_lines': False,
+        'clean_summary': 'No spelling errors detected. All candidate names appear to match the official list.',
+        'clean_confidence_summary': 'Spelling analysis completed successfully with no concerns found.'
+    }
+}
+
+class AgentResponse:
+    """
+    An agent's answer, split and lowercased once and shared by the structured
+    (YAML) parser and the legacy keyword parser
+
+    Lines, lowercased lines and the contest named on each line are computed on
+    first use and kept, so falling back from YAML to keywords re-reads nothing
+    and the context search around each finding looks at every line only once.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self._lines = None
+        self._lowered = None
+        self._contests = {}
+
+    @property
+    def lines(self):
+        if self._lines is None:
+            self._lines = self.text.split('\n')
+        return self._lines
+
+    @property
+    def lowered(self):
+        if self._lowered is None:
+            self._lowered = self.text.lower().split('\n')
+        return self._lowered
+
+    def structured_block(self):
+        """YAML between the structured output markers, or None if the block is missing or unterminated"""
+        start_idx = self.text.find(STRUCTURED_OUTPUT_START)
+        if start_idx == -1:
+            return None
+        start_idx += len(STRUCTURED_OUTPUT_START)
+        end_idx = self.text.find(STRUCTURED_OUTPUT_END, start_idx)
+        if end_idx == -1:
+            return None
+        return self.text[start_idx:end_idx].strip()
+
+    def json_data(self):
+        """The answer loaded as a JSON object (json_schema output format), or None"""
+        if not self.text.lstrip().startswith('{'):
+            return None
+        try:
+            data = json.loads(self.text)
+        except ValueError:
+            return None
+        return data if isinstance(data, dict) else None
+
+    def structured_data(self):
+        """The structured output block loaded as YAML, or None"""
+        yaml_content = self.structured_block()
+        if yaml_content is None:
+            return None
+        try:
+            return yaml.load(yaml_content, Loader=YAML_LOADER)
+        except yaml.YAMLError:
+            return None
+
+    def contest_near(self, index, context_range=3):
+        """
+        Contest named within context_range lines of a line
+
+        Returns:
+            The first few words after the contest keyword (a list), or None
+        """
+        for i in range(max(0, index - context_range), min(len(self.lines), index + context_range + 1)):
+            if i not in self._contests:
+                self._contests[i] = self._contest_on_line(i)
+            if self._contests[i] is not None:
+                return list(self._contests[i])
+        return None
+
+    def _contest_on_line(self, i):
+        line_lower = self.lowered[i]
+        if not CONTEST_PATTERN.search(line_lower):
+            return None
+        for keyword in CONTEST_KEYWORDS:
+            if keyword in line_lower:
+                # Split the original text, so a capitalised keyword does not match here
+                parts = self.lines[i].split(keyword)
+                if len(parts) > 1:
+                    return parts[1].strip('.,: ').split(' ')[0:5]
+        return None
+
+def extract_structured_output(analysis_text):
+    """Extract YAML from structured output block"""
+    return AgentResponse(analysis_text).structured_data()
+
+def convert_yaml_to_findings(structured_data, agent_name):
+    """Convert YAML structured data to our internal findings format"""
+    if not structured_data or 'findings' not in structured_data:
+        return None
+    
+    yaml_findings = structured_data['findings']
+    summary = structured_data.get('summary', '')
+    analysis_status = structured_data.get('analysis_status', 'completed')
+    
     # Initialize findings structure
     findings = {
         'summary': summary,
@@ -394,272 +3951,1895 @@ def convert_yaml_to_findings(structured_data, agent_name):
     
     return findings
 
-def parse_structured_results(analysis_text, agent_name, job_id):
-    """Parse results with YAML-first, fallback to legacy with improved error handling"""
-    # Try structured YAML first
-    structured_data = extract_structured_output(analysis_text)
-    
-    if structured_data and isinstance(structured_data, dict) and 'findings' in structured_data:
+def parse_partial_json_findings(analysis_text, agent_name):
+    """
+    Parse the findings that are complete so far in a JSON answer still being streamed
+
+    Each findings list is read object by object up to the first one that has not
+    finished arriving. Returns None until the findings object has started.
+    """
+    decoder = json.JSONDecoder()
+    findings = {}
+    for key in (LEGACY_PARSE_RULES[agent_name]['finding_key'], 'other_issues'):
+        match = re.search(r'"%s"\s*:\s*\[' % key, analysis_text)
+        if not match:
+            continue
+        items = []
+        position = match.end()
+        while True:
+            while position < len(analysis_text) and analysis_text[position] in ' \t\r\n,':
+                position += 1
+            if position >= len(analysis_text) or analysis_text[position] != '{':
+                break
+            try:
+                item, position = decoder.raw_decode(analysis_text, position)
+            except ValueError:
+                break
+            items.append(item)
+        findings[key] = items
+    if not findings:
+        return None
+    try:
+        return convert_yaml_to_findings({'findings': findings}, agent_name)
+    except Exception:
+        return None
+
+def parse_partial_findings(analysis_text, agent_name):
+    """
+    Parse the findings that are complete so far in a response still being streamed
+
+    Only list items that a later line has closed are kept, so a finding is never
+    shown half-written. Returns None until the structured block has started.
+    """
+    if analysis_text.lstrip().startswith('{'):
+        return parse_partial_json_findings(analysis_text, agent_name)
+
+    start_idx = analysis_text.find(STRUCTURED_OUTPUT_START)
+    if start_idx == -1:
+        return None
+
+    block = analysis_text[start_idx + len(STRUCTURED_OUTPUT_START):]
+    end_idx = block.find(STRUCTURED_OUTPUT_END)
+    lines = block[:end_idx].split('\n') if end_idx != -1 else block.split('\n')[:-1]
+
+    if end_idx == -1:
+        item_lines = [i for i, line in enumerate(lines) if line.lstrip().startswith('- ')]
+        if item_lines:
+            last_item = item_lines[-1]
+            indent = len(lines[last_item]) - len(lines[last_item].lstrip())
+            if not any(line.strip() and len(line) - len(line.lstrip()) <= indent for line in lines[last_item + 1:]):
+                lines = lines[:last_item]
+
+    try:
+        structured_data = yaml.load('\n'.join(lines), Loader=YAML_LOADER)
+    except yaml.YAMLError:
+        return None
+    if not isinstance(structured_data, dict) or not isinstance(structured_data.get('findings'), dict):
+        return None
+    try:
+        return convert_yaml_to_findings(structured_data, agent_name)
+    except Exception:
+        return None
+
+class PartialFindingsParser:
+    """
+    parse_partial_findings() for a streamed answer, fed chunk by chunk
+
+    Only text that has arrived since the last call is scanned: YAML answers are
+    read line by line once a line is complete, and each finding is loaded on
+    its own when the next line at its indent or less (or the end marker) closes
+    it; JSON answers resume decoding each findings list where the last call
+    stopped. Streaming an answer therefore costs time linear in its length,
+    where calling parse_partial_findings() on every update is quadratic.
+    """
+
+    def __init__(self, agent_name):
+        self.agent_name = agent_name
+        self._format = None
+        self._findings = None
+        self._top = {}
+        self._changed = False
+        # YAML state: the incomplete last line is kept until its newline arrives
+        self._pending = ''
+        self._block_started = self._block_ended = False
+        # Set once part of the block fails to load; the whole block would not load either
+        self._broken = False
+        self._findings_indent = None
+        self._list_key = None
+        self._item_lines = None
+        self._item_indent = 0
+        # JSON state: the answer so far, per findings key the offset to resume decoding at (None
+        # once the list has closed), and where to look for the keys that have not appeared yet
+        self._text = ''
+        self._json_offsets = {}
+        self._json_search_from = 0
+
+    def feed(self, delta):
+        """
+        Add the next piece of the answer
+
+        Returns:
+            True when the findings have changed since the last call
+        """
+        if self._format is None:
+            self._pending += delta
+            stripped = self._pending.lstrip()
+            if not stripped:
+                return False
+            self._format = 'json' if stripped.startswith('{') else 'yaml'
+            delta, self._pending = self._pending, ''
+        if self._format == 'json':
+            self._text += delta
+            self._feed_json()
+        else:
+            self._feed_yaml(delta)
+        changed, self._changed = self._changed, False
+        return changed
+
+    def findings(self):
+        """The findings complete so far in the internal format, or None before the findings have started"""
+        if not self._findings or self._broken:
+            return None
+        try:
+            return convert_yaml_to_findings(dict(self._top, findings=self._findings), self.agent_name)
+        except Exception:
+            return None
+
+    def _feed_yaml(self, delta):
+        if self._block_ended:
+            return
+        if '\n' not in delta:
+            self._pending += delta
+            return
+        lines = (self._pending + delta).split('\n')
+        self._pending = lines.pop()
+        for line in lines:
+            if not self._block_started:
+                self._block_started = STRUCTURED_OUTPUT_START in line
+                continue
+            if STRUCTURED_OUTPUT_END in line:
+                self._close_item()
+                self._block_ended = True
+                return
+            self._yaml_line(line)
+
+    def _yaml_line(self, line):
+        stripped = line.strip()
+        indent = len(line) - len(line.lstrip())
+        if self._item_lines is not None:
+            if not stripped or indent > self._item_indent:
+                self._item_lines.append(line)
+                return
+            self._close_item()
+        if not stripped:
+            return
+
+        if stripped.startswith('- '):
+            if self._list_key is not None:
+                self._item_lines = [line]
+                self._item_indent = indent
+            return
+        key = re.match(r'([A-Za-z_]\w*)\s*:(.*)$', stripped)
+        if not key:
+            return
+        if self._findings_indent is not None and indent > self._findings_indent:
+            # A findings list; None until its first item, as yaml would load it
+            self._list_key = key.group(1)
+            self._findings[self._list_key] = [] if key.group(2).strip() == '[]' else None
+            self._changed = True
+        elif key.group(1) == 'findings':
+            self._findings_indent = indent
+            self._findings = {}
+        else:
+            self._list_key = None
+            try:
+                value = yaml.load(stripped, Loader=YAML_LOADER)
+            except yaml.YAMLError:
+                self._broken = self._changed = True
+                return
+            if isinstance(value, dict):
+                self._top.update(value)
+                self._changed = True
+
+    def _close_item(self):
+        if self._item_lines is None:
+            return
+        lines = [line[self._item_indent:] for line in self._item_lines]
+        self._item_lines = None
+        try:
+            items = yaml.load('\n'.join(lines), Loader=YAML_LOADER)
+        except yaml.YAMLError:
+            self._broken = self._changed = True
+            return
+        if isinstance(items, list):
+            self._findings[self._list_key] = (self._findings[self._list_key] or []) + items
+            self._changed = True
+
+    def _feed_json(self):
+        decoder = json.JSONDecoder()
+        search_from = self._json_search_from
+        # A key split across chunks is found on the next call
+        self._json_search_from = max(0, len(self._text) - 256)
+        for key in (LEGACY_PARSE_RULES[self.agent_name]['finding_key'], 'other_issues'):
+            if key not in self._json_offsets:
+                match = re.compile(r'"%s"\s*:\s*\[' % key).search(self._text, search_from)
+                if not match:
+                    continue
+                self._json_offsets[key] = match.end()
+                if self._findings is None:
+                    self._findings = {}
+                self._findings[key] = []
+                self._changed = True
+            position = self._json_offsets[key]
+            if position is None:
+                continue
+            items = self._findings[key]
+            while True:
+                while position < len(self._text) and self._text[position] in ' \t\r\n,':
+                    position += 1
+                if position >= len(self._text):
+                    break
+                if self._text[position] != '{':
+                    position = None
+                    break
+                try:
+                    item, position = decoder.raw_decode(self._text, position)
+                except ValueError:
+                    break
+                items.append(item)
+                self._changed = True
+            self._json_offsets[key] = position
+
+def parse_structured_results(analysis_text, agent_name, job_id):
+    """Parse results with YAML-first, fallback to legacy with improved error handling"""
+    if transcribes_names(agent_name):
+        return parse_transcription_results(analysis_text, job_id)
+
+    response = AgentResponse(analysis_text)
+    
+    # Answers constrained by a JSON schema need no searching or fallback
+    json_data = response.json_data()
+    if json_data is not None and isinstance(json_data.get('findings'), dict):
+        try:
+            findings = convert_yaml_to_findings(json_data, agent_name)
+            if findings:
+                findings['parsing_method'] = 'json_schema'
+                findings['detailed_analysis'] = analysis_text
+                if json_data.get('notes'):
+                    findings['sections']['general_observations'].append(json_data['notes'])
+                return findings
+        except Exception as e:
+            log_openai_session(job_id, 'metadata', {
+                'action': 'json_conversion_failed',
+                'agent': agent_name,
+                'error': f'Failed to convert JSON to findings format: {str(e)}'
+            })
+    
+    # Try structured YAML next; the fallback reuses the same split of the text
+    structured_data = response.structured_data()
+    
+    if structured_data and isinstance(structured_data, dict) and 'findings' in structured_data:
+        log_openai_session(job_id, 'metadata', {
+            'action': 'structured_yaml_parsing_success',
+            'agent': agent_name,
+            'yaml_keys': list(structured_data.keys()) if structured_data else []
+        })
+        
+        # Convert YAML to our internal format
+        try:
+            findings = convert_yaml_to_findings(structured_data, agent_name)
+            if findings:
+                findings['detailed_analysis'] = analysis_text
+                return findings
+        except Exception as e:
+            log_openai_session(job_id, 'metadata', {
+                'action': 'yaml_conversion_failed',
+                'agent': agent_name,
+                'error': f'Failed to convert YAML to findings format: {str(e)}'
+            })
+    else:
+        if structured_data:
+            log_openai_session(job_id, 'metadata', {
+                'action': 'structured_yaml_parsing_partial',
+                'agent': agent_name,
+                'issue': 'Structured data found but missing expected format',
+                'fallback_to_legacy': True
+            })
+        else:
+            log_openai_session(job_id, 'metadata', {
+                'action': 'structured_yaml_parsing_failed',
+                'agent': agent_name,
+                'fallback_to_legacy': True
+            })
+    
+    # Fallback to legacy parsing
+    log_openai_session(job_id, 'metadata', {
+        'action': 'using_legacy_parsing',
+        'agent': agent_name
+    })
+    
+    try:
+        findings = parse_legacy_findings(response, 'missing_ovals' if agent_name == 'missing_ovals' else 'spelling')
+        
+        findings['parsing_method'] = 'legacy_keywords'
+        findings['detailed_analysis'] = analysis_text
+        return findings
+    except Exception as e:
+        log_openai_session(job_id, 'error', {
+            'action': 'legacy_parsing_failed',
+            'agent': agent_name,
+            'error': str(e)
+        })
+        
+        # Return basic findings structure as last resort
+        return unparsed_findings(analysis_text, agent_name)
+
+def unparsed_findings(analysis_text, agent_name):
+    """Findings for an answer none of the parsers could read (never cached)"""
+    return {
+        'summary': 'Analysis completed but parsing failed',
+        'total_issues': 0,
+        'confidence_summary': 'Unable to parse results properly',
+        'detailed_analysis': analysis_text,
+        'analysis_status': 'parsing_error',
+        'parsing_method': 'fallback',
+        'missing_ovals': [] if agent_name == 'missing_ovals' else None,
+        'spelling_errors': [] if agent_name == 'spelling' else None,
+        'other_issues': [],
+        'sections': {
+            'general_observations': [],
+            'specific_findings': [],
+            'recommendations': []
+        }
+    }
+
+def file_sha256(image_path):
+    """SHA-256 hex digest of a file's contents"""
+    digest = hashlib.sha256()
+    with open(image_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# Immutable image payload shared by every agent (and job) analyzing the same upload
+EncodedImage = namedtuple('EncodedImage', ['file_id', 'sha256', 'data_url', 'base64_length', 'preprocessing'],
+                          defaults=[None])
+
+class EncodedImageCache:
+    """LRU cache of base64 data URLs keyed by (file_id, content hash), bounded by total bytes"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, image_path, file_id=None, sha256=None, preprocess=None):
+        """
+        Return the encoded payload for an image, encoding it only on a cache miss
+
+        Args:
+            image_path: Path to the PNG on disk
+            file_id: Upload id the image belongs to (None for ad-hoc paths)
+            sha256: Content hash recorded at upload time, computed from the file if missing
+            preprocess: Options for preprocess_ballot_image, or None to send the file as-is
+
+        Returns:
+            Tuple of (EncodedImage, cache_hit)
+        """
+        if sha256 is None:
+            with open(image_path, 'rb') as f:
+                raw = f.read()
+            sha256 = hashlib.sha256(raw).hexdigest()
+        else:
+            raw = None
+
+        key = (file_id, sha256, json.dumps(preprocess, sort_keys=True) if preprocess else None)
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return payload, True
+            self.misses += 1
+
+        report = None
+        if preprocess:
+            raw, report = preprocess_ballot_image(image_path, **preprocess)
+        elif raw is None:
+            with open(image_path, 'rb') as f:
+                raw = f.read()
+        base64_data = base64.b64encode(raw).decode('utf-8')
+        del raw
+        payload = EncodedImage(
+            file_id=file_id,
+            sha256=sha256,
+            data_url=f"data:image/png;base64,{base64_data}",
+            base64_length=len(base64_data),
+            preprocessing=report
+        )
+        del base64_data
+
+        with self._lock:
+            # Another job may have encoded the same image meanwhile
+            existing = self._entries.get(key)
+            if existing is not None:
+                self._entries.move_to_end(key)
+                return existing, False
+
+            size = len(payload.data_url)
+            if size <= self.max_bytes:
+                self._entries[key] = payload
+                self._bytes += size
+                while self._bytes > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._bytes -= len(evicted.data_url)
+                    self.evictions += 1
+        return payload, False
+
+    def invalidate(self, file_id):
+        """Drop every cached payload for an upload"""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == file_id]:
+                self._bytes -= len(self._entries.pop(key).data_url)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+image_cache = EncodedImageCache(app.config['IMAGE_CACHE_MAX_BYTES'])
+
+def get_encoded_image(image_path, file_id=None):
+    """Look up the shared encoded payload for an image, using the upload's recorded hash when known"""
+    file_info = job_store.get_upload(file_id) if file_id else None
+    sha256 = file_info.get('sha256') if file_info else None
+    return image_cache.get(image_path, file_id=file_id, sha256=sha256, preprocess=image_preprocess_options())
+
+class ResultCache:
+    """
+    Persistent, content-addressed cache of parsed agent findings
+
+    Each entry is a JSON file named after the hash of everything that determines
+    the agent's answer: image bytes, prompt template, contest text, model and parameters.
+    A hit touches the file, so its mtime is the entry's last use; the retention
+    reaper evicts by it.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key):
+        """Return the cached entry for key, or None on a miss"""
+        try:
+            with open(self._path(key), 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            entry = None
+        if entry is not None:
+            try:
+                os.utime(self._path(key))
+            except OSError:
+                pass
+
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return entry
+
+    def put(self, key, key_fields, agent_results):
+        """Store an agent's parsed results under key"""
+        entry = {
+            'key': key,
+            'key_fields': key_fields,
+            'agent': agent_results['agent'],
+            'raw_analysis': agent_results['raw_analysis'],
+            'findings': agent_results['findings'],
+            'cached_at': datetime.now().isoformat()
+        }
+        # Write to a temp file first so readers never see a partial entry
+        tmp_path = f"{self._path(key)}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, self._path(key))
+        with self._lock:
+            self.writes += 1
+
+    def entries(self):
+        """(path, size, mtime) of every entry, least recently used first"""
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if not entry.name.endswith('.json'):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((entry.path, stat.st_size, stat.st_mtime))
+        entries.sort(key=lambda entry: entry[2])
+        return entries
+
+    def remove(self, path):
+        """
+        Delete one entry
+
+        Returns:
+            The bytes freed (0 if the entry was already gone)
+        """
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except FileNotFoundError:
+            return 0
+        return size
+
+    def stats(self):
+        entries = self.entries()
+        total_bytes = sum(entry[1] for entry in entries)
+        entries = len(entries)
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': entries,
+                'bytes': total_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'writes': self.writes,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else None
+            }
+
+result_cache = ResultCache(app.config['RESULT_CACHE_DIR'])
+
+def result_cache_key(agent_name, image_sha256, contest_text=None, tiling='page'):
+    """
+    Build the result cache key for one agent run
+
+    Returns:
+        Tuple of (key, key_fields) where key is the SHA-256 of the canonical key fields
+    """
+    key_fields = {
+        'agent': agent_name,
+        'image_sha256': image_sha256,
+        'prompt_sha256': prompt_sha256(agent_name),
+        'message_layout_sha256': message_layout_sha256(),
+        'model': AGENT_MODEL,
+        'parameters': agent_request_params(agent_name),
+        'image_preprocessing': image_preprocess_options()
+    }
+    if tiling != 'page':
+        key_fields['tiling'] = {
+            'mode': tiling,
+            'max_columns': app.config['BALLOT_MAX_COLUMNS'],
+            'overlap': app.config['COLUMN_TILE_OVERLAP']
+        }
+    if contest_text is not None:
+        key_fields['contest_sha256'] = hashlib.sha256(
+            normalize_contest_text(contest_text).encode('utf-8')).hexdigest()
+    key = hashlib.sha256(json.dumps(key_fields, sort_keys=True).encode('utf-8')).hexdigest()
+    return key, key_fields
+
+def build_failed_agent_results(agent_name, error_message):
+    """Build a placeholder result for an agent that failed so the other agents' findings are kept"""
+    findings = {
+        'summary': f'Agent failed: {error_message}',
+        'total_issues': 0,
+        'confidence_summary': 'Agent did not complete',
+        'detailed_analysis': '',
+        'analysis_status': 'error',
+        'parsing_method': 'none',
+        'other_issues': [],
+        'sections': {
+            'general_observations': [],
+            'specific_findings': [],
+            'recommendations': []
+        }
+    }
+    if agent_name == 'missing_ovals':
+        findings['missing_ovals'] = []
+    elif agent_name == 'spelling':
+        findings['spelling_errors'] = []
+
+    return {
+        'agent': agent_name,
+        'raw_analysis': '',
+        'findings': findings,
+        'error': error_message,
+        'completed_at': datetime.now().isoformat()
+    }
+
+def run_agent(job_id, agent_name, agent_task):
+    """Run a single agent and record its status and progress on the job"""
+    log_openai_session(job_id, 'metadata', {'action': f'starting_agent_{agent_name}'})
+    update_agent_status(job_id, agent_name,
+                        status='running',
+                        progress=10,
+                        started_at=datetime.now().isoformat())
+
+    try:
+        with job_timelines.stage(job_id, 'agent', track=agent_name):
+            agent_results = agent_task()
+    except Exception as e:
+        update_agent_status(job_id, agent_name,
+                            status='error',
+                            progress=100,
+                            error=str(e),
+                            completed_at=datetime.now().isoformat())
+        raise
+
+    update_agent_status(job_id, agent_name,
+                        status='completed',
+                        progress=100,
+                        results=agent_results,
+                        completed_at=datetime.now().isoformat())
+    return agent_results
+
+async def run_agent_async(job_id, agent_name, agent_coroutine):
+    """run_agent() for a coroutine on the asyncio engine's event loop; status updates go through job_updates"""
+    job_updates.call(log_openai_session, job_id, 'metadata', {'action': f'starting_agent_{agent_name}'})
+    job_updates.update_agent_status(job_id, agent_name,
+                                    status='running',
+                                    progress=10,
+                                    started_at=datetime.now().isoformat())
+
+    try:
+        with job_timelines.stage(job_id, 'agent', track=agent_name):
+            agent_results = await agent_coroutine
+    except Exception as e:
+        job_updates.update_agent_status(job_id, agent_name,
+                                        status='error',
+                                        progress=100,
+                                        error=str(e),
+                                        completed_at=datetime.now().isoformat())
+        raise
+
+    job_updates.update_agent_status(job_id, agent_name,
+                                    status='completed',
+                                    progress=100,
+                                    results=agent_results,
+                                    completed_at=datetime.now().isoformat())
+    return agent_results
+
+def run_agents_concurrently(job_id, agent_tasks):
+    """
+    Run independent agents at the same time on the shared agent pool
+
+    Args:
+        job_id: Unique job identifier
+        agent_tasks: Dict mapping agent name to a zero-argument callable returning that agent's results
+
+    Returns:
+        Tuple of (agent_results, agent_errors), both dicts keyed by agent name
+    """
+    futures = {
+        agent_executor.submit(run_agent, job_id, agent_name, agent_task): agent_name
+        for agent_name, agent_task in agent_tasks.items()
+    }
+
+    agent_results = {}
+    agent_errors = {}
+    for future in as_completed(futures):
+        agent_name = futures[future]
+        try:
+            agent_results[agent_name] = future.result()
+        except Exception as e:
+            agent_errors[agent_name] = str(e)
+        report_agent_progress(job_id, agent_tasks, agent_results, agent_errors)
+
+    return agent_results, agent_errors
+
+async def run_agents_async(job_id, agent_coroutines):
+    """
+    run_agents_concurrently() for the asyncio engine: the agents are tasks on the event loop
+
+    Args:
+        job_id: Unique job identifier
+        agent_coroutines: Dict mapping agent name to a coroutine returning that agent's results
+
+    Returns:
+        Tuple of (agent_results, agent_errors), both dicts keyed by agent name
+    """
+    tasks = {
+        asyncio.ensure_future(run_agent_async(job_id, agent_name, agent_coroutine)): agent_name
+        for agent_name, agent_coroutine in agent_coroutines.items()
+    }
+
+    agent_results = {}
+    agent_errors = {}
+    pending = set(tasks)
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            agent_name = tasks[task]
+            try:
+                agent_results[agent_name] = task.result()
+            except Exception as e:
+                agent_errors[agent_name] = str(e)
+            report_agent_progress(job_id, agent_coroutines, agent_results, agent_errors,
+                                  update=job_updates.update_job)
+
+    return agent_results, agent_errors
+
+def report_agent_progress(job_id, agent_names, agent_results, agent_errors, update=update_job):
+    """Overall progress moves from 10% to 90% as agents finish"""
+    finished = len(agent_results) + len(agent_errors)
+    remaining = [name for name in agent_names if name not in agent_results and name not in agent_errors]
+    update(job_id,
+           progress=10 + int(80 * finished / len(agent_names)),
+           message=(f"Waiting for agents: {', '.join(remaining)}..." if remaining
+                    else 'Combining analysis results...'))
+
+def get_job_contest_data(job_id):
+    """Return the contest data linked to a job, narrowed to its ballot style or reporting unit if it has one, or None"""
+    job = job_store.get_job(job_id)
+    contest_data_id = job.get('contest_data_id')
+    if not contest_data_id:
+        return None
+    contest_data = job_store.get_contest_data(contest_data_id)
+    if contest_data and job.get('contest_selector'):
+        return select_contest_data(contest_data, job['contest_selector'])
+    return contest_data
+
+def start_job_analysis(image_path, job_id):
+    """
+    Common first stage of every execution mode: mark the job as processing and
+    serve whatever agents can be answered from the result cache or, for missing
+    ovals, from the local detector
+
+    Returns:
+        Tuple of (contest_data, cache_keys, resolved_results)
+    """
+    job = job_store.get_job(job_id)
+    job_timelines.record(job_id, 'queued', datetime.fromisoformat(job['created_at']).timestamp(), time.time())
+    file_info = job_store.get_upload(job.get('image_file_id')) or {}
+    validation = (file_info.get('image_info') or {}).get('validation')
+    if validation:
+        job_timelines.record(job_id, 'validate_and_resize_image', validation['started_at'],
+                             validation['started_at'] + validation['seconds'], track='upload')
+
+    # Log session start
+    log_openai_session(job_id, 'metadata', {
+        'action': 'start_multi_agent_analysis',
+        'image_path': image_path,
+        'image_size': os.path.getsize(image_path)
+    })
+
+    # Update job status
+    update_job(job_id,
+               status='processing',
+               progress=5,
+               message='Starting multi-agent analysis...',
+               agents={
+                   'missing_ovals': {'status': 'pending', 'progress': 0, 'results': None},
+                   'spelling': {'status': 'pending', 'progress': 0, 'results': None}
+               })
+
+    # Get contest data for spelling analysis
+    contest_data = get_job_contest_data(job_id)
+    if contest_data and contest_data.get('contest_selector'):
         log_openai_session(job_id, 'metadata', {
-            'action': 'structured_yaml_parsing_success',
-            'agent': agent_name,
-            'yaml_keys': list(structured_data.keys()) if structured_data else []
+            'action': 'contests_selected',
+            'selector': contest_data['contest_selector'],
+            'contests': [contest['title'] for contest in contest_data['parsed_data']['contests']]
         })
-        
-        # Convert YAML to our internal format
+
+    # Look up previously parsed findings for this exact image, prompt and contest text.
+    # A page transcription does not depend on the contest list: it is cached without
+    # it and matched again against the job's current list when served from the cache.
+    image_sha256 = file_info.get('sha256') or file_sha256(image_path)
+    tiling = job.get('tiling', 'page')
+    rematch_transcription = transcribes_names('spelling') and tiling == 'page'
+    cache_keys = {
+        'missing_ovals': result_cache_key('missing_ovals', image_sha256, tiling=tiling),
+        'spelling': result_cache_key('spelling', image_sha256,
+                                     None if rematch_transcription else format_contest_text(contest_data),
+                                     tiling=tiling)
+    }
+    cached_results = {}
+    if job.get('use_cache', True):
+        for agent_name, (key, _) in cache_keys.items():
+            with job_timelines.stage(job_id, 'result_cache_lookup', track=agent_name):
+                entry = result_cache.get(key)
+            if entry is None:
+                continue
+            findings = entry['findings']
+            if agent_name == 'spelling' and rematch_transcription:
+                with job_timelines.stage(job_id, 'parse_results', track=agent_name):
+                    findings = parse_transcription_results(entry['raw_analysis'], job_id)
+            cached_results[agent_name] = {
+                'agent': agent_name,
+                'raw_analysis': entry['raw_analysis'],
+                'findings': findings,
+                'cached': True,
+                'cached_at': entry['cached_at'],
+                'completed_at': datetime.now().isoformat()
+            }
+            update_agent_status(job_id, agent_name,
+                                status='completed',
+                                progress=100,
+                                cached=True,
+                                results=cached_results[agent_name])
+        log_openai_session(job_id, 'metadata', {
+            'action': 'result_cache_lookup',
+            'hits': list(cached_results.keys()),
+            'misses': [name for name in cache_keys if name not in cached_results]
+        })
+
+    resolved_results = dict(cached_results)
+    if app.config['OVAL_PREPASS'] and 'missing_ovals' not in resolved_results:
+        with job_timelines.stage(job_id, 'oval_prepass'):
+            local_results = run_oval_prepass(image_path, job_id, contest_data)
+        if local_results:
+            resolved_results['missing_ovals'] = local_results
+
+    return contest_data, cache_keys, resolved_results
+
+def oval_count_contests(contest_data):
+    """
+    The contests a ballot's oval count can be checked against
+
+    That is the job's selected ballot style or reporting unit, or the whole list
+    when every ballot carries all of it. A list of several ballot styles with no
+    selector does not say which contests this ballot has, so there is nothing to
+    check against.
+
+    Returns:
+        Tuple of (parsed contest data or None, where it came from: 'contest_selector',
+        'contest_list', 'multiple_ballot_styles' or 'no_contest_data')
+    """
+    if not contest_data:
+        return None, 'no_contest_data'
+    if contest_data.get('contest_selector'):
+        return contest_data['parsed_data'], 'contest_selector'
+    try:
+        ballot_styles = len(reporting_unit_index(contest_data).ballot_styles)
+    except ValueError:
+        return None, 'multiple_ballot_styles'
+    if ballot_styles > 1:
+        return None, 'multiple_ballot_styles'
+    return contest_data['parsed_data'], 'contest_list'
+
+def run_oval_prepass(image_path, job_id, contest_data):
+    """
+    Check for missing ovals locally; return the agent results when the ballot is
+    clean, or None when the model still has to look at it
+
+    The oval count is only checked against contests known to be on this ballot
+    (see oval_count_contests); otherwise just the rows are checked for ovals.
+    """
+    count_contests, expected_count_source = oval_count_contests(contest_data)
+    try:
+        report = detect_missing_ovals(image_path, count_contests,
+                                      threshold=app.config['IMAGE_BILEVEL_THRESHOLD'])
+    except Exception as e:
+        log_openai_session(job_id, 'error', {
+            'action': 'oval_prepass_failed',
+            'error_message': str(e),
+            'error_type': type(e).__name__
+        })
+        return None
+
+    log_openai_session(job_id, 'metadata', {
+        'action': 'oval_prepass',
+        'status': report['status'],
+        'reasons': report['reasons'],
+        'oval_count': report['oval_count'],
+        'candidate_rows': report['candidate_rows'],
+        'expected_oval_count': report['expected_oval_count'],
+        'expected_count_source': expected_count_source,
+        'issues': report['findings']['total_issues'],
+        'seconds': report['seconds']
+    })
+    prepass = {key: value for key, value in report.items() if key != 'findings'}
+    prepass['expected_count_source'] = expected_count_source
+    if report['status'] != 'clean':
+        # Anomalies and uncertain layouts are confirmed by the model; the local findings are kept alongside
+        update_job(job_id, oval_prepass=dict(prepass, findings=report['findings']))
+        return None
+    update_job(job_id, oval_prepass=prepass)
+
+    results = {
+        'agent': 'missing_ovals',
+        'raw_analysis': '',
+        'findings': report['findings'],
+        'local_detector': True,
+        'completed_at': datetime.now().isoformat()
+    }
+    update_agent_status(job_id, 'missing_ovals',
+                        status='completed',
+                        progress=100,
+                        local_detector=True,
+                        results=results)
+    return results
+
+def get_job_image(image_path, job_id):
+    """Encode the job's image once; every agent shares the same immutable payload"""
+    with job_timelines.stage(job_id, 'encode_image'):
+        encoded_image, cache_hit = get_encoded_image(image_path, job_store.get_job(job_id).get('image_file_id'))
+    log_openai_session(job_id, 'metadata', {
+        'action': 'image_encoded',
+        'base64_length': encoded_image.base64_length,
+        'sha256': encoded_image.sha256,
+        'cache_hit': cache_hit,
+        'preprocessing': encoded_image.preprocessing
+    })
+    if encoded_image.preprocessing:
+        update_job(job_id, image_preprocessing=encoded_image.preprocessing)
+    return encoded_image
+
+def store_agent_results(job_id, cache_keys, fresh_results):
+    """Write freshly parsed agent results to the result cache"""
+    for agent_name, results in fresh_results.items():
+        if results['findings'].get('parsing_method') == 'fallback' or results.get('tile_errors'):
+            continue
+        key, key_fields = cache_keys[agent_name]
         try:
-            findings = convert_yaml_to_findings(structured_data, agent_name)
-            if findings:
-                findings['detailed_analysis'] = analysis_text
-                return findings
-        except Exception as e:
-            log_openai_session(job_id, 'metadata', {
-                'action': 'yaml_conversion_failed',
+            result_cache.put(key, key_fields, results)
+        except OSError as e:
+            log_openai_session(job_id, 'error', {
+                'action': 'result_cache_write_failed',
                 'agent': agent_name,
-                'error': f'Failed to convert YAML to findings format: {str(e)}'
+                'error': str(e)
             })
+
+def finalize_job(job_id, agent_results, agent_errors):
+    """Combine the agents' results and mark the job completed"""
+    if not agent_results:
+        raise RuntimeError('All agents failed: ' + '; '.join(
+            f'{name}: {error}' for name, error in agent_errors.items()))
+
+    # Keep whatever the surviving agent found
+    missing_ovals_results = agent_results.get('missing_ovals') or \
+        build_failed_agent_results('missing_ovals', agent_errors.get('missing_ovals'))
+    spelling_results = agent_results.get('spelling') or \
+        build_failed_agent_results('spelling', agent_errors.get('spelling'))
+
+    # Combine results from both agents
+    with job_timelines.stage(job_id, 'combine_results'):
+        combined_results = combine_agent_results(missing_ovals_results, spelling_results)
+
+    cached_agents = [name for name, results in agent_results.items() if results.get('cached')]
+    fresh_agents = [name for name, results in agent_results.items()
+                    if not results.get('cached') and not results.get('local_detector')]
+
+    # Update job with final results
+    if agent_errors:
+        message = f"Multi-agent analysis completed with errors in: {', '.join(agent_errors)}"
+    elif len(cached_agents) == len(agent_results):
+        message = 'Multi-agent analysis completed from cached results'
+    elif not fresh_agents:
+        message = 'Multi-agent analysis completed without calling OpenAI'
     else:
-        if structured_data:
-            log_openai_session(job_id, 'metadata', {
-                'action': 'structured_yaml_parsing_partial',
-                'agent': agent_name,
-                'issue': 'Structured data found but missing expected format',
-                'fallback_to_legacy': True
+        message = 'Multi-agent analysis completed successfully'
+    job = job_store.get_job(job_id)
+    update_job(job_id,
+               status='completed',
+               progress=100,
+               message=message,
+               results={
+                   'combined_analysis': combined_results,
+                   'agent_results': {
+                       'missing_ovals': missing_ovals_results,
+                       'spelling': spelling_results
+                   },
+                   'agent_errors': agent_errors,
+                   'cached_agents': cached_agents,
+                   'token_usage': summarize_token_usage(agent_request_usage(agent_results)),
+                   'image_preprocessing': job.get('image_preprocessing'),
+                   'column_tiles': job.get('column_tiles'),
+                   'oval_prepass': job.get('oval_prepass'),
+                   'completed_at': datetime.now().isoformat()
+               })
+
+    # Log completion
+    log_openai_session(job_id, 'metadata', {
+        'action': 'multi_agent_analysis_completed',
+        'status': 'partial' if agent_errors else 'success',
+        'agents_completed': list(agent_results.keys()),
+        'agents_failed': list(agent_errors.keys())
+    })
+
+def fail_job(job_id, error):
+    """Log a failed analysis and record the error on the job"""
+    log_openai_session(job_id, 'error', {
+        'action': 'multi_agent_analysis_failed',
+        'error_message': str(error),
+        'error_type': type(error).__name__
+    })
+    
+    update_job(job_id,
+               status='error',
+               progress=0,
+               message=f'Multi-agent analysis failed: {str(error)}',
+               error=str(error))
+
+def analyze_ballot_with_openai(image_path, job_id):
+    """Orchestrate multi-agent ballot analysis using OpenAI GPT-4o with vision"""
+    if job_store.get_job(job_id).get('execution_mode') == 'deferred':
+        return analyze_ballot_deferred(image_path, job_id)
+
+    try:
+        contest_data, cache_keys, resolved_results = start_job_analysis(image_path, job_id)
+
+        agent_results = dict(resolved_results)
+        agent_errors = {}
+        pending_agents = [name for name in cache_keys if name not in resolved_results]
+        if pending_agents:
+            update_job(job_id, progress=10, message=f"Analyzing with agents: {', '.join(pending_agents)}...")
+            tiled = None
+            if job_store.get_job(job_id).get('tiling') == 'columns':
+                tiled = analyze_ballot_columns(image_path, job_id, contest_data, pending_agents)
+
+            if tiled is not None:
+                fresh_results, agent_errors = tiled
+            else:
+                encoded_image = get_job_image(image_path, job_id)
+                agent_tasks = {
+                    'missing_ovals': lambda: analyze_ballot_for_missing_ovals(image_path, job_id, encoded_image),
+                    'spelling': lambda: analyze_ballot_for_spelling(image_path, contest_data, job_id, encoded_image)
+                }
+
+                # Independent agents run at the same time
+                fresh_results, agent_errors = run_agents_concurrently(
+                    job_id, {name: agent_tasks[name] for name in pending_agents})
+            with job_timelines.stage(job_id, 'store_results'):
+                store_agent_results(job_id, cache_keys, fresh_results)
+            agent_results.update(fresh_results)
+
+        finalize_job(job_id, agent_results, agent_errors)
+
+    except Exception as e:
+        fail_job(job_id, e)
+
+async def analyze_ballot_with_openai_async(image_path, job_id):
+    """
+    analyze_ballot_with_openai() as a coroutine for the asyncio engine
+
+    The agents' OpenAI requests are awaited on the event loop; blocking stages
+    run on the engine's executor, and status updates and session logging go
+    through job_updates. Deferred and column-tiled jobs keep their thread-based
+    implementations.
+    """
+    def load_job():
+        return job_store.get_job(job_id), job_priority(job_id)
+
+    # The job store and its lock are only touched off the loop; the priority is resolved once per job
+    job, priority = await asyncio.to_thread(load_job)
+    if job.get('execution_mode') == 'deferred' or job.get('tiling') == 'columns':
+        return await job_scheduler.run_legacy(analyze_ballot_with_openai, image_path, job_id)
+
+    try:
+        contest_data, cache_keys, resolved_results = await asyncio.to_thread(start_job_analysis, image_path, job_id)
+
+        agent_results = dict(resolved_results)
+        agent_errors = {}
+        pending_agents = [name for name in cache_keys if name not in resolved_results]
+        if pending_agents:
+            job_updates.update_job(job_id, progress=10,
+                                   message=f"Analyzing with agents: {', '.join(pending_agents)}...")
+            encoded_image = await asyncio.to_thread(get_job_image, image_path, job_id)
+            fresh_results, agent_errors = await run_agents_async(job_id, {
+                name: analyze_agent_async(name, image_path, job_id, priority, encoded_image, contest_data)
+                for name in pending_agents
             })
+            # The agents' statuses are on the job before anything reads it back
+            await job_updates.flush_async()
+            with job_timelines.stage(job_id, 'store_results'):
+                await asyncio.to_thread(store_agent_results, job_id, cache_keys, fresh_results)
+            agent_results.update(fresh_results)
+
+        await asyncio.to_thread(finalize_job, job_id, agent_results, agent_errors)
+
+    except Exception as e:
+        # A queued progress update must not land after the error status
+        await job_updates.flush_async()
+        await asyncio.to_thread(fail_job, job_id, e)
+
+# Queued job functions the asyncio engine runs as coroutines instead of on a thread
+ASYNC_JOB_FUNCTIONS = {
+    analyze_ballot_with_openai: analyze_ballot_with_openai_async
+}
+
+class DeferredBatchRunner:
+    """
+    Collects agent requests from deferred jobs into OpenAI Batch API input files
+
+    Requests are flushed into a JSONL file once enough have accumulated (or the
+    oldest has waited long enough), submitted through the Batch API and polled
+    until the batch finishes. Each output line is handed back by custom_id.
+    Submitted batches are recorded in the job store, so a restarted server
+    resumes polling them (resume()) instead of losing batches already paid for.
+    """
+
+    def __init__(self, batch_dir, max_requests, max_bytes, flush_seconds, poll_seconds,
+                 on_result, on_error):
+        self.batch_dir = batch_dir
+        self.max_requests = max_requests
+        self.max_bytes = max_bytes
+        self.flush_seconds = flush_seconds
+        self.poll_seconds = poll_seconds
+        self.on_result = on_result
+        self.on_error = on_error
+        self._pending = []
+        self._pending_bytes = 0
+        self._oldest_pending = None
+        self._submitted = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._last_poll = 0.0
+        os.makedirs(batch_dir, exist_ok=True)
+
+    def add(self, custom_id, body):
+        """Queue one chat completions request body for the next batch file"""
+        line = json.dumps({
+            'custom_id': custom_id,
+            'method': 'POST',
+            'url': '/v1/chat/completions',
+            'body': body
+        }, ensure_ascii=False)
+
+        with self._lock:
+            # Keep each input file under the Batch API size limit
+            if self._pending and self._pending_bytes + len(line) > self.max_bytes:
+                batch = self._take_pending()
+            else:
+                batch = None
+            self._pending.append((custom_id, line))
+            self._pending_bytes += len(line) + 1
+            if self._oldest_pending is None:
+                self._oldest_pending = time.time()
+            if len(self._pending) >= self.max_requests:
+                batch = batch or self._take_pending()
+            self._ensure_thread()
+
+        if batch:
+            self._submit(batch)
+
+    def resume(self):
+        """
+        Poll the batches submitted by a server process that is no longer running
+
+        Their deferred jobs are taken over by this process.
+
+        Returns:
+            Number of batches resumed
+        """
+        batches = job_store.claim_openai_batches()
+        for batch in batches:
+            for custom_id in batch['custom_ids']:
+                job_store.adopt_job(custom_id.rsplit(':', 1)[0])
+        with self._lock:
+            for batch in batches:
+                self._submitted[batch['batch_id']] = {
+                    'custom_ids': batch['custom_ids'],
+                    'status': batch['status'],
+                    'submitted_at': batch['submitted_at']
+                }
+            if batches:
+                self._ensure_thread()
+        return len(batches)
+
+    def flush(self):
+        """Submit whatever is pending right away"""
+        with self._lock:
+            batch = self._take_pending()
+        if batch:
+            self._submit(batch)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pending_requests': len(self._pending),
+                'pending_bytes': self._pending_bytes,
+                'submitted_batches': [
+                    {'batch_id': batch_id, 'requests': len(info['custom_ids']),
+                     'status': info['status'], 'submitted_at': info['submitted_at']}
+                    for batch_id, info in self._submitted.items()
+                ]
+            }
+
+    def _take_pending(self):
+        batch = self._pending
+        self._pending = []
+        self._pending_bytes = 0
+        self._oldest_pending = None
+        return batch
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, daemon=True, name='deferred-batches')
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(1)
+            with self._lock:
+                due = self._oldest_pending is not None and \
+                    time.time() - self._oldest_pending >= self.flush_seconds
+                batch = self._take_pending() if due else None
+            # Keep the thread alive: a failure here must not strand every submitted batch
+            try:
+                if batch:
+                    self._submit(batch)
+                if self._submitted and time.time() - self._last_poll >= self.poll_seconds:
+                    self._last_poll = time.time()
+                    self._poll()
+            except Exception as e:
+                print(f"Deferred batch runner error: {e}")
+
+    def _submit(self, batch):
+        custom_ids = [custom_id for custom_id, _ in batch]
+        input_path = os.path.join(self.batch_dir, f"input-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}.jsonl")
+        try:
+            with open(input_path, 'w', encoding='utf-8') as f:
+                for _, line in batch:
+                    f.write(line)
+                    f.write('\n')
+            with open(input_path, 'rb') as f:
+                input_file = client.files.create(file=f, purpose='batch')
+            openai_batch = client.batches.create(
+                input_file_id=input_file.id,
+                endpoint='/v1/chat/completions',
+                completion_window='24h',
+                metadata={'source': 'ballot-llm-ui'}
+            )
+        except Exception as e:
+            for custom_id in custom_ids:
+                self.on_error(custom_id, f'Batch submission failed: {str(e)}')
+            return
+        finally:
+            # The input file holds base64 images; OpenAI has its own copy now
+            if os.path.exists(input_path):
+                os.remove(input_path)
+
+        submitted_at = datetime.now().isoformat()
+        job_store.save_openai_batch(openai_batch.id, custom_ids, openai_batch.status, submitted_at)
+        with self._lock:
+            self._submitted[openai_batch.id] = {
+                'custom_ids': custom_ids,
+                'status': openai_batch.status,
+                'submitted_at': submitted_at
+            }
+
+    def _poll(self):
+        with self._lock:
+            batch_ids = list(self._submitted.keys())
+
+        for batch_id in batch_ids:
+            try:
+                openai_batch = client.batches.retrieve(batch_id)
+            except Exception as e:
+                print(f"Failed to poll OpenAI batch {batch_id}: {e}")
+                continue
+
+            with self._lock:
+                info = self._submitted[batch_id]
+                changed = info['status'] != openai_batch.status
+                info['status'] = openai_batch.status
+            if changed:
+                job_store.update_openai_batch(batch_id, openai_batch.status)
+            if openai_batch.status not in ('completed', 'failed', 'expired', 'cancelled'):
+                continue
+
+            # Download every result file before handing anything back; if one fails the batch
+            # stays in _submitted and is collected on the next poll
+            contents = []
+            try:
+                for file_id in (openai_batch.output_file_id, openai_batch.error_file_id):
+                    if file_id:
+                        contents.append(client.files.content(file_id).text)
+            except Exception as e:
+                print(f"Failed to download results of OpenAI batch {batch_id}: {e}")
+                continue
+
+            answered = set()
+            for content in contents:
+                for line in content.splitlines():
+                    if line.strip():
+                        custom_id = self._collect_line(batch_id, line)
+                        if custom_id:
+                            answered.add(custom_id)
+
+            for custom_id in info['custom_ids']:
+                if custom_id not in answered:
+                    self.on_error(custom_id, f'No result in OpenAI batch {batch_id} (status: {openai_batch.status})')
+
+            job_store.delete_openai_batch(batch_id)
+            with self._lock:
+                self._submitted.pop(batch_id, None)
+
+    def _collect_line(self, batch_id, line):
+        """Hand one line of a batch result file to the job it belongs to
+
+        Args:
+            batch_id: OpenAI batch the line was downloaded from
+            line: JSONL record with custom_id and response or error
+
+        Returns:
+            str: custom_id of the record, or None if the line could not be parsed
+        """
+        try:
+            record = json.loads(line)
+            custom_id = record['custom_id']
+        except (ValueError, KeyError, TypeError) as e:
+            print(f"Skipping unreadable line in OpenAI batch {batch_id}: {e}")
+            return None
+
+        try:
+            response = record.get('response') or {}
+            if record.get('error') or response.get('status_code', 200) != 200:
+                error = record.get('error') or response.get('body', {}).get('error')
+                self.on_error(custom_id, f'Batch request failed: {error}')
+            else:
+                self.on_result(custom_id, response['body'])
+        except Exception as e:
+            print(f"Failed to apply result {custom_id} of OpenAI batch {batch_id}: {e}")
+            try:
+                self.on_error(custom_id, f'Failed to process batch result: {str(e)}')
+            except Exception as e:
+                print(f"Failed to record error for {custom_id}: {e}")
+        return custom_id
+
+def analyze_ballot_deferred(image_path, job_id):
+    """Prepare a job's agent requests for the OpenAI Batch API instead of calling the model directly"""
+    try:
+        contest_data, cache_keys, resolved_results = start_job_analysis(image_path, job_id)
+        pending_agents = [name for name in cache_keys if name not in resolved_results]
+        if not pending_agents:
+            finalize_job(job_id, resolved_results, {})
+            return
+
+        encoded_image = get_job_image(image_path, job_id)
+        requests_by_agent = {}
+        for agent_name in pending_agents:
+            with job_timelines.stage(job_id, 'build_messages', track=agent_name):
+                messages = build_agent_messages(agent_name, job_id, encoded_image, contest_data)
+            request_params = agent_request_params(agent_name)
+            log_openai_request(job_id=job_id, model=AGENT_MODEL, messages=messages,
+                               execution_mode='deferred', **request_params)
+            requests_by_agent[agent_name] = {'model': AGENT_MODEL, 'messages': messages, **request_params}
+            update_agent_status(job_id, agent_name, status='deferred', progress=20)
+
+        update_job(job_id,
+                   status='deferred',
+                   progress=10,
+                   message='Waiting for OpenAI batch processing...',
+                   deferred={
+                       'cache_keys': cache_keys,
+                       'resolved_results': resolved_results,
+                       'pending_agents': pending_agents,
+                       'submitted_at': time.time(),
+                       'results': {},
+                       'errors': {}
+                   })
+        for agent_name, body in requests_by_agent.items():
+            deferred_batches.add(f"{job_id}:{agent_name}", body)
+
+    except Exception as e:
+        fail_job(job_id, e)
+
+def complete_deferred_agent(custom_id, response_body=None, error=None):
+    """Record one Batch API result and finish its job once every agent has answered"""
+    job_id, agent_name = custom_id.rsplit(':', 1)
+    if job_store.get_job(job_id) is None:
+        return
+
+    try:
+        if error is None:
+            log_openai_session(job_id, 'response', response_body)
+            record_openai_usage(agent_name, 'batch', response_body.get('usage'))
+            analysis_content = response_body['choices'][0]['message']['content']
+            agent_results = build_agent_results(agent_name, analysis_content, job_id)
+            agent_results['timing'] = {'deferred': True, 'usage': token_usage(response_body.get('usage'))}
+            update_agent_status(job_id, agent_name, status='completed', progress=100,
+                                results=agent_results, completed_at=datetime.now().isoformat())
+    except Exception as e:
+        error = f'Failed to process batch result: {str(e)}'
+
+    with jobs_lock:
+        deferred = job_store.get_job(job_id).get('deferred')
+        if deferred is None:
+            return
+        job_timelines.record(job_id, 'batch_wait', deferred['submitted_at'], time.time(), track=agent_name)
+        if error is None:
+            deferred['results'][agent_name] = agent_results
         else:
-            log_openai_session(job_id, 'metadata', {
-                'action': 'structured_yaml_parsing_failed',
-                'agent': agent_name,
-                'fallback_to_legacy': True
-            })
+            deferred['errors'][agent_name] = error
+        finished = len(deferred['results']) + len(deferred['errors'])
+        done = finished == len(deferred['pending_agents'])
+        if done:
+            update_job(job_id, deferred=None)
+        else:
+            update_job(job_id, deferred=deferred,
+                       progress=10 + int(80 * finished / len(deferred['pending_agents'])))
+
+    if error is not None:
+        log_openai_session(job_id, 'error', {'action': f'agent_{agent_name}_failed', 'error_message': error})
+        update_agent_status(job_id, agent_name, status='error', progress=100, error=error,
+                            completed_at=datetime.now().isoformat())
+
+    if done:
+        try:
+            with job_timelines.stage(job_id, 'store_results'):
+                store_agent_results(job_id, deferred['cache_keys'], deferred['results'])
+            agent_results = dict(deferred['resolved_results'])
+            agent_results.update(deferred['results'])
+            finalize_job(job_id, agent_results, deferred['errors'])
+        except Exception as e:
+            fail_job(job_id, e)
+
+deferred_batches = DeferredBatchRunner(
+    batch_dir=app.config['DEFERRED_BATCH_DIR'],
+    max_requests=app.config['DEFERRED_BATCH_MAX_REQUESTS'],
+    max_bytes=app.config['DEFERRED_BATCH_MAX_BYTES'],
+    flush_seconds=app.config['DEFERRED_BATCH_FLUSH_SECONDS'],
+    poll_seconds=app.config['DEFERRED_BATCH_POLL_SECONDS'],
+    on_result=lambda custom_id, body: complete_deferred_agent(custom_id, response_body=body),
+    on_error=lambda custom_id, error: complete_deferred_agent(custom_id, error=error)
+)
+# Batches submitted before a restart are still being processed (and paid for) by OpenAI
+resumed_batches = deferred_batches.resume()
+if resumed_batches:
+    print(f"Resumed polling {resumed_batches} OpenAI batch(es) of deferred jobs")
+
+def prepare_agent_image(agent_name, image_path, job_id, encoded_image=None, update_status=update_agent_status):
+    """Reuse the job's encoded image, encoding it only when an agent is called on its own"""
+    cache_hit = True
+    if encoded_image is None:
+        encoded_image, cache_hit = get_encoded_image(image_path)
     
-    # Fallback to legacy parsing
+    # Log image encoding completion
     log_openai_session(job_id, 'metadata', {
-        'action': 'using_legacy_parsing',
+        'action': f'agent_{agent_name}_image_encoded',
+        'base64_length': encoded_image.base64_length,
+        'shared_payload': cache_hit,
         'agent': agent_name
     })
-    
+    update_status(job_id, agent_name, progress=20)
+    return encoded_image
+
+# The election's candidate list, sent after the spelling agent's static instructions
+CONTEST_DATA_PROMPT = "Official Contest and Candidate Data:\n{contest_text}"
+# OpenAI caches prompt prefixes from this length up
+PROMPT_CACHE_MIN_TOKENS = 1024
+
+COLUMN_TILE_PROMPT_NOTE = (
+    "Note: the attached image is not the whole ballot. It is column {column} of {column_count}, "
+    "cropped from the full page, so it may begin or end partway through a contest and will not "
+    "show every contest on the ballot. Only report issues you can see in this column."
+)
+
+# Bump when build_agent_messages changes the order or framing of the message parts
+# (2: contest list moved after the static instructions for the prompt cache)
+MESSAGE_LAYOUT_VERSION = 2
+
+def message_layout_sha256():
+    """Hash of the message layout and its fixed text, so a changed layout invalidates cached results"""
+    layout = json.dumps([MESSAGE_LAYOUT_VERSION, CONTEST_DATA_PROMPT, COLUMN_TILE_PROMPT_NOTE])
+    return hashlib.sha256(layout.encode('utf-8')).hexdigest()
+
+def build_agent_messages(agent_name, job_id, encoded_image, contest_data=None, column=None):
+    """
+    Load an agent's prompt and build the chat messages for one ballot image
+
+    The parts are ordered from most to least shared so OpenAI's prompt cache can
+    reuse the longest prefix: the agent's static instructions (identical for
+    every ballot), then the election's contest list (identical for every ballot
+    in the election), then anything specific to this request, with the image last.
+    A transcribing spelling agent is not sent the contest list at all.
+
+    Args:
+        agent_name: The agent whose prompt to use
+        job_id: Unique job identifier
+        encoded_image: EncodedImage payload to attach
+        contest_data: Parsed contest data (spelling agent only)
+        column: (column, column_count) when the image is a single column crop
+    """
     try:
-        if agent_name == 'missing_ovals':
-            findings = parse_analysis_results(analysis_text)  # existing function
-        else:
-            findings = parse_spelling_results_legacy(analysis_text)  # renamed existing function
-        
-        findings['parsing_method'] = 'legacy_keywords'
-        findings['detailed_analysis'] = analysis_text
-        return findings
-    except Exception as e:
+        prompt = load_agent_prompt(agent_name)
+    except (FileNotFoundError, KeyError) as e:
         log_openai_session(job_id, 'error', {
-            'action': 'legacy_parsing_failed',
+            'action': 'prompt_load_failed',
             'agent': agent_name,
             'error': str(e)
         })
-        
-        # Return basic findings structure as last resort
-        return {
-            'summary': 'Analysis completed but parsing failed',
-            'total_issues': 0,
-            'confidence_summary': 'Unable to parse results properly',
-            'detailed_analysis': analysis_text,
-            'analysis_status': 'parsing_error',
-            'parsing_method': 'fallback',
-            'missing_ovals': [] if agent_name == 'missing_ovals' else None,
-            'spelling_errors': [] if agent_name == 'spelling' else None,
-            'other_issues': [],
-            'sections': {
-                'general_observations': [],
-                'specific_findings': [],
-                'recommendations': []
-            }
+        raise e
+
+    text_parts = [prompt]
+    if agent_name == 'spelling' and not transcribes_names(agent_name):
+        text_parts.append(CONTEST_DATA_PROMPT.format(contest_text=format_contest_text(contest_data)))
+    stable_prefix_tokens = sum(estimate_tokens(text) for text in text_parts)
+    if column:
+        text_parts.append(COLUMN_TILE_PROMPT_NOTE.format(column=column[0], column_count=column[1]))
+
+    log_openai_session(job_id, 'metadata', {
+        'action': 'prompt_loaded',
+        'agent': agent_name,
+        'prompt_file': agent_prompt_file(agent_name),
+        'stable_prefix_tokens': stable_prefix_tokens,
+        'prefix_cacheable': stable_prefix_tokens >= PROMPT_CACHE_MIN_TOKENS
+    })
+
+    return [
+        {
+            "role": "user",
+            "content": [{"type": "text", "text": text} for text in text_parts] + [
+                {
+                    "type": "image_url",
+                    "image_url": {
+                        "url": encoded_image.data_url,
+                        "detail": "high"
+                    }
+                }
+            ]
         }
+    ]
+
+def send_scheduled_completion(agent_name, messages, job_id, track=None, **request_params):
+    """
+    Send a chat completion request through openai_scheduler
+
+    Args:
+        agent_name: Agent the request is for
+        messages: Chat messages
+        job_id: Job the request belongs to (sets its priority)
+        track: Timeline track for time spent waiting (defaults to the agent)
+        **request_params: Parameters for chat.completions.create
+
+    Returns:
+        Tuple of (parsed response, scheduling) where scheduling has
+        scheduler_wait_seconds, retries and model_seconds
+    """
+    raw, scheduling = openai_scheduler.run(
+        lambda: scheduled_client.chat.completions.with_raw_response.create(
+            model=AGENT_MODEL, messages=messages, **request_params),
+        estimate_request_tokens(messages, request_params.get('max_tokens')),
+        priority=job_priority(job_id),
+        agent_name=agent_name,
+        on_wait=lambda start, end: job_timelines.record(job_id, 'rate_limit_wait', start, end,
+                                                        track=track or agent_name))
+    return raw.parse(), scheduling
+
+async def send_scheduled_completion_async(agent_name, messages, job_id, priority, track=None, **request_params):
+    """
+    send_scheduled_completion() on the asyncio engine's client
+
+    Args:
+        priority: The job's job_priority(), resolved off the event loop
+
+    Returns:
+        Tuple of (parsed response, scheduling) as from send_scheduled_completion
+    """
+    async_client = job_scheduler.openai_client
+    raw, scheduling = await openai_scheduler.run_async(
+        lambda: async_client.chat.completions.with_raw_response.create(
+            model=AGENT_MODEL, messages=messages, **request_params),
+        estimate_request_tokens(messages, request_params.get('max_tokens')),
+        priority=priority,
+        agent_name=agent_name,
+        on_wait=lambda start, end: job_timelines.record(job_id, 'rate_limit_wait', start, end,
+                                                        track=track or agent_name))
+    return raw.parse(), scheduling
+
+def create_agent_completion(agent_name, messages, job_id, track=None):
+    """
+    Send an agent's chat messages to OpenAI, logging the request and response
+
+    Returns:
+        Tuple of (response, scheduling) as from send_scheduled_completion
+    """
+    request_params = agent_request_params(agent_name)
+    # Log the request (with image data redacted)
+    log_openai_request(
+        job_id=job_id,
+        model=AGENT_MODEL,
+        messages=messages,
+        **request_params
+    )
+
+    # Call OpenAI API
+    try:
+        response, scheduling = send_scheduled_completion(agent_name, messages, job_id, track, **request_params)
+    except Exception:
+        record_openai_usage(agent_name, 'blocking', None, outcome='error')
+        raise
+    record_openai_usage(agent_name, 'blocking', response.usage.model_dump() if response.usage else None,
+                        scheduling['model_seconds'])
+
+    # Log the response
+    log_openai_response(job_id, response)
+    return response, scheduling
+
+async def create_agent_completion_async(agent_name, messages, job_id, priority):
+    """
+    create_agent_completion() on the asyncio engine
+
+    Returns:
+        Tuple of (response, scheduling) as from send_scheduled_completion
+    """
+    request_params = agent_request_params(agent_name)
+    job_updates.call(log_openai_request, job_id=job_id, model=AGENT_MODEL, messages=messages, **request_params)
+
+    try:
+        response, scheduling = await send_scheduled_completion_async(agent_name, messages, job_id, priority,
+                                                                     **request_params)
+    except Exception:
+        record_openai_usage(agent_name, 'blocking', None, outcome='error')
+        raise
+    record_openai_usage(agent_name, 'blocking', response.usage.model_dump() if response.usage else None,
+                        scheduling['model_seconds'])
+
+    job_updates.call(log_openai_response, job_id, response)
+    return response, scheduling
+
+class AgentStream:
+    """
+    Collects a streamed agent answer chunk by chunk, exposing the partial text and
+    any findings that are already complete on the agent's status as tokens arrive
+
+    The agent's status is updated when a finding completes, and otherwise at most
+    once per STREAM_UPDATE_INTERVAL.
+    """
+
+    def __init__(self, agent_name, job_id, update_status=update_agent_status):
+        self.agent_name = agent_name
+        self.job_id = job_id
+        self.update_status = update_status
+        self.parts = []
+        self.findings_parser = PartialFindingsParser(agent_name)
+        self.partial_findings = None
+        self.response_id = self.model = self.finish_reason = self.usage = None
+        self.first_token_at = self.first_finding_at = None
+        self.last_update = 0
+        self.interval = app.config['STREAM_UPDATE_INTERVAL']
+        self.started = None
+        self.scheduling = None
+
+    def begin(self, scheduling):
+        """Start the model latency clock once the scheduler has let the request through"""
+        self.scheduling = scheduling
+        self.started = time.perf_counter() - scheduling['model_seconds']
 
-def encode_image(image_path):
-    """Encode image to base64 for OpenAI API"""
-    with open(image_path, "rb") as image_file:
-        return base64.b64encode(image_file.read()).decode('utf-8')
+    def add(self, chunk):
+        self.response_id = self.response_id or chunk.id
+        self.model = self.model or chunk.model
+        if getattr(chunk, 'usage', None):
+            self.usage = chunk.usage.model_dump()
+        if not chunk.choices:
+            return
+        choice = chunk.choices[0]
+        self.finish_reason = choice.finish_reason or self.finish_reason
+        delta = choice.delta.content if choice.delta else None
+        if not delta:
+            return
 
-def analyze_ballot_with_openai(image_path, job_id):
-    """Orchestrate multi-agent ballot analysis using OpenAI GPT-4o with vision"""
-    try:
-        # Log session start
-        log_openai_session(job_id, 'metadata', {
-            'action': 'start_multi_agent_analysis',
-            'image_path': image_path,
-            'image_size': os.path.getsize(image_path)
-        })
+        now = time.perf_counter()
+        if self.first_token_at is None:
+            self.first_token_at = now - self.started
+            self.update_status(self.job_id, self.agent_name, progress=40)
+        self.parts.append(delta)
 
-        # Update job status
-        if job_id in analysis_jobs:
-            analysis_jobs[job_id]['status'] = 'processing'
-            analysis_jobs[job_id]['progress'] = 5
-            analysis_jobs[job_id]['message'] = 'Starting multi-agent analysis...'
-            analysis_jobs[job_id]['agents'] = {
-                'missing_ovals': {'status': 'pending', 'results': None},
-                'spelling': {'status': 'pending', 'results': None}
-            }
+        # Only the new text is parsed; the status is updated when the findings change or the interval passes
+        if self.findings_parser.feed(delta):
+            self.partial_findings = self.findings_parser.findings()
+            if self.first_finding_at is None and self.partial_findings and self.partial_findings['total_issues']:
+                self.first_finding_at = now - self.started
+        elif now - self.last_update < self.interval:
+            return
+        self.last_update = now
+        fields = {'partial_raw_analysis': ''.join(self.parts)}
+        if self.partial_findings is not None:
+            fields['partial_findings'] = self.partial_findings
+        self.update_status(self.job_id, self.agent_name, **fields)
 
-        # Get contest data for spelling analysis
-        contest_data_id = analysis_jobs[job_id].get('contest_data_id')
-        contest_data = None
-        if contest_data_id and f"contests_{contest_data_id}" in analysis_jobs:
-            contest_data = analysis_jobs[f"contests_{contest_data_id}"]
-
-        # Run Agent 1: Missing Ovals Analysis
-        log_openai_session(job_id, 'metadata', {'action': 'starting_agent_missing_ovals'})
-        if job_id in analysis_jobs:
-            analysis_jobs[job_id]['progress'] = 10
-            analysis_jobs[job_id]['message'] = 'Agent 1: Analyzing for missing ovals...'
-            analysis_jobs[job_id]['agents']['missing_ovals']['status'] = 'running'
-        
-        missing_ovals_results = analyze_ballot_for_missing_ovals(image_path, job_id)
-        
-        if job_id in analysis_jobs:
-            analysis_jobs[job_id]['agents']['missing_ovals']['status'] = 'completed'
-            analysis_jobs[job_id]['agents']['missing_ovals']['results'] = missing_ovals_results
-            analysis_jobs[job_id]['progress'] = 50
-            analysis_jobs[job_id]['message'] = 'Agent 2: Analyzing for spelling errors...'
-            analysis_jobs[job_id]['agents']['spelling']['status'] = 'running'
-
-        # Run Agent 2: Spelling Analysis
-        log_openai_session(job_id, 'metadata', {'action': 'starting_agent_spelling'})
-        spelling_results = analyze_ballot_for_spelling(image_path, contest_data, job_id)
-        
-        if job_id in analysis_jobs:
-            analysis_jobs[job_id]['agents']['spelling']['status'] = 'completed'
-            analysis_jobs[job_id]['agents']['spelling']['results'] = spelling_results
-            analysis_jobs[job_id]['progress'] = 90
-            analysis_jobs[job_id]['message'] = 'Combining analysis results...'
-
-        # Combine results from both agents
-        combined_results = combine_agent_results(missing_ovals_results, spelling_results)
-        
-        # Update job with final results
-        if job_id in analysis_jobs:
-            analysis_jobs[job_id]['status'] = 'completed'
-            analysis_jobs[job_id]['progress'] = 100
-            analysis_jobs[job_id]['message'] = 'Multi-agent analysis completed successfully'
-            analysis_jobs[job_id]['results'] = {
-                'combined_analysis': combined_results,
-                'agent_results': {
-                    'missing_ovals': missing_ovals_results,
-                    'spelling': spelling_results
-                },
-                'completed_at': datetime.now().isoformat()
-            }
+    def fail(self):
+        record_openai_usage(self.agent_name, 'stream', self.usage,
+                            time.perf_counter() - self.started if self.started is not None else None,
+                            outcome='error')
 
-        # Log completion
-        log_openai_session(job_id, 'metadata', {
-            'action': 'multi_agent_analysis_completed',
-            'status': 'success',
-            'agents_completed': ['missing_ovals', 'spelling']
-        })
+    def finish(self):
+        """
+        Record and log the completed answer
 
-    except Exception as e:
-        # Log the error
-        log_openai_session(job_id, 'error', {
-            'action': 'multi_agent_analysis_failed',
-            'error_message': str(e),
-            'error_type': type(e).__name__
-        })
-        
-        # Update job with error
-        if job_id in analysis_jobs:
-            analysis_jobs[job_id]['status'] = 'error'
-            analysis_jobs[job_id]['progress'] = 0
-            analysis_jobs[job_id]['message'] = f'Multi-agent analysis failed: {str(e)}'
-            analysis_jobs[job_id]['error'] = str(e)
+        Returns:
+            Tuple of (analysis_content, timing)
+        """
+        analysis_content = ''.join(self.parts)
+        total_seconds = time.perf_counter() - self.started
+        record_openai_usage(self.agent_name, 'stream', self.usage, total_seconds)
+        first_finding_at = self.first_finding_at
+        if first_finding_at is None:
+            final_findings = parse_partial_findings(analysis_content, self.agent_name)
+            if final_findings and final_findings['total_issues']:
+                first_finding_at = total_seconds
 
-def analyze_ballot_for_missing_ovals(image_path, job_id):
-    """Agent 1: Analyze ballot image for missing ovals using OpenAI GPT-4o with vision"""
-    agent_name = 'missing_ovals'
-    
-    try:
-        # Encode the image
-        base64_image = encode_image(image_path)
-        
-        # Log image encoding completion
-        log_openai_session(job_id, 'metadata', {
-            'action': 'agent_missing_ovals_image_encoded',
-            'base64_length': len(base64_image),
-            'agent': agent_name
+        timing = {
+            'streamed': True,
+            'time_to_first_token': round(self.first_token_at, 3) if self.first_token_at is not None else None,
+            'time_to_first_finding': round(first_finding_at, 3) if first_finding_at is not None else None,
+            'total_seconds': round(total_seconds, 3),
+            'scheduler_wait_seconds': self.scheduling['scheduler_wait_seconds'],
+            'retries': self.scheduling['retries'],
+            'usage': token_usage(self.usage)
+        }
+        log_openai_session(self.job_id, 'response', {
+            'id': self.response_id,
+            'object': 'chat.completion',
+            'model': self.model,
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': analysis_content},
+                'finish_reason': self.finish_reason
+            }],
+            'usage': self.usage,
+            'timing': timing
         })
+        return analysis_content, timing
 
-        # Load the prompt for this agent
-        try:
-            prompt = load_agent_prompt(agent_name)
-            log_openai_session(job_id, 'metadata', {
-                'action': 'prompt_loaded',
-                'agent': agent_name,
-                'prompt_file': AGENT_PROMPTS[agent_name]
-            })
-        except (FileNotFoundError, KeyError) as e:
-            log_openai_session(job_id, 'error', {
-                'action': 'prompt_load_failed',
-                'agent': agent_name,
-                'error': str(e)
-            })
-            raise e
-
-        messages = [
-            {
-                "role": "user",
-                "content": [
-                    {"type": "text", "text": prompt},
-                    {
-                        "type": "image_url",
-                        "image_url": {
-                            "url": f"data:image/png;base64,{base64_image}",
-                            "detail": "high"
-                        }
-                    }
-                ]
-            }
-        ]
+def stream_agent_completion(agent_name, messages, job_id):
+    """
+    Stream an agent's answer, exposing the partial text and any findings that are
+    already complete on the agent's status as tokens arrive
+
+    Returns:
+        Tuple of (analysis_content, timing)
+    """
+    request_params = agent_request_params(agent_name)
+    log_openai_request(
+        job_id=job_id,
+        model=AGENT_MODEL,
+        messages=messages,
+        stream=True,
+        **request_params
+    )
 
-        # Log the request (with image data redacted)
-        log_openai_request(
-            job_id=job_id,
-            model="gpt-4o",
-            messages=messages,
-            max_tokens=1500,
-            temperature=0.1
+    answer = AgentStream(agent_name, job_id)
+    try:
+        stream, scheduling = send_scheduled_completion(
+            agent_name, messages, job_id,
+            stream=True,
+            stream_options={'include_usage': True},
+            **request_params
         )
+        answer.begin(scheduling)
+        for chunk in stream:
+            answer.add(chunk)
+    except Exception:
+        answer.fail()
+        raise
+    return answer.finish()
+
+async def stream_agent_completion_async(agent_name, messages, job_id, priority):
+    """
+    stream_agent_completion() on the asyncio engine
+
+    Returns:
+        Tuple of (analysis_content, timing)
+    """
+    request_params = agent_request_params(agent_name)
+    job_updates.call(log_openai_request, job_id=job_id, model=AGENT_MODEL, messages=messages, stream=True,
+                     **request_params)
 
-        # Call OpenAI API
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=messages,
-            max_tokens=1500,
-            temperature=0.1  # Low temperature for consistent analysis
+    answer = AgentStream(agent_name, job_id, update_status=job_updates.update_agent_status)
+    try:
+        stream, scheduling = await send_scheduled_completion_async(
+            agent_name, messages, job_id, priority,
+            stream=True,
+            stream_options={'include_usage': True},
+            **request_params
         )
+        answer.begin(scheduling)
+        async for chunk in stream:
+            answer.add(chunk)
+    except Exception:
+        answer.fail()
+        raise
+    return await asyncio.to_thread(answer.finish)
 
-        # Log the response
-        log_openai_response(job_id, response)
+def request_agent_analysis(agent_name, messages, job_id):
+    """
+    Send an agent's messages to OpenAI
 
-        # Extract the analysis content
-        analysis_content = response.choices[0].message.content
-        
-        # Parse the response to extract structured findings
+    Returns:
+        Tuple of (analysis_content, timing)
+    """
+    update_agent_status(job_id, agent_name, progress=30)
+    with job_timelines.stage(job_id, 'openai_request', track=agent_name):
+        if app.config['STREAM_COMPLETIONS']:
+            analysis_content, timing = stream_agent_completion(agent_name, messages, job_id)
+        else:
+            response, scheduling = create_agent_completion(agent_name, messages, job_id)
+            # Extract the analysis content
+            analysis_content = response.choices[0].message.content
+            timing = blocking_timing(scheduling, response)
+    update_agent_status(job_id, agent_name, progress=80, timing=timing)
+    return analysis_content, timing
+
+async def request_agent_analysis_async(agent_name, messages, job_id, priority):
+    """
+    request_agent_analysis() on the asyncio engine
+
+    Returns:
+        Tuple of (analysis_content, timing)
+    """
+    job_updates.update_agent_status(job_id, agent_name, progress=30)
+    with job_timelines.stage(job_id, 'openai_request', track=agent_name):
+        if app.config['STREAM_COMPLETIONS']:
+            analysis_content, timing = await stream_agent_completion_async(agent_name, messages, job_id, priority)
+        else:
+            response, scheduling = await create_agent_completion_async(agent_name, messages, job_id, priority)
+            analysis_content = response.choices[0].message.content
+            timing = blocking_timing(scheduling, response)
+    job_updates.update_agent_status(job_id, agent_name, progress=80, timing=timing)
+    return analysis_content, timing
+
+def blocking_timing(scheduling, response):
+    """Timing and token usage of an agent request that was not streamed"""
+    return {
+        'streamed': False,
+        'total_seconds': round(scheduling['model_seconds'], 3),
+        'scheduler_wait_seconds': scheduling['scheduler_wait_seconds'],
+        'retries': scheduling['retries'],
+        'usage': token_usage(response.usage.model_dump() if response.usage else None)
+    }
+
+def build_agent_results(agent_name, analysis_content, job_id):
+    """Parse an agent's response text into its results structure"""
+    # Parse the response to extract structured findings
+    with job_timelines.stage(job_id, 'parse_results', track=agent_name):
         findings = parse_structured_results(analysis_content, agent_name, job_id)
-        
-        # Log the parsed findings
-        log_openai_session(job_id, 'metadata', {
-            'action': 'agent_missing_ovals_parsed',
-            'findings_summary': {
-                'missing_ovals_count': len(findings.get('missing_ovals', [])),
-                'other_issues_count': len(findings.get('other_issues', [])),
-                'total_issues': findings.get('total_issues', 0),
-                'analysis_status': findings.get('analysis_status', 'completed'),
-                'parsing_method': findings.get('parsing_method', 'unknown')
-            }
-        })
-        
-        return {
-            'agent': agent_name,
-            'raw_analysis': analysis_content,
-            'findings': findings,
-            'completed_at': datetime.now().isoformat()
+    parse_outcomes.inc(agent=agent_name, method=findings.get('parsing_method', 'unknown'))
+    
+    # Log the parsed findings
+    issue_key = 'missing_ovals' if agent_name == 'missing_ovals' else 'spelling_errors'
+    log_openai_session(job_id, 'metadata', {
+        'action': f'agent_{agent_name}_parsed',
+        'findings_summary': {
+            f'{issue_key}_count': len(findings.get(issue_key) or []),
+            'other_issues_count': len(findings.get('other_issues', [])),
+            'total_issues': findings.get('total_issues', 0),
+            'analysis_status': findings.get('analysis_status', 'completed'),
+            'parsing_method': findings.get('parsing_method', 'unknown')
         }
+    })
+    
+    return {
+        'agent': agent_name,
+        'raw_analysis': analysis_content,
+        'findings': findings,
+        'completed_at': datetime.now().isoformat()
+    }
+
+def analyze_ballot_for_missing_ovals(image_path, job_id, encoded_image=None):
+    """Agent 1: Analyze ballot image for missing ovals using OpenAI GPT-4o with vision"""
+    agent_name = 'missing_ovals'
+    
+    try:
+        with job_timelines.stage(job_id, 'build_messages', track=agent_name):
+            encoded_image = prepare_agent_image(agent_name, image_path, job_id, encoded_image)
+            messages = build_agent_messages(agent_name, job_id, encoded_image)
+        analysis_content, timing = request_agent_analysis(agent_name, messages, job_id)
+        agent_results = build_agent_results(agent_name, analysis_content, job_id)
+        agent_results['timing'] = timing
+        return agent_results
 
     except Exception as e:
         log_openai_session(job_id, 'error', {
@@ -669,135 +5849,319 @@ def analyze_ballot_for_missing_ovals(image_path, job_id):
         })
         raise e
 
-def analyze_ballot_for_spelling(image_path, contest_data, job_id):
+def analyze_ballot_for_spelling(image_path, contest_data, job_id, encoded_image=None):
     """Agent 2: Analyze ballot image for spelling errors in candidate names using OpenAI GPT-4o with vision"""
     agent_name = 'spelling'
     
     try:
-        # Encode the image
-        base64_image = encode_image(image_path)
-        
-        # Log image encoding completion
-        log_openai_session(job_id, 'metadata', {
-            'action': 'agent_spelling_image_encoded',
-            'base64_length': len(base64_image),
-            'agent': agent_name
+        with job_timelines.stage(job_id, 'build_messages', track=agent_name):
+            encoded_image = prepare_agent_image(agent_name, image_path, job_id, encoded_image)
+            messages = build_agent_messages(agent_name, job_id, encoded_image, contest_data)
+        analysis_content, timing = request_agent_analysis(agent_name, messages, job_id)
+        agent_results = build_agent_results(agent_name, analysis_content, job_id)
+        agent_results['timing'] = timing
+        return agent_results
+
+    except Exception as e:
+        log_openai_session(job_id, 'error', {
+            'action': 'agent_spelling_failed',
+            'error_message': str(e),
+            'error_type': type(e).__name__
+        })
+        raise e
+
+async def analyze_agent_async(agent_name, image_path, job_id, priority, encoded_image, contest_data=None):
+    """
+    Either agent as a coroutine for the asyncio engine; building the messages and
+    parsing run on the engine's executor
+
+    Returns:
+        The agent's results, as analyze_ballot_for_missing_ovals/analyze_ballot_for_spelling
+    """
+    def build_messages():
+        encoded = prepare_agent_image(agent_name, image_path, job_id, encoded_image,
+                                      update_status=job_updates.update_agent_status)
+        return build_agent_messages(agent_name, job_id, encoded, contest_data if agent_name == 'spelling' else None)
+
+    try:
+        with job_timelines.stage(job_id, 'build_messages', track=agent_name):
+            messages = await asyncio.to_thread(build_messages)
+        analysis_content, timing = await request_agent_analysis_async(agent_name, messages, job_id, priority)
+        agent_results = await asyncio.to_thread(build_agent_results, agent_name, analysis_content, job_id)
+        agent_results['timing'] = timing
+        return agent_results
+
+    except Exception as e:
+        job_updates.call(log_openai_session, job_id, 'error', {
+            'action': f'agent_{agent_name}_failed',
+            'error_message': str(e),
+            'error_type': type(e).__name__
         })
+        raise
+
+ColumnTile = namedtuple('ColumnTile', ['column', 'box', 'encoded_image'])
+
+AGENT_ISSUE_KEYS = {
+    'missing_ovals': ('missing_ovals', 'missing oval', ('candidate', 'contest')),
+    'spelling': ('spelling_errors', 'spelling error', ('candidate_found', 'candidate_expected', 'contest'))
+}
+
+def get_job_column_tiles(image_path, job_id):
+    """Detect the ballot's columns and encode one cropped image per column"""
+    options = image_preprocess_options() or {
+        'mode': 'none',
+        'trim_margins': False,
+        'fit_tiles': False,
+        'tile_slack': app.config['IMAGE_TILE_SLACK'],
+        'bilevel_threshold': app.config['IMAGE_BILEVEL_THRESHOLD']
+    }
+    with job_timelines.stage(job_id, 'detect_columns'):
+        boxes = detect_ballot_columns(image_path,
+                                      threshold=options['bilevel_threshold'],
+                                      max_columns=app.config['BALLOT_MAX_COLUMNS'],
+                                      overlap=app.config['COLUMN_TILE_OVERLAP'])
+    log_openai_session(job_id, 'metadata', {
+        'action': 'columns_detected',
+        'column_count': len(boxes),
+        'boxes': [list(box) for box in boxes]
+    })
+    if len(boxes) < 2:
+        return []
+
+    file_id = job_store.get_job(job_id).get('image_file_id')
+    sha256 = (job_store.get_upload(file_id) or {}).get('sha256')
+    tiles = []
+    with job_timelines.stage(job_id, 'encode_column_tiles', columns=len(boxes)):
+        for column, box in enumerate(boxes, start=1):
+            encoded_image, _ = image_cache.get(image_path, file_id=file_id, sha256=sha256,
+                                               preprocess=dict(options, crop_box=list(box)))
+            tiles.append(ColumnTile(column, list(box), encoded_image))
+
+    update_job(job_id, column_tiles=[
+        {'column': tile.column, 'box': tile.box, 'preprocessing': tile.encoded_image.preprocessing}
+        for tile in tiles
+    ])
+    return tiles
+
+def run_column_tile(job_id, agent_name, tile, column_count, contest_data):
+    """Run one agent on one column crop and tag its findings with the column's position"""
+    started = time.perf_counter()
+    track = f'{agent_name} column {tile.column}'
+    messages = build_agent_messages(agent_name, job_id, tile.encoded_image, contest_data,
+                                    column=(tile.column, column_count))
+    with job_timelines.stage(job_id, 'openai_request', track=track):
+        response, scheduling = create_agent_completion(agent_name, messages, job_id, track=track)
+    analysis_content = response.choices[0].message.content
+    with job_timelines.stage(job_id, 'parse_results', track=track):
+        findings = parse_structured_results(analysis_content, agent_name, job_id)
+    parse_outcomes.inc(agent=agent_name, method=findings.get('parsing_method', 'unknown'))
+
+    issue_key = AGENT_ISSUE_KEYS[agent_name][0]
+    for issue in (findings.get(issue_key) or []) + findings.get('other_issues', []):
+        issue['column'] = tile.column
+        issue['column_box'] = tile.box
+
+    usage = response.usage
+    preprocessing = tile.encoded_image.preprocessing or {}
+    return {
+        'column': tile.column,
+        'box': tile.box,
+        'raw_analysis': analysis_content,
+        'findings': findings,
+        'seconds': round(time.perf_counter() - started, 3),
+        'scheduler_wait_seconds': scheduling['scheduler_wait_seconds'],
+        'retries': scheduling['retries'],
+        'prompt_tokens': usage.prompt_tokens if usage else None,
+        'cached_tokens': token_usage(usage.model_dump())['cached_tokens'] if usage else None,
+        'completion_tokens': usage.completion_tokens if usage else None,
+        'estimated_image_tokens': preprocessing.get('estimated_tokens_after')
+    }
+
+def merge_column_results(agent_name, tile_results, tile_errors):
+    """
+    Merge one agent's per-column findings back into a single findings structure
+
+    Findings reported twice because they sit in the overlap between two columns
+    are kept once, from the leftmost column.
+    """
+    issue_key, issue_label, identity_fields = AGENT_ISSUE_KEYS[agent_name]
+    tile_results = sorted(tile_results, key=lambda result: result['column'])
+
+    def dedupe(issues, fields):
+        seen = set()
+        unique = []
+        for issue in issues:
+            identity = tuple(str(issue.get(field, '')).strip().lower() for field in fields)
+            if identity in seen:
+                continue
+            seen.add(identity)
+            unique.append(issue)
+        return unique
+
+    issues = dedupe([issue for result in tile_results for issue in result['findings'].get(issue_key) or []],
+                    identity_fields)
+    other_issues = dedupe([issue for result in tile_results for issue in result['findings'].get('other_issues', [])],
+                          ('description',))
+    parsing_methods = {result['findings'].get('parsing_method') for result in tile_results}
+    column_count = len(tile_results) + len(tile_errors)
+
+    findings = {
+        'summary': '',
+        'total_issues': len(issues) + len(other_issues),
+        'confidence_summary': '',
+        'detailed_analysis': '',
+        'analysis_status': 'completed' if issues or other_issues else 'no_issues_found',
+        'parsing_method': 'fallback' if 'fallback' in parsing_methods else 'column_tiles',
+        issue_key: issues,
+        'other_issues': other_issues,
+        'column_summaries': [
+            {'column': result['column'], 'summary': result['findings'].get('summary', '')}
+            for result in tile_results
+        ],
+        'sections': {
+            'general_observations': [],
+            'specific_findings': [],
+            'recommendations': []
+        }
+    }
+    if findings['total_issues'] == 0:
+        findings['summary'] = f'No issues detected in any of the {column_count} columns.'
+        findings['confidence_summary'] = 'Analysis completed successfully with no concerns found.'
+    else:
+        findings['summary'] = (f"Found {len(issues)} {issue_label}{'s' if len(issues) != 1 else ''} and "
+                               f"{len(other_issues)} other issue{'s' if len(other_issues) != 1 else ''} "
+                               f"across {column_count} columns.")
+        high_confidence = sum(1 for issue in issues if issue.get('confidence') == 'high')
+        findings['confidence_summary'] = (
+            f"{high_confidence} high-confidence finding{'s' if high_confidence != 1 else ''}"
+            if high_confidence else 'Mixed confidence levels in findings')
+    if tile_errors:
+        failed = ', '.join(str(column) for column in sorted(tile_errors))
+        findings['summary'] += f" Column{'s' if len(tile_errors) != 1 else ''} {failed} could not be analyzed."
+
+    raw_analysis = '\n\n'.join(
+        f"=== Column {result['column']} ===\n{result['raw_analysis']}" for result in tile_results)
+    findings['detailed_analysis'] = raw_analysis
+
+    results = {
+        'agent': agent_name,
+        'raw_analysis': raw_analysis,
+        'findings': findings,
+        'tiles': [
+            {key: value for key, value in result.items() if key not in ('raw_analysis', 'findings')}
+            for result in tile_results
+        ],
+        'completed_at': datetime.now().isoformat()
+    }
+    if tile_errors:
+        results['tile_errors'] = {str(column): error for column, error in tile_errors.items()}
+    return results
+
+def analyze_ballot_columns(image_path, job_id, contest_data, agent_names):
+    """
+    Run the agents on each column of the ballot in parallel and merge their findings
+
+    Returns:
+        Tuple of (agent_results, agent_errors), or None when the ballot has no
+        detectable column structure and should be analyzed as a whole page
+    """
+    tiles = get_job_column_tiles(image_path, job_id)
+    if not tiles:
+        log_openai_session(job_id, 'metadata', {'action': 'column_tiling_skipped', 'reason': 'single column'})
+        return None
+
+    for agent_name in agent_names:
+        log_openai_session(job_id, 'metadata', {'action': f'starting_agent_{agent_name}', 'columns': len(tiles)})
+        update_agent_status(job_id, agent_name,
+                            status='running',
+                            progress=10,
+                            started_at=datetime.now().isoformat())
 
-        # Format contest data for the prompt
-        contest_text = ""
-        if contest_data and 'raw_text' in contest_data:
-            contest_text = contest_data['raw_text']
-        elif contest_data and 'parsed_data' in contest_data:
-            # Reconstruct text from parsed data
-            contests = contest_data['parsed_data'].get('contests', [])
-            text_parts = []
-            for contest in contests:
-                title = contest['title']
-                if contest['vote_for'] > 1:
-                    title += f" ({contest['vote_for']})"
-                text_parts.append(title)
-                for candidate in contest['candidates']:
-                    text_parts.append(f"  {candidate}")
-                if contest['reporting_units']:
-                    text_parts.append(f"  Reporting Units: {contest['reporting_units']}")
-                text_parts.append("")  # Empty line between contests
-            contest_text = "\n".join(text_parts)
-
-        # Load the prompt for this agent and format with contest data
+    # Every (agent, column) pair is an independent request
+    futures = {
+        agent_executor.submit(run_column_tile, job_id, agent_name, tile, len(tiles), contest_data): (agent_name, tile)
+        for agent_name in agent_names
+        for tile in tiles
+    }
+    tile_results = {agent_name: [] for agent_name in agent_names}
+    tile_errors = {agent_name: {} for agent_name in agent_names}
+    finished = 0
+    for future in as_completed(futures):
+        agent_name, tile = futures[future]
         try:
-            prompt = load_agent_prompt(agent_name, contest_text=contest_text)
-            log_openai_session(job_id, 'metadata', {
-                'action': 'prompt_loaded',
-                'agent': agent_name,
-                'prompt_file': AGENT_PROMPTS[agent_name]
-            })
-        except (FileNotFoundError, KeyError) as e:
+            tile_results[agent_name].append(future.result())
+        except Exception as e:
             log_openai_session(job_id, 'error', {
-                'action': 'prompt_load_failed',
-                'agent': agent_name,
-                'error': str(e)
+                'action': f'agent_{agent_name}_column_failed',
+                'column': tile.column,
+                'error_message': str(e),
+                'error_type': type(e).__name__
             })
-            raise e
-
-        messages = [
-            {
-                "role": "user",
-                "content": [
-                    {"type": "text", "text": prompt},
-                    {
-                        "type": "image_url",
-                        "image_url": {
-                            "url": f"data:image/png;base64,{base64_image}",
-                            "detail": "high"
-                        }
-                    }
-                ]
-            }
-        ]
-
-        # Log the request (with image data redacted)
-        log_openai_request(
-            job_id=job_id,
-            model="gpt-4o",
-            messages=messages,
-            max_tokens=1500,
-            temperature=0.1
-        )
+            tile_errors[agent_name][tile.column] = str(e)
 
-        # Call OpenAI API
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=messages,
-            max_tokens=1500,
-            temperature=0.1  # Low temperature for consistent analysis
-        )
+        finished += 1
+        agent_finished = len(tile_results[agent_name]) + len(tile_errors[agent_name])
+        update_agent_status(job_id, agent_name, progress=10 + int(80 * agent_finished / len(tiles)))
+        update_job(job_id,
+                   progress=10 + int(80 * finished / len(futures)),
+                   message=f'Analyzed {finished} of {len(futures)} column tiles...')
 
-        # Log the response
-        log_openai_response(job_id, response)
+    agent_results = {}
+    agent_errors = {}
+    for agent_name in agent_names:
+        if not tile_results[agent_name]:
+            agent_errors[agent_name] = 'All columns failed: ' + '; '.join(
+                f'column {column}: {error}' for column, error in sorted(tile_errors[agent_name].items()))
+            update_agent_status(job_id, agent_name,
+                                status='error',
+                                progress=100,
+                                error=agent_errors[agent_name],
+                                completed_at=datetime.now().isoformat())
+            continue
 
-        # Extract the analysis content
-        analysis_content = response.choices[0].message.content
-        
-        # Parse the response to extract structured findings
-        findings = parse_structured_results(analysis_content, agent_name, job_id)
-        
-        # Log the parsed findings
+        agent_results[agent_name] = merge_column_results(agent_name, tile_results[agent_name], tile_errors[agent_name])
+        findings = agent_results[agent_name]['findings']
         log_openai_session(job_id, 'metadata', {
-            'action': 'agent_spelling_parsed',
-            'findings_summary': {
-                'spelling_errors_count': len(findings.get('spelling_errors', [])),
-                'other_issues_count': len(findings.get('other_issues', [])),
-                'total_issues': findings.get('total_issues', 0),
-                'analysis_status': findings.get('analysis_status', 'completed'),
-                'parsing_method': findings.get('parsing_method', 'unknown')
-            }
+            'action': f'agent_{agent_name}_columns_merged',
+            'columns': len(tiles),
+            'failed_columns': sorted(tile_errors[agent_name]),
+            'total_issues': findings['total_issues'],
+            'tiles': agent_results[agent_name]['tiles']
         })
-        
-        return {
-            'agent': agent_name,
-            'raw_analysis': analysis_content,
-            'findings': findings,
-            'completed_at': datetime.now().isoformat()
-        }
+        update_agent_status(job_id, agent_name,
+                            status='completed',
+                            progress=100,
+                            results=agent_results[agent_name],
+                            completed_at=datetime.now().isoformat())
 
-    except Exception as e:
-        log_openai_session(job_id, 'error', {
-            'action': 'agent_spelling_failed',
-            'error_message': str(e),
-            'error_type': type(e).__name__
-        })
-        raise e
+    update_job(job_id, message='Combining analysis results...')
+    return agent_results, agent_errors
 
 def parse_spelling_results_legacy(analysis_text):
     """Parse OpenAI spelling analysis results into structured format"""
+    return parse_legacy_findings(AgentResponse(analysis_text), 'spelling')
+
+def parse_legacy_findings(response, agent_name):
+    """
+    Keyword-based parse of a free-text agent answer, in a single pass over its lines
+
+    Args:
+        response: AgentResponse to parse
+        agent_name: Key into LEGACY_PARSE_RULES
+
+    Returns:
+        Findings dict in the same shape as the structured parser produces
+    """
+    rules = LEGACY_PARSE_RULES[agent_name]
+    finding_key = rules['finding_key']
+    finding_pattern = rules['finding_pattern']
     findings = {
-        'spelling_errors': [],
+        finding_key: [],
         'other_issues': [],
         'summary': '',
         'total_issues': 0,
         'confidence_summary': '',
-        'detailed_analysis': analysis_text,
+        'detailed_analysis': response.text,
         'sections': {
             'general_observations': [],
             'specific_findings': [],
@@ -805,81 +6169,62 @@ def parse_spelling_results_legacy(analysis_text):
         }
     }
     
-    # Split the text into lines for parsing
-    lines = analysis_text.split('\n')
     current_section = None
-    
-    # Keywords for different types of issues
-    spelling_keywords = ['misspell', 'spelling', 'typo', 'incorrect', 'wrong name', 'name error', 'discrepancy']
-    confidence_keywords = ['confidence:', 'confidence level:', 'high confidence', 'medium confidence', 'low confidence']
-    
-    for i, line in enumerate(lines):
+    lowered = response.lowered
+    for i, line in enumerate(response.lines):
         line = line.strip()
         if not line:
             continue
+        line_lower = lowered[i].strip()
         
         # Detect sections
-        if any(header in line.lower() for header in ['general observation', 'overall', 'summary']):
-            current_section = 'general_observations'
-            continue
-        elif any(header in line.lower() for header in ['specific finding', 'findings', 'issues found']):
-            current_section = 'specific_findings'
-            continue
-        elif any(header in line.lower() for header in ['recommendation', 'suggest', 'next steps']):
-            current_section = 'recommendations'
+        header = next((section for section, pattern in SECTION_HEADER_PATTERNS if pattern.search(line_lower)), None)
+        if header:
+            current_section = header
             continue
         
-        # Parse spelling errors specifically
-        line_lower = line.lower()
-        if any(keyword in line_lower for keyword in spelling_keywords):
-            # Extract candidate/contest info
-            candidate_name = extract_candidate_name(line)
-            contest_name = extract_contest_name(line, lines, i)
-            confidence = extract_confidence(line)
-            
-            spelling_error = {
-                'description': clean_markdown(line),
-                'candidate': candidate_name,
-                'contest': contest_name,
-                'confidence': confidence,
+        cleaned = clean_markdown(line)
+        if finding_pattern.search(line_lower):
+            findings[finding_key].append({
+                'description': cleaned,
+                'candidate': extract_candidate_name(line, line_lower),
+                'contest': response.contest_near(i),
+                'confidence': extract_confidence(line, line_lower),
                 'raw_text': line
-            }
-            findings['spelling_errors'].append(spelling_error)
-        
-        # Categorize other issues
-        elif any(keyword in line_lower for keyword in ['issue', 'problem', 'error', 'anomaly', 'concern']):
-            if not any(keyword in line_lower for keyword in spelling_keywords):  # Avoid double-counting
-                other_issue = {
-                    'description': clean_markdown(line),
-                    'type': classify_issue_type(line),
-                    'severity': extract_severity(line),
-                    'raw_text': line
-                }
-                findings['other_issues'].append(other_issue)
+            })
+        elif rules['skip_confidence_lines'] and CONFIDENCE_LINE_PATTERN.search(line_lower):
+            pass
+        elif ISSUE_PATTERN.search(line_lower):
+            findings['other_issues'].append({
+                'description': cleaned,
+                'type': classify_issue_type(line, line_lower),
+                'severity': extract_severity(line, line_lower),
+                'raw_text': line
+            })
         
         # Add to appropriate section
-        if current_section and line:
-            findings['sections'][current_section].append(clean_markdown(line))
+        if current_section:
+            findings['sections'][current_section].append(cleaned)
     
     # Generate summary
-    spelling_count = len(findings['spelling_errors'])
+    finding_count = len(findings[finding_key])
     other_count = len(findings['other_issues'])
-    findings['total_issues'] = spelling_count + other_count
+    findings['total_issues'] = finding_count + other_count
     
-    if spelling_count == 0 and other_count == 0:
-        findings['summary'] = 'No spelling errors detected. All candidate names appear to match the official list.'
-        findings['confidence_summary'] = 'Spelling analysis completed successfully with no concerns found.'
+    if finding_count == 0 and other_count == 0:
+        findings['summary'] = rules['clean_summary']
+        findings['confidence_summary'] = rules['clean_confidence_summary']
     else:
         parts = []
-        if spelling_count > 0:
-            parts.append(f"{spelling_count} spelling error{'s' if spelling_count != 1 else ''}")
+        if finding_count > 0:
+            parts.append(f"{finding_count} {rules['finding_label']}{'s' if finding_count != 1 else ''}")
         if other_count > 0:
             parts.append(f"{other_count} other issue{'s' if other_count != 1 else ''}")
         
         findings['summary'] = f"Found {' and '.join(parts)} that require attention."
         
         # Count confidence levels
-        high_confidence = sum(1 for error in findings['spelling_errors'] if error.get('confidence') == 'high')
+        high_confidence = sum(1 for finding in findings[finding_key] if finding.get('confidence') == 'high')
         if high_confidence > 0:
             findings['confidence_summary'] = f"{high_confidence} high-confidence finding{'s' if high_confidence != 1 else ''}"
         else:
@@ -905,137 +6250,45 @@ def combine_agent_results(missing_ovals_results, spelling_results):
         'completed_at': datetime.now().isoformat()
     }
     
-    # Calculate total issues
-    oval_count = len(combined['issues_by_type']['missing_ovals'])
-    spelling_count = len(combined['issues_by_type']['spelling_errors'])
-    other_count = len(combined['issues_by_type']['other_issues'])
-    combined['total_issues'] = oval_count + spelling_count + other_count
-    
-    # Generate combined summary
-    if combined['total_issues'] == 0:
-        combined['summary'] = 'No issues detected. Ballot appears ready for printing.'
-        combined['confidence_summary'] = 'Both visual and spelling analyses completed successfully with no concerns found.'
-    else:
-        issue_parts = []
-        if oval_count > 0:
-            issue_parts.append(f"{oval_count} missing oval{'s' if oval_count != 1 else ''}")
-        if spelling_count > 0:
-            issue_parts.append(f"{spelling_count} spelling error{'s' if spelling_count != 1 else ''}")
-        if other_count > 0:
-            issue_parts.append(f"{other_count} other issue{'s' if other_count != 1 else ''}")
-        
-        combined['summary'] = f"Found {', '.join(issue_parts)} requiring attention before printing."
-        
-        # Combine confidence summaries
-        oval_conf = missing_ovals_results['findings'].get('confidence_summary', '')
-        spell_conf = spelling_results['findings'].get('confidence_summary', '')
-        combined['confidence_summary'] = f"Missing ovals: {oval_conf}. Spelling: {spell_conf}"
-    
-    return combined
-
-def parse_analysis_results(analysis_text):
-    """Parse OpenAI analysis results into structured format with better organization"""
-    findings = {
-        'missing_ovals': [],
-        'other_issues': [],
-        'summary': '',
-        'total_issues': 0,
-        'confidence_summary': '',
-        'detailed_analysis': analysis_text,
-        'sections': {
-            'general_observations': [],
-            'specific_findings': [],
-            'recommendations': []
-        }
-    }
-    
-    # Split the text into lines for parsing
-    lines = analysis_text.split('\n')
-    current_section = None
-    current_item = None
-    
-    # Keywords for different types of issues
-    missing_oval_keywords = ['missing oval', 'no oval', 'oval missing', 'without oval', 'lacks oval']
-    confidence_keywords = ['confidence:', 'confidence level:', 'high confidence', 'medium confidence', 'low confidence']
-    
-    for i, line in enumerate(lines):
-        line = line.strip()
-        if not line:
-            continue
-        
-        # Detect sections
-        if any(header in line.lower() for header in ['general observation', 'overall', 'summary']):
-            current_section = 'general_observations'
-            continue
-        elif any(header in line.lower() for header in ['specific finding', 'findings', 'issues found']):
-            current_section = 'specific_findings'
-            continue
-        elif any(header in line.lower() for header in ['recommendation', 'suggest', 'next steps']):
-            current_section = 'recommendations'
-            continue
-        
-        # Parse missing ovals specifically
-        line_lower = line.lower()
-        if any(keyword in line_lower for keyword in missing_oval_keywords):
-            # Extract candidate/contest info
-            candidate_name = extract_candidate_name(line)
-            contest_name = extract_contest_name(line, lines, i)
-            confidence = extract_confidence(line)
-            
-            missing_oval = {
-                'description': clean_markdown(line),
-                'candidate': candidate_name,
-                'contest': contest_name,
-                'confidence': confidence,
-                'raw_text': line
-            }
-            findings['missing_ovals'].append(missing_oval)
-        
-        # Check for confidence levels
-        elif any(keyword in line_lower for keyword in confidence_keywords):
-            confidence_info = extract_confidence_info(line)
-            if current_item:
-                current_item['confidence_details'] = confidence_info
-        
-        # Categorize other issues
-        elif any(keyword in line_lower for keyword in ['issue', 'problem', 'error', 'anomaly', 'concern']):
-            other_issue = {
-                'description': clean_markdown(line),
-                'type': classify_issue_type(line),
-                'severity': extract_severity(line),
-                'raw_text': line
-            }
-            findings['other_issues'].append(other_issue)
-        
-        # Add to appropriate section
-        if current_section and line:
-            findings['sections'][current_section].append(clean_markdown(line))
+    # Calculate total issues
+    oval_count = len(combined['issues_by_type']['missing_ovals'])
+    spelling_count = len(combined['issues_by_type']['spelling_errors'])
+    other_count = len(combined['issues_by_type']['other_issues'])
+    combined['total_issues'] = oval_count + spelling_count + other_count
     
-    # Generate improved summary
-    missing_count = len(findings['missing_ovals'])
-    other_count = len(findings['other_issues'])
-    findings['total_issues'] = missing_count + other_count
+    # Agents that failed contribute no findings, so a clean result is only partial
+    combined['failed_agents'] = [
+        results['agent'] for results in (missing_ovals_results, spelling_results) if results.get('error')
+    ]
     
-    if missing_count == 0 and other_count == 0:
-        findings['summary'] = 'No issues detected. All candidates and choices appear to have proper voting ovals.'
-        findings['confidence_summary'] = 'Analysis completed successfully with no concerns found.'
+    # Generate combined summary
+    if combined['total_issues'] == 0 and combined['failed_agents']:
+        combined['summary'] = f"No issues detected by the completed agents, but the {', '.join(combined['failed_agents'])} agent failed. Please re-run the analysis."
+        combined['confidence_summary'] = 'Partial analysis only.'
+    elif combined['total_issues'] == 0:
+        combined['summary'] = 'No issues detected. Ballot appears ready for printing.'
+        combined['confidence_summary'] = 'Both visual and spelling analyses completed successfully with no concerns found.'
     else:
-        parts = []
-        if missing_count > 0:
-            parts.append(f"{missing_count} missing oval{'s' if missing_count != 1 else ''}")
+        issue_parts = []
+        if oval_count > 0:
+            issue_parts.append(f"{oval_count} missing oval{'s' if oval_count != 1 else ''}")
+        if spelling_count > 0:
+            issue_parts.append(f"{spelling_count} spelling error{'s' if spelling_count != 1 else ''}")
         if other_count > 0:
-            parts.append(f"{other_count} other issue{'s' if other_count != 1 else ''}")
+            issue_parts.append(f"{other_count} other issue{'s' if other_count != 1 else ''}")
         
-        findings['summary'] = f"Found {' and '.join(parts)} that require attention."
+        combined['summary'] = f"Found {', '.join(issue_parts)} requiring attention before printing."
         
-        # Count confidence levels
-        high_confidence = sum(1 for oval in findings['missing_ovals'] if oval.get('confidence') == 'high')
-        if high_confidence > 0:
-            findings['confidence_summary'] = f"{high_confidence} high-confidence finding{'s' if high_confidence != 1 else ''}"
-        else:
-            findings['confidence_summary'] = "Mixed confidence levels in findings"
+        # Combine confidence summaries
+        oval_conf = missing_ovals_results['findings'].get('confidence_summary', '')
+        spell_conf = spelling_results['findings'].get('confidence_summary', '')
+        combined['confidence_summary'] = f"Missing ovals: {oval_conf}. Spelling: {spell_conf}"
     
-    return findings
+    return combined
+
+def parse_analysis_results(analysis_text):
+    """Parse OpenAI analysis results into structured format with better organization"""
+    return parse_legacy_findings(AgentResponse(analysis_text), 'missing_ovals')
 
 def clean_markdown(text):
     """Remove markdown formatting for cleaner display"""
@@ -1046,10 +6299,11 @@ def clean_markdown(text):
     text = text.replace('#', '')   # Remove header markers
     return text.strip()
 
-def extract_candidate_name(text):
-    """Extract candidate name from analysis text"""
+def extract_candidate_name(text, text_lower=None):
+    """Extract candidate name from analysis text (text_lower: text.lower(), if already computed)"""
     # Look for common patterns where candidate names appear
-    text_lower = text.lower()
+    if text_lower is None:
+        text_lower = text.lower()
     
     # Pattern: "for [candidate name]" or "candidate [name]"
     if 'for ' in text_lower:
@@ -1066,35 +6320,16 @@ def extract_candidate_name(text):
     
     return None
 
-def extract_contest_name(text, all_lines, current_index):
-    """Extract contest name by looking at context around the line"""
-    # Look in nearby lines for contest context
-    context_range = 3
-    start_idx = max(0, current_index - context_range)
-    end_idx = min(len(all_lines), current_index + context_range + 1)
-    
-    contest_keywords = ['contest', 'race', 'election', 'office', 'position']
-    
-    for i in range(start_idx, end_idx):
-        line = all_lines[i].lower()
-        if any(keyword in line for keyword in contest_keywords):
-            # Extract the contest name
-            for keyword in contest_keywords:
-                if keyword in line:
-                    parts = all_lines[i].split(keyword)
-                    if len(parts) > 1:
-                        return parts[1].strip('.,: ').split(' ')[0:5]  # Take first few words
-    
-    return None
-
-def extract_confidence(text):
+def extract_confidence(text, text_lower=None):
     """Extract confidence level from text"""
-    text_lower = text.lower()
-    if 'high confidence' in text_lower or 'high' in text_lower:
+    if text_lower is None:
+        text_lower = text.lower()
+    # "high confidence" and friends are covered by the bare words
+    if 'high' in text_lower:
         return 'high'
-    elif 'medium confidence' in text_lower or 'medium' in text_lower:
+    elif 'medium' in text_lower:
         return 'medium'
-    elif 'low confidence' in text_lower or 'low' in text_lower:
+    elif 'low' in text_lower:
         return 'low'
     return 'medium'  # Default
 
@@ -1102,32 +6337,463 @@ def extract_confidence_info(text):
     """Extract detailed confidence information"""
     return text.strip()
 
-def classify_issue_type(text):
+def classify_issue_type(text, text_lower=None):
     """Classify the type of issue found"""
-    text_lower = text.lower()
-    if any(word in text_lower for word in ['format', 'layout', 'alignment']):
-        return 'formatting'
-    elif any(word in text_lower for word in ['spelling', 'misspell', 'typo']):
-        return 'spelling'
-    elif any(word in text_lower for word in ['missing', 'absent', 'not found']):
-        return 'missing_content'
-    else:
-        return 'general'
+    if text_lower is None:
+        text_lower = text.lower()
+    for issue_type, pattern in ISSUE_TYPE_PATTERNS:
+        if pattern.search(text_lower):
+            return issue_type
+    return 'general'
 
-def extract_severity(text):
+def extract_severity(text, text_lower=None):
     """Extract severity level from issue description"""
-    text_lower = text.lower()
-    if any(word in text_lower for word in ['critical', 'severe', 'major']):
+    if text_lower is None:
+        text_lower = text.lower()
+    if HIGH_SEVERITY_PATTERN.search(text_lower):
         return 'high'
-    elif any(word in text_lower for word in ['minor', 'small', 'slight']):
+    elif LOW_SEVERITY_PATTERN.search(text_lower):
         return 'low'
     else:
         return 'medium'
 
+def store_uploaded_image(save_file, original_filename):
+    """
+    Save, validate and register an uploaded ballot image
+
+    Args:
+        save_file: Callable that writes the image bytes to the path it is given
+        original_filename: Filename as provided by the client
+
+    Returns:
+        The stored file info dict
+
+    Raises:
+        ValueError: If the file is not a valid image
+    """
+    # Generate unique filename
+    file_id = str(uuid.uuid4())
+    filename = secure_filename(f"{file_id}.png")
+    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    
+    # Save file
+    save_file(filepath)
+    
+    # Validate and get image info
+    try:
+        image_info = validate_and_resize_image(filepath)
+    except ValueError:
+        os.remove(filepath)  # Clean up invalid file
+        raise
+    
+    # Store file info
+    file_info = {
+        'file_id': file_id,
+        'original_filename': original_filename,
+        'filename': filename,
+        'filepath': filepath,
+        'uploaded_at': datetime.now().isoformat(),
+        'size': os.path.getsize(filepath),
+        'sha256': file_sha256(filepath),
+        'image_info': image_info
+    }
+    job_store.create_upload(file_info)
+    upload_count.inc()
+    upload_bytes.inc(file_info['size'])
+    return file_info
+
+def store_contest_data(contest_text):
+    """
+    Parse and register contest data
+
+    Raises:
+        ValueError: If the contest text or a contest's reporting units cannot be parsed
+    """
+    try:
+        parsed_data = parse_contest_text(contest_text)
+    except Exception as e:
+        raise ValueError(f'Failed to parse contest data: {str(e)}')
+    
+    data_id = str(uuid.uuid4())
+    contest_data = {
+        'data_id': data_id,
+        'raw_text': contest_text,
+        'parsed_data': parsed_data,
+        'uploaded_at': datetime.now().isoformat()
+    }
+    # Building the ballot style index checks every reporting unit line before the list is kept
+    try:
+        reporting_unit_index(contest_data)
+    except ValueError as e:
+        raise ValueError(f'Failed to parse contest data: {str(e)}')
+    job_store.create_contest_data(contest_data)
+    return contest_data
+
+EXECUTION_MODES = ('interactive', 'deferred')
+
+def create_analysis_job(image_file_id, contest_data_id, use_cache=True, batch_id=None,
+                        execution_mode='interactive', tiling='page', contest_selector=None):
+    """Register a queued analysis job and return it (the caller hands it to the scheduler)"""
+    job_id = str(uuid.uuid4())
+    
+    analysis_job = {
+        'job_id': job_id,
+        'status': 'queued',
+        'image_file_id': image_file_id,
+        'contest_data_id': contest_data_id,
+        'created_at': datetime.now().isoformat(),
+        'progress': 0,
+        'message': 'Analysis queued for OpenAI processing...',
+        'use_cache': use_cache,
+        'execution_mode': execution_mode,
+        # Deferred requests are built per page; column tiling is interactive only
+        'tiling': 'page' if execution_mode == 'deferred' else tiling
+    }
+    if batch_id:
+        analysis_job['batch_id'] = batch_id
+    if contest_selector:
+        # Only the contests on this ballot style go to the spelling agent
+        analysis_job['contest_selector'] = contest_selector
+    
+    return job_store.create_job(analysis_job)
+
+class RetentionReaper:
+    """
+    Background clean-up of finished jobs, uploaded images, OpenAI session logs and
+    the result cache
+
+    Each resource has a TTL and a byte quota (0 disables either). Finished jobs go
+    first, oldest first, so the images they pointed at become unreferenced; only
+    unreferenced images are evicted, least recently used first. Session logs of
+    finished jobs are gzipped once they stop changing and deleted after their TTL
+    or when the log directory is over quota. Result cache entries unused for
+    their TTL are deleted, then least recently used ones until under quota.
+    """
+
+    def __init__(self, interval_seconds, job_ttl_hours, job_max_bytes, upload_ttl_hours, upload_max_bytes,
+                 log_ttl_hours, log_max_bytes, log_compress_hours, result_cache_ttl_hours=0,
+                 result_cache_max_bytes=0):
+        self.interval_seconds = interval_seconds
+        self.job_ttl_hours = job_ttl_hours
+        self.job_max_bytes = job_max_bytes
+        self.upload_ttl_hours = upload_ttl_hours
+        self.upload_max_bytes = upload_max_bytes
+        self.log_ttl_hours = log_ttl_hours
+        self.log_max_bytes = log_max_bytes
+        self.log_compress_hours = log_compress_hours
+        self.result_cache_ttl_hours = result_cache_ttl_hours
+        self.result_cache_max_bytes = result_cache_max_bytes
+        self._lock = threading.Lock()
+        self._run_lock = threading.Lock()
+        self._thread = None
+        self.runs = 0
+        self.last_run_at = None
+        self.last_run_seconds = None
+        self.last_error = None
+        self.reclaimed = {
+            resource: {'removed': 0, 'bytes_reclaimed': 0}
+            for resource in ('jobs', 'uploads', 'session_logs', 'result_cache', 'orphans')
+        }
+        self.compressed_logs = 0
+        self.compression_bytes_saved = 0
+
+    def start(self):
+        if self.interval_seconds > 0 and (self._thread is None or not self._thread.is_alive()):
+            self._thread = threading.Thread(target=self._run, daemon=True, name='retention-reaper')
+            self._thread.start()
+
+    def run_once(self):
+        """
+        Apply every retention rule once
+
+        Returns:
+            Dict of what this run removed, per resource
+        """
+        with self._run_lock:
+            started_at = time.time()
+            before = {resource: dict(counts) for resource, counts in self.reclaimed.items()}
+            try:
+                self._reap_jobs()
+                self._reap_uploads()
+                self._reap_session_logs()
+                self._reap_result_cache()
+                job_store.compact()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Retention reaper run failed: {e}")
+            with self._lock:
+                self.runs += 1
+                self.last_run_at = datetime.now().isoformat()
+                self.last_run_seconds = round(time.time() - started_at, 3)
+                return {
+                    resource: {key: counts[key] - before[resource][key] for key in counts}
+                    for resource, counts in self.reclaimed.items()
+                }
+
+    def stats(self):
+        usage = job_store.usage()
+        log_files, log_bytes = self._session_log_usage()
+        cache_entries = result_cache.entries()
+        with self._lock:
+            return {
+                'interval_seconds': self.interval_seconds,
+                'runs': self.runs,
+                'last_run_at': self.last_run_at,
+                'last_run_seconds': self.last_run_seconds,
+                'last_error': self.last_error,
+                'usage': {
+                    'jobs': {'count': usage['jobs'], 'bytes': usage['job_bytes'], 'max_bytes': self.job_max_bytes},
+                    'uploads': {'count': usage['uploads'], 'bytes': usage['upload_bytes'],
+                                'max_bytes': self.upload_max_bytes},
+                    'session_logs': {'count': log_files, 'bytes': log_bytes, 'max_bytes': self.log_max_bytes},
+                    'result_cache': {'count': len(cache_entries), 'bytes': sum(entry[1] for entry in cache_entries),
+                                     'max_bytes': self.result_cache_max_bytes},
+                    'database_bytes': usage['database_bytes']
+                },
+                'reclaimed': {resource: dict(counts) for resource, counts in self.reclaimed.items()},
+                'compressed_logs': self.compressed_logs,
+                'compression_bytes_saved': self.compression_bytes_saved
+            }
+
+    def _record(self, resource, count, size):
+        with self._lock:
+            self.reclaimed[resource]['removed'] += count
+            self.reclaimed[resource]['bytes_reclaimed'] += size
+
+    def _cutoff(self, hours):
+        return datetime.fromtimestamp(time.time() - hours * 3600).isoformat()
+
+    def _reap_jobs(self):
+        expired = job_store.finished_jobs(self._cutoff(self.job_ttl_hours)) if self.job_ttl_hours > 0 else []
+        doomed = {job['job_id']: job['bytes'] for job in expired}
+        if self.job_max_bytes > 0:
+            jobs = job_store.finished_jobs()
+            excess = job_store.usage()['job_bytes'] - sum(doomed.values()) - self.job_max_bytes
+            for job in jobs:
+                if excess <= 0:
+                    break
+                if job['job_id'] not in doomed:
+                    doomed[job['job_id']] = job['bytes']
+                    excess -= job['bytes']
+        for job_id in doomed:
+            job_store.delete_job(job_id)
+        if doomed:
+            self._record('jobs', len(doomed), sum(doomed.values()))
+        if self.job_ttl_hours > 0:
+            self._record('orphans', job_store.delete_orphans(self._cutoff(self.job_ttl_hours)), 0)
+
+    def _reap_uploads(self):
+        uploads = job_store.unreferenced_uploads()
+        cutoff = self._cutoff(self.upload_ttl_hours) if self.upload_ttl_hours > 0 else None
+        excess = job_store.usage()['upload_bytes'] - self.upload_max_bytes if self.upload_max_bytes > 0 else 0
+        for upload in uploads:
+            expired = cutoff is not None and (upload['last_used_at'] or '') < cutoff
+            if not expired and excess <= 0:
+                continue
+            job_store.delete_upload(upload['file_id'])
+            image_cache.invalidate(upload['file_id'])
+            size = upload['size'] or 0
+            try:
+                os.remove(upload['filepath'])
+            except FileNotFoundError:
+                size = 0
+            excess -= upload['size'] or 0
+            self._record('uploads', 1, size)
+
+    def _session_logs(self):
+        """(path, job_id, size, mtime) of every session log, oldest first"""
+        logs = []
+        for name in os.listdir(OPENAI_SESSIONS_DIR):
+            if not (name.endswith('.log') or name.endswith('.log.gz')):
+                continue
+            path = os.path.join(OPENAI_SESSIONS_DIR, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            logs.append((path, name.split('.log')[0], stat.st_size, stat.st_mtime))
+        logs.sort(key=lambda log: log[3])
+        return logs
+
+    def _session_log_usage(self):
+        logs = self._session_logs()
+        return len(logs), sum(log[2] for log in logs)
+
+    def _job_finished(self, job_id):
+        job = job_store.get_job(job_id)
+        return job is None or job['status'] in JOB_FINAL_STATUSES
+
+    def _reap_session_logs(self):
+        now = time.time()
+        remaining = []
+        for path, job_id, size, mtime in self._session_logs():
+            age_hours = (now - mtime) / 3600
+            if not self._job_finished(job_id):
+                remaining.append((path, size))
+                continue
+            if self.log_ttl_hours > 0 and age_hours > self.log_ttl_hours:
+                session_logger.release(job_id)
+                os.remove(path)
+                self._record('session_logs', 1, size)
+                continue
+            if self.log_compress_hours > 0 and age_hours > self.log_compress_hours and path.endswith('.log'):
+                session_logger.release(job_id)
+                path, size = self._compress(path, size)
+            remaining.append((path, size))
+
+        if self.log_max_bytes > 0:
+            excess = sum(size for _, size in remaining) - self.log_max_bytes
+            for path, size in remaining:
+                if excess <= 0:
+                    break
+                job_id = os.path.basename(path).split('.log')[0]
+                if not self._job_finished(job_id):
+                    continue
+                session_logger.release(job_id)
+                os.remove(path)
+                excess -= size
+                self._record('session_logs', 1, size)
+
+    def _reap_result_cache(self):
+        cutoff = time.time() - self.result_cache_ttl_hours * 3600 if self.result_cache_ttl_hours > 0 else None
+        entries = result_cache.entries()
+        excess = (sum(entry[1] for entry in entries) - self.result_cache_max_bytes
+                  if self.result_cache_max_bytes > 0 else 0)
+        for path, size, mtime in entries:
+            expired = cutoff is not None and mtime < cutoff
+            if not expired and excess <= 0:
+                break
+            excess -= size
+            self._record('result_cache', 1, result_cache.remove(path))
+
+    def _compress(self, path, size):
+        """Gzip a finished job's log, appending to an earlier archive of the same log"""
+        archived_size = os.path.getsize(path + '.gz') if os.path.exists(path + '.gz') else 0
+        with open(path, 'rb') as src, open(path + '.gz', 'ab') as dst:
+            with gzip.GzipFile(fileobj=dst, mode='wb') as archive:
+                shutil.copyfileobj(src, archive)
+        os.remove(path)
+        compressed_size = os.path.getsize(path + '.gz')
+        with self._lock:
+            self.compressed_logs += 1
+            self.compression_bytes_saved += max(size - (compressed_size - archived_size), 0)
+        return path + '.gz', compressed_size
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval_seconds)
+            self.run_once()
+
+retention_reaper = RetentionReaper(
+    interval_seconds=app.config['RETENTION_INTERVAL_SECONDS'],
+    job_ttl_hours=app.config['JOB_TTL_HOURS'],
+    job_max_bytes=app.config['JOB_MAX_BYTES'],
+    upload_ttl_hours=app.config['UPLOAD_TTL_HOURS'],
+    upload_max_bytes=app.config['UPLOAD_MAX_BYTES'],
+    log_ttl_hours=app.config['SESSION_LOG_TTL_HOURS'],
+    log_max_bytes=app.config['SESSION_LOG_MAX_BYTES'],
+    log_compress_hours=app.config['SESSION_LOG_COMPRESS_HOURS'],
+    result_cache_ttl_hours=app.config['RESULT_CACHE_TTL_HOURS'],
+    result_cache_max_bytes=app.config['RESULT_CACHE_MAX_BYTES']
+)
+retention_reaper.start()
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
-    return jsonify({'status': 'healthy', 'timestamp': datetime.now().isoformat()})
+    return jsonify({
+        'status': 'healthy',
+        'timestamp': datetime.now().isoformat(),
+        'job_queue': job_scheduler.stats(),
+        'deferred_batches': deferred_batches.stats(),
+        'image_cache': image_cache.stats(),
+        'job_store': job_store.stats(),
+        'session_logger': session_logger.stats(),
+        'job_updates': job_updates.stats(),
+        'openai_scheduler': openai_scheduler.stats()
+    })
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Operational metrics in the Prometheus text exposition format"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/retention/stats', methods=['GET'])
+def retention_stats():
+    """Current storage usage and what the retention reaper has reclaimed so far"""
+    return jsonify(retention_reaper.stats())
+
+@app.route('/api/retention/run', methods=['POST'])
+def run_retention():
+    """Apply the retention rules now instead of waiting for the next scheduled run"""
+    reclaimed = retention_reaper.run_once()
+    return jsonify({'reclaimed': reclaimed, 'stats': retention_reaper.stats()})
+
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    """Hit/miss statistics for the result and encoded-image caches"""
+    return jsonify({
+        'result_cache': result_cache.stats(),
+        'image_cache': image_cache.stats()
+    })
+
+def build_output_format_report():
+    """
+    Token cost of each agent in the json_schema output format against the YAML prompts
+
+    Prompt sizes are estimated from the prompt files and leave out the image and
+    contest text, which both formats send. The schema sent with json_schema
+    requests is counted as compact JSON, an upper bound on what the API bills
+    for it. Observed figures are mean billed tokens per successful request
+    since this process started, for each format that has run.
+    """
+    request_counts = {}
+    for _, (agent_name, _mode, outcome, output_format), _, value in openai_requests.samples():
+        if outcome == 'success':
+            request_counts[(agent_name, output_format)] = request_counts.get((agent_name, output_format), 0) + value
+    token_totals = {key: value for _, key, _, value in openai_tokens.samples()}
+
+    report = {'output_format': app.config['AGENT_OUTPUT_FORMAT'], 'agents': {}}
+    for agent_name in AGENT_PROMPTS:
+        estimated = {}
+        observed = {}
+        for output_format in OUTPUT_FORMATS:
+            params = agent_request_params(agent_name, output_format)
+            schema = params.get('response_format')
+            estimated[output_format] = {
+                'prompt_tokens': estimate_tokens(load_agent_prompt(agent_name, output_format)),
+                'schema_tokens': estimate_tokens(json.dumps(schema, separators=(',', ':'))) if schema else 0,
+                'max_completion_tokens': params['max_tokens']
+            }
+
+            count = request_counts.get((agent_name, output_format))
+            if count:
+                observed[output_format] = {
+                    'requests': count,
+                    'mean_prompt_tokens': round(token_totals.get((agent_name, 'prompt', output_format), 0) / count, 1),
+                    'mean_completion_tokens': round(token_totals.get((agent_name, 'completion', output_format), 0) / count, 1)
+                }
+
+        input_tokens = {output_format: estimate['prompt_tokens'] + estimate['schema_tokens']
+                        for output_format, estimate in estimated.items()}
+        entry = {
+            'estimated': estimated,
+            'estimated_input_tokens_saved': input_tokens['yaml'] - input_tokens['json_schema'],
+            'observed': observed
+        }
+        if len(observed) == len(OUTPUT_FORMATS):
+            yaml_tokens = observed['yaml']['mean_prompt_tokens'] + observed['yaml']['mean_completion_tokens']
+            json_tokens = observed['json_schema']['mean_prompt_tokens'] + observed['json_schema']['mean_completion_tokens']
+            entry['observed_tokens_saved_per_request'] = round(yaml_tokens - json_tokens, 1)
+            entry['observed_percent_saved'] = round(100 * (yaml_tokens - json_tokens) / yaml_tokens, 1) if yaml_tokens else None
+        report['agents'][agent_name] = entry
+    return report
+
+@app.route('/api/output-format/report', methods=['GET'])
+def output_format_report():
+    """Token savings of the json_schema output format versus the YAML prompts"""
+    return jsonify(build_output_format_report())
 
 @app.route('/api/upload-image', methods=['POST'])
 def upload_image():
@@ -1143,32 +6809,13 @@ def upload_image():
         if not allowed_file(file.filename):
             return jsonify({'error': 'Only PNG files are allowed'}), 400
         
-        # Generate unique filename
-        file_id = str(uuid.uuid4())
-        filename = secure_filename(f"{file_id}.png")
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        
-        # Save file
-        file.save(filepath)
-        
-        # Validate and get image info
+        # Save, validate and register the image
         try:
-            image_info = validate_and_resize_image(filepath)
+            file_info = store_uploaded_image(file.save, file.filename)
         except ValueError as e:
-            os.remove(filepath)  # Clean up invalid file
             return jsonify({'error': str(e)}), 400
-        
-        # Store file info
-        file_info = {
-            'file_id': file_id,
-            'original_filename': file.filename,
-            'filename': filename,
-            'filepath': filepath,
-            'uploaded_at': datetime.now().isoformat(),
-            'size': os.path.getsize(filepath),
-            'image_info': image_info
-        }
-        uploaded_files[file_id] = file_info
+        file_id = file_info['file_id']
+        image_info = file_info['image_info']
         
         return jsonify({
             'file_id': file_id,
@@ -1196,37 +6843,42 @@ def upload_contests():
         if not contest_text:
             return jsonify({'error': 'Contest text cannot be empty'}), 400
         
-        # Parse the text into structured format
+        # Parse the text into structured format and store it
         try:
-            parsed_data = parse_contest_text(contest_text)
-        except Exception as e:
-            return jsonify({'error': f'Failed to parse contest data: {str(e)}'}), 400
-        
-        # Generate data ID for tracking
-        data_id = str(uuid.uuid4())
-        
-        # Store the data
-        contest_data = {
-            'data_id': data_id,
-            'raw_text': contest_text,
-            'parsed_data': parsed_data,
-            'uploaded_at': datetime.now().isoformat()
-        }
-        
-        # For now, store in memory (replace with database in production)
-        # We'll use a simple approach and store in analysis_jobs with special key
-        analysis_jobs[f"contests_{data_id}"] = contest_data
+            contest_data = store_contest_data(contest_text)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        data_id = contest_data['data_id']
+        parsed_data = contest_data['parsed_data']
         
         return jsonify({
             'data_id': data_id,
             'contest_count': len(parsed_data['contests']),
             'contests': [c['title'] for c in parsed_data['contests']],
+            'ballot_style_count': len(reporting_unit_index(contest_data).ballot_styles),
             'uploaded_at': contest_data['uploaded_at']
         })
         
     except Exception as e:
         return jsonify({'error': f'Processing failed: {str(e)}'}), 500
 
+@app.route('/api/contests/<data_id>/ballot-styles', methods=['GET'])
+def get_ballot_styles(data_id):
+    """List the ballot styles of a contest list: their reporting units and contests"""
+    contest_data = job_store.get_contest_data(data_id)
+    if contest_data is None:
+        return jsonify({'error': 'Contest data not found'}), 404
+    
+    try:
+        index = reporting_unit_index(contest_data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({
+        'data_id': data_id,
+        'contest_count': len(index.contests),
+        'ballot_styles': index.describe()
+    })
+
 @app.route('/api/validate-contests', methods=['POST'])
 def validate_contests():
     """Validate contest text format without saving"""
@@ -1258,10 +6910,10 @@ def validate_contests():
 @app.route('/api/image/<file_id>')
 def get_image(file_id):
     """Serve uploaded image"""
-    if file_id not in uploaded_files:
+    file_info = job_store.get_upload(file_id)
+    if file_info is None:
         return jsonify({'error': 'Image not found'}), 404
     
-    file_info = uploaded_files[file_id]
     return send_from_directory(app.config['UPLOAD_FOLDER'], file_info['filename'])
 
 @app.route('/api/analyze-ballot', methods=['POST'])
@@ -1277,120 +6929,596 @@ def analyze_ballot():
         contest_data_id = data['contest_data_id']
         
         # Validate that both files exist
-        if image_file_id not in uploaded_files:
+        image_info = job_store.get_upload(image_file_id)
+        if image_info is None:
             return jsonify({'error': 'Image not found'}), 404
         
-        if f"contests_{contest_data_id}" not in analysis_jobs:
+        contest_data = job_store.get_contest_data(contest_data_id)
+        if contest_data is None:
             return jsonify({'error': 'Contest data not found'}), 404
         
+        contest_selector = {key: data[key] for key in CONTEST_SELECTORS if data.get(key) not in (None, '')}
+        if len(contest_selector) > 1:
+            return jsonify({'error': 'Give either ballot_style or reporting_unit, not both'}), 400
+        if contest_selector:
+            try:
+                select_contest_data(contest_data, contest_selector)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+        
         # Get image file path
-        image_info = uploaded_files[image_file_id]
         image_path = image_info['filepath']
         
+        execution_mode = data.get('execution_mode', 'interactive')
+        if execution_mode not in EXECUTION_MODES:
+            return jsonify({'error': f"execution_mode must be one of: {', '.join(EXECUTION_MODES)}"}), 400
+        
+        tiling = data.get('tiling', app.config['ANALYSIS_TILING'])
+        if tiling not in TILING_MODES:
+            return jsonify({'error': f"tiling must be one of: {', '.join(TILING_MODES)}"}), 400
+        
         # Create analysis job
-        job_id = str(uuid.uuid4())
+        job_id = create_analysis_job(image_file_id, contest_data_id,
+                                     use_cache=bool(data.get('use_cache', True)),
+                                     execution_mode=execution_mode,
+                                     tiling=tiling,
+                                     contest_selector=contest_selector or None)['job_id']
+        
+        # Hand the job to the worker pool; reject it if the queue is full
+        try:
+            queue_position = job_scheduler.submit(job_id, analyze_ballot_with_openai, image_path, job_id)
+        except JobQueueFullError as e:
+            job_store.delete_job(job_id)
+            response = jsonify({
+                'error': str(e),
+                'retry_after': e.retry_after
+            })
+            response.headers['Retry-After'] = str(e.retry_after)
+            return response, 429
         
-        analysis_job = {
+        return jsonify({
             'job_id': job_id,
             'status': 'queued',
-            'image_file_id': image_file_id,
+            'queue_position': queue_position,
+            'message': 'Multi-agent analysis job queued - processing with OpenAI GPT-4o'
+        })
+        
+    except Exception as e:
+        return jsonify({'error': f'Failed to start analysis: {str(e)}'}), 500
+
+def feed_batch_jobs(batch_id, jobs):
+    """Submit a batch's child jobs to the scheduler in order, waiting for queue space"""
+    # Bulk work only fills half the queue so interactive requests are not rejected
+    max_depth = max(1, job_scheduler.max_queue_size // 2)
+    for job in jobs:
+        image_path = job_store.get_upload(job['image_file_id'])['filepath']
+        job_scheduler.submit(job['job_id'], analyze_ballot_with_openai, image_path, job['job_id'],
+                             block=True, max_depth=max_depth)
+    job_store.update_batch(batch_id, all_submitted=True)
+
+def requeue_jobs(job_ids):
+    """
+    Hand queued jobs taken over from a stopped server process to the scheduler
+
+    Single ballots go first, waiting for queue space; batch children are fed
+    like a new batch, so the batch is marked all_submitted once they are queued.
+    """
+    batches = {}
+    for job_id in job_ids:
+        job = job_store.get_job(job_id)
+        upload = job_store.get_upload(job.get('image_file_id'))
+        if upload is None:
+            update_job(job_id,
+                       status='error',
+                       progress=0,
+                       message='Analysis interrupted by a server restart',
+                       error='Ballot image no longer available')
+        elif job.get('batch_id'):
+            batches.setdefault(job['batch_id'], []).append(job)
+        else:
+            job_scheduler.submit(job_id, analyze_ballot_with_openai, upload['filepath'], job_id, block=True)
+    for batch_id, jobs in batches.items():
+        feed_batch_jobs(batch_id, jobs)
+
+if requeued_job_ids:
+    print(f"Queuing {len(requeued_job_ids)} job(s) left queued by a previous server process")
+    threading.Thread(target=requeue_jobs, args=(requeued_job_ids,), daemon=True).start()
+
+def summarize_batch(batch):
+    """Aggregate progress, throughput and issue counts across a batch's child jobs"""
+    jobs = job_store.batch_jobs(batch['batch_id'])
+    counts = {'queued': 0, 'processing': 0, 'deferred': 0, 'completed': 0, 'error': 0}
+    total_issues = 0
+    ballots_with_issues = 0
+    progress_total = 0
+    for job in jobs:
+        counts[job['status']] = counts.get(job['status'], 0) + 1
+        progress_total += job['progress'] if job['status'] != 'error' else 100
+        if job['status'] == 'completed':
+            issues = job['total_issues'] or 0
+            total_issues += issues
+            ballots_with_issues += 1 if issues else 0
+
+    finished = counts['completed'] + counts['error']
+    if finished == len(jobs) and batch.get('completed_at') is None:
+        batch['status'] = 'completed'
+        batch['completed_at'] = datetime.now().isoformat()
+        job_store.update_batch(batch['batch_id'], status='completed', completed_at=batch['completed_at'])
+    elif finished < len(jobs) and counts['queued'] < len(jobs) and batch['status'] != 'processing':
+        batch['status'] = 'processing'
+        job_store.update_batch(batch['batch_id'], status='processing')
+
+    started = datetime.fromisoformat(batch['created_at'])
+    ended = datetime.fromisoformat(batch['completed_at']) if batch.get('completed_at') else datetime.now()
+    elapsed = max((ended - started).total_seconds(), 0.001)
+    jobs_per_minute = finished * 60 / elapsed
+    remaining = len(jobs) - finished
+
+    return {
+        'batch_id': batch['batch_id'],
+        'status': batch['status'],
+        'total_jobs': len(jobs),
+        'job_counts': counts,
+        'progress': int(progress_total / len(jobs)) if jobs else 100,
+        'elapsed_seconds': round(elapsed, 1),
+        'throughput': {
+            'jobs_per_minute': round(jobs_per_minute, 2),
+            'estimated_seconds_remaining': round(remaining * 60 / jobs_per_minute, 1)
+            if jobs_per_minute and remaining else None
+        },
+        'total_issues': total_issues,
+        'ballots_with_issues': ballots_with_issues,
+        'created_at': batch['created_at'],
+        'completed_at': batch.get('completed_at')
+    }
+
+@app.route('/api/batches', methods=['POST'])
+def create_batch():
+    """Start analysis of many ballot images (multipart files and/or a zip) against one contest dataset"""
+    try:
+        # Contest data: an existing dataset or text uploaded with the batch
+        contest_data_id = request.form.get('contest_data_id')
+        contest_text = (request.form.get('contest_text') or '').strip()
+        if contest_data_id:
+            if job_store.get_contest_data(contest_data_id) is None:
+                return jsonify({'error': 'Contest data not found'}), 404
+        elif contest_text:
+            try:
+                contest_data_id = store_contest_data(contest_text)['data_id']
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+        else:
+            return jsonify({'error': 'Either contest_data_id or contest_text is required'}), 400
+        
+        execution_mode = request.form.get('execution_mode', 'interactive')
+        if execution_mode not in EXECUTION_MODES:
+            return jsonify({'error': f"execution_mode must be one of: {', '.join(EXECUTION_MODES)}"}), 400
+        
+        tiling = request.form.get('tiling', app.config['ANALYSIS_TILING'])
+        if tiling not in TILING_MODES:
+            return jsonify({'error': f"tiling must be one of: {', '.join(TILING_MODES)}"}), 400
+        
+        stored_images = []
+        rejected = []
+        max_images = app.config['BATCH_MAX_IMAGES']
+        
+        def add_image(save_file, original_filename):
+            if len(stored_images) >= max_images:
+                rejected.append({'filename': original_filename, 'error': f'Batch limit of {max_images} images reached'})
+                return
+            try:
+                stored_images.append(store_uploaded_image(save_file, original_filename))
+            except ValueError as e:
+                rejected.append({'filename': original_filename, 'error': str(e)})
+        
+        for file in request.files.getlist('files'):
+            if file.filename and allowed_file(file.filename):
+                add_image(file.save, file.filename)
+            elif file.filename:
+                rejected.append({'filename': file.filename, 'error': 'Only PNG files are allowed'})
+        
+        archive = request.files.get('archive')
+        if archive and archive.filename:
+            try:
+                with zipfile.ZipFile(archive.stream) as zf:
+                    for member in zf.infolist():
+                        name = os.path.basename(member.filename)
+                        if member.is_dir() or not name or name.startswith('.'):
+                            continue
+                        if not allowed_file(name):
+                            rejected.append({'filename': member.filename, 'error': 'Only PNG files are allowed'})
+                            continue
+                        if member.file_size > app.config['MAX_CONTENT_LENGTH']:
+                            rejected.append({'filename': member.filename, 'error': 'File too large'})
+                            continue
+                        
+                        def save_member(path, member=member):
+                            with zf.open(member) as src, open(path, 'wb') as dst:
+                                dst.write(src.read())
+                        add_image(save_member, member.filename)
+            except zipfile.BadZipFile:
+                return jsonify({'error': 'Archive is not a valid zip file'}), 400
+        
+        if not stored_images:
+            return jsonify({'error': 'No valid PNG images provided', 'rejected': rejected}), 400
+        
+        # Create the parent batch and its child jobs
+        batch_id = str(uuid.uuid4())
+        use_cache = request.form.get('use_cache', 'true').lower() != 'false'
+        jobs = [
+            create_analysis_job(file_info['file_id'], contest_data_id, use_cache=use_cache,
+                                batch_id=batch_id, execution_mode=execution_mode, tiling=tiling)
+            for file_info in stored_images
+        ]
+        job_store.create_batch({
+            'batch_id': batch_id,
+            'status': 'queued',
             'contest_data_id': contest_data_id,
+            'rejected': rejected,
+            'all_submitted': False,
             'created_at': datetime.now().isoformat(),
-            'progress': 0,
-            'message': 'Analysis queued for OpenAI processing...'
-        }
-        
-        analysis_jobs[job_id] = analysis_job
+            'completed_at': None
+        })
         
-        # Start analysis in background thread
-        analysis_thread = threading.Thread(
-            target=analyze_ballot_with_openai,
-            args=(image_path, job_id),
-            daemon=True
-        )
-        analysis_thread.start()
+        # Feed the scheduler in the background so large batches wait for queue space
+        threading.Thread(target=feed_batch_jobs, args=(batch_id, jobs), daemon=True).start()
         
         return jsonify({
-            'job_id': job_id,
+            'batch_id': batch_id,
             'status': 'queued',
-            'message': 'Multi-agent analysis job started - processing with OpenAI GPT-4o'
+            'contest_data_id': contest_data_id,
+            'execution_mode': execution_mode,
+            'job_count': len(jobs),
+            'jobs': [
+                {'job_id': job['job_id'], 'image_file_id': file_info['file_id'], 'filename': file_info['original_filename']}
+                for job, file_info in zip(jobs, stored_images)
+            ],
+            'rejected': rejected
         })
         
+    except RequestEntityTooLarge:
+        return jsonify({'error': 'Upload too large'}), 413
     except Exception as e:
-        return jsonify({'error': f'Failed to start analysis: {str(e)}'}), 500
+        return jsonify({'error': f'Failed to start batch: {str(e)}'}), 500
 
-@app.route('/api/analysis/<job_id>/status')
-def get_analysis_status(job_id):
-    """Get analysis job status"""
-    if job_id not in analysis_jobs:
-        return jsonify({'error': 'Analysis job not found'}), 404
+@app.route('/api/batches/<batch_id>/status')
+def get_batch_status(batch_id):
+    """Get aggregate progress and throughput for a batch"""
+    batch = job_store.get_batch(batch_id)
+    if batch is None:
+        return jsonify({'error': 'Batch not found'}), 404
     
-    job = analysis_jobs[job_id]
-    return jsonify({
+    return jsonify(summarize_batch(batch))
+
+@app.route('/api/batches/<batch_id>/report')
+def get_batch_report(batch_id):
+    """Stream the combined findings of a finished batch as one JSON document"""
+    batch = job_store.get_batch(batch_id)
+    if batch is None:
+        return jsonify({'error': 'Batch not found'}), 404
+    
+    summary = summarize_batch(batch)
+    if summary['status'] != 'completed':
+        return jsonify({'error': 'Batch not completed yet', 'progress': summary['progress']}), 400
+    
+    def generate():
+        requests = []
+        yield '{"batch": ' + json.dumps(summary) + ', "ballots": ['
+        for index, row in enumerate(job_store.batch_jobs(batch_id)):
+            job = job_store.get_job(row['job_id']) or {}
+            file_info = job_store.get_upload(job.get('image_file_id')) or {}
+            ballot = {
+                'job_id': row['job_id'],
+                'image_file_id': job.get('image_file_id'),
+                'filename': file_info.get('original_filename'),
+                'status': job.get('status'),
+            }
+            if job.get('status') == 'completed':
+                ballot['combined_analysis'] = job['results']['combined_analysis']
+                ballot['agent_errors'] = job['results'].get('agent_errors', {})
+                ballot['token_usage'] = job['results'].get('token_usage')
+                requests.extend(agent_request_usage(job['results']['agent_results']))
+            else:
+                ballot['error'] = job.get('error')
+            yield (',' if index else '') + json.dumps(ballot, ensure_ascii=False)
+        yield '], "rejected": ' + json.dumps(batch['rejected'])
+        # Prompt cache hits across the whole batch, and what they did to request latency
+        yield ', "token_usage": ' + json.dumps(summarize_token_usage(requests)) + '}'
+    
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+def build_job_status(job_id):
+    """Snapshot of a job's progress as returned by the status endpoints, or None if it does not exist"""
+    job = job_store.get_job(job_id)
+    if job is None:
+        return None
+    with jobs_lock:
+        status = {
+            'job_id': job_id,
+            'status': job['status'],
+            'progress': job.get('progress', 0),
+            'message': job.get('message', ''),
+            'created_at': job['created_at'],
+            'has_results': job.get('results') is not None,
+            'version': job_events.version(job_id),
+            'timeline': format_job_timeline(job),
+            'agents': {
+                agent_name: {
+                    'status': agent['status'],
+                    'progress': agent.get('progress', 0),
+                    'error': agent.get('error')
+                }
+                for agent_name, agent in job.get('agents', {}).items()
+            }
+        }
+        for agent_name, agent in job.get('agents', {}).items():
+            if agent.get('timing'):
+                status['agents'][agent_name]['timing'] = agent['timing']
+            # While an agent streams, expose what it has written and found so far
+            if agent['status'] == 'running' and 'partial_raw_analysis' in agent:
+                status['agents'][agent_name]['partial_raw_analysis'] = agent['partial_raw_analysis']
+                status['agents'][agent_name]['partial_findings'] = agent.get('partial_findings')
+    
+    # Waiting jobs also report where they are in the queue
+    if status['status'] == 'queued':
+        queue_position = job_scheduler.queue_position(job_id)
+        if queue_position is not None:
+            wait_seconds = job_scheduler.estimated_wait_seconds(queue_position)
+            status['queue_position'] = queue_position
+            status['queue_depth'] = job_scheduler.stats()['queue_depth']
+            status['estimated_start_at'] = datetime.fromtimestamp(time.time() + wait_seconds).isoformat()
+    
+    return status
+
+def build_job_results(job_id):
+    """Final results payload of a completed job"""
+    job = job_store.get_job(job_id)
+    return {
         'job_id': job_id,
         'status': job['status'],
-        'progress': job.get('progress', 0),
-        'message': job.get('message', ''),
+        'results': job['results'],
         'created_at': job['created_at'],
-        'has_results': 'results' in job
-    })
+        'completed_at': job['results'].get('completed_at'),
+        'timeline': format_job_timeline(job)
+    }
+
+@app.route('/api/analysis/<job_id>/status')
+def get_analysis_status(job_id):
+    """
+    Get analysis job status
+
+    With ?since=<version> the request is held (long-polled) until the job changes
+    past that version or ?wait= seconds pass, for clients that cannot use the
+    event stream.
+    """
+    job = job_store.get_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Analysis job not found'}), 404
+    
+    since = request.args.get('since', type=int)
+    if since is not None and job_events.version(job_id) <= since and job['status'] not in JOB_FINAL_STATUSES:
+        wait = min(request.args.get('wait', app.config['LONG_POLL_MAX_SECONDS'], type=float),
+                   app.config['LONG_POLL_MAX_SECONDS'])
+        # Changes made by another server process are not published here; re-read them from the store
+        if not job_store.is_local(job_id):
+            wait = min(wait, STORE_POLL_SECONDS)
+        job_events.wait(job_id, since, max(0.0, wait))
+    
+    status = build_job_status(job_id)
+    if status is None:
+        return jsonify({'error': 'Analysis job not found'}), 404
+    return jsonify(status)
+
+@app.route('/api/analysis/<job_id>/events')
+def stream_analysis_events(job_id):
+    """
+    Server-Sent Events stream of a job's progress
+
+    Sends a `status` event whenever the job or one of its agents changes, then a
+    `results` event with the final results (completed jobs only) and an `end` event.
+    """
+    if job_store.get_job(job_id) is None:
+        return jsonify({'error': 'Analysis job not found'}), 404
+    
+    keepalive = app.config['SSE_KEEPALIVE_SECONDS']
+    
+    def generate():
+        last_payload = None
+        last_sent_at = time.time()
+        while True:
+            version = job_events.version(job_id)
+            status = build_job_status(job_id)
+            if status is None:
+                yield f"event: error\ndata: {json.dumps({'error': 'Analysis job not found'})}\n\n"
+                return
+            
+            payload = json.dumps(status)
+            if payload != last_payload:
+                yield f"id: {version}\nevent: status\ndata: {payload}\n\n"
+                last_payload = payload
+                last_sent_at = time.time()
+            elif time.time() - last_sent_at >= keepalive:
+                yield ': keepalive\n\n'
+                last_sent_at = time.time()
+            
+            if status['status'] in JOB_FINAL_STATUSES:
+                if status['has_results']:
+                    yield f"event: results\ndata: {json.dumps(build_job_results(job_id))}\n\n"
+                yield 'event: end\ndata: {}\n\n'
+                return
+            
+            # Queue positions move without the job itself changing, so queued jobs re-check sooner;
+            # jobs run by another server process are only visible through the store
+            if not job_store.is_local(job_id):
+                timeout = STORE_POLL_SECONDS
+            elif status['status'] == 'queued':
+                timeout = 2
+            else:
+                timeout = keepalive
+            job_events.wait(job_id, version, timeout)
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def build_chrome_trace(job):
+    """A job's timeline as Chrome trace-event JSON (one thread per track)"""
+    timeline = format_job_timeline(job)
+    tracks = []
+    events = [{'name': 'process_name', 'ph': 'M', 'pid': 1, 'tid': 0,
+               'args': {'name': f"job {job['job_id']}"}}]
+    for stage in timeline['stages']:
+        if stage['track'] not in tracks:
+            tracks.append(stage['track'])
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': len(tracks),
+                           'args': {'name': stage['track']}})
+        events.append({
+            'name': stage['stage'],
+            'cat': stage['track'],
+            'ph': 'X',
+            'pid': 1,
+            'tid': tracks.index(stage['track']) + 1,
+            'ts': round(stage['start'] * 1e6),
+            'dur': round(stage['seconds'] * 1e6),
+            'args': stage.get('args', {})
+        })
+    return {'traceEvents': events, 'displayTimeUnit': 'ms',
+            'otherData': {'job_id': job['job_id'], 'created_at': job['created_at'], 'status': job['status']}}
+
+@app.route('/api/analysis/<job_id>/trace')
+def get_analysis_trace(job_id):
+    """Download a job's stage timeline as Chrome trace-event JSON (chrome://tracing, Perfetto)"""
+    job = job_store.get_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Analysis job not found'}), 404
+    
+    response = jsonify(build_chrome_trace(job))
+    response.headers['Content-Disposition'] = f'attachment; filename="trace-{job_id}.json"'
+    return response
 
 @app.route('/api/analysis/<job_id>/results')
 def get_analysis_results(job_id):
     """Get detailed analysis results"""
-    if job_id not in analysis_jobs:
+    job = job_store.get_job(job_id)
+    if job is None:
         return jsonify({'error': 'Analysis job not found'}), 404
     
-    job = analysis_jobs[job_id]
-    
     if job['status'] != 'completed':
         return jsonify({'error': 'Analysis not completed yet'}), 400
     
-    if 'results' not in job:
+    if job.get('results') is None:
         return jsonify({'error': 'No results available'}), 404
     
-    return jsonify({
-        'job_id': job_id,
-        'status': job['status'],
-        'results': job['results'],
-        'created_at': job['created_at'],
-        'completed_at': job['results'].get('completed_at')
-    })
+    return jsonify(build_job_results(job_id))
+
+# Most log entries one page of the logs endpoint returns
+LOG_PAGE_MAX = 1000
+
+# How often a followed log is checked for new entries
+LOG_FOLLOW_POLL_SECONDS = 0.5
+
+def filter_log_entries(refs, event_types=None, since=None):
+    """Index entries matching the event_type / since filters of the logs endpoint"""
+    return [
+        ref for ref in refs
+        if (not event_types or ref.event_type in event_types)
+        and (since is None or (ref.timestamp or '') > since)
+    ]
 
 @app.route('/api/analysis/<job_id>/logs')
 def get_analysis_logs(job_id):
-    """Get OpenAI session logs for a specific job (for debugging)"""
+    """
+    Get OpenAI session logs for a specific job (for debugging)
+
+    Query parameters:
+        offset, limit: Page through the matching entries (limit is capped at LOG_PAGE_MAX)
+        event_type: Comma-separated event types to include
+        since: Only entries logged after this ISO timestamp
+        tail: Return the last N matching entries instead of a page from offset
+        follow: Stream matching entries as Server-Sent Events, including new
+            ones as they are logged, until the job finishes
+    """
     log_file = os.path.join(OPENAI_SESSIONS_DIR, f"{job_id}.log")
-    
-    if not os.path.exists(log_file):
-        return jsonify({'error': 'No logs found for this job'}), 404
+    event_types = {name for name in request.args.get('event_type', '').split(',') if name} or None
+    since = request.args.get('since') or None
+    offset = max(0, request.args.get('offset', 0, type=int))
+    limit = min(max(1, request.args.get('limit', LOG_PAGE_MAX, type=int)), LOG_PAGE_MAX)
+    tail = request.args.get('tail', type=int)
     
     try:
-        with open(log_file, 'r', encoding='utf-8') as f:
-            log_content = f.read()
+        session_logger.flush()
+        refs = session_log_index.entries(job_id)
+        follow = request.args.get('follow', '').lower() in ('1', 'true')
+        if refs is None and follow and job_store.get_job(job_id) is not None:
+            # A queued job has not logged anything yet
+            refs = []
+        if refs is None:
+            return jsonify({'error': 'No logs found for this job'}), 404
         
-        # Parse log entries
-        log_entries = []
-        raw_entries = log_content.split('\n---\n')
+        if follow:
+            return follow_analysis_logs(job_id, refs, event_types, since, offset, tail)
         
-        for entry in raw_entries:
-            entry = entry.strip()
-            if entry:
-                try:
-                    log_entries.append(json.loads(entry))
-                except json.JSONDecodeError:
-                    # Keep malformed entries as raw text
-                    log_entries.append({'raw': entry})
+        matching = filter_log_entries(refs, event_types, since)
+        if tail is not None:
+            offset = max(0, len(matching) - max(0, tail))
+            limit = min(max(0, tail), LOG_PAGE_MAX)
+        page = matching[offset:offset + limit]
         
         return jsonify({
             'job_id': job_id,
             'log_file': log_file,
-            'entry_count': len(log_entries),
-            'logs': log_entries
+            'total_entries': len(refs),
+            'entry_count': len(matching),
+            'offset': offset,
+            'limit': limit,
+            'next_offset': offset + len(page) if offset + len(page) < len(matching) else None,
+            'logs': session_log_index.read(job_id, page)
         })
         
     except Exception as e:
         return jsonify({'error': f'Failed to read logs: {str(e)}'}), 500
 
+def follow_analysis_logs(job_id, refs, event_types, since, offset, tail):
+    """
+    Server-Sent Events stream of a job's log: a `log` event per matching entry,
+    then an `end` event once the job has finished and its log is fully read
+    """
+    keepalive = app.config['SSE_KEEPALIVE_SECONDS']
+    matching = filter_log_entries(refs, event_types, since)
+    start = max(0, len(matching) - max(0, tail)) if tail is not None else offset
+    
+    def generate():
+        pending = matching[start:]
+        position = start
+        seen = len(refs)
+        last_sent_at = time.time()
+        while True:
+            for chunk_start in range(0, len(pending), 100):
+                chunk = pending[chunk_start:chunk_start + 100]
+                for entry in session_log_index.read(job_id, chunk):
+                    yield f"id: {position}\nevent: log\ndata: {json.dumps(entry, ensure_ascii=False)}\n\n"
+                    position += 1
+                last_sent_at = time.time()
+            
+            job = job_store.get_job(job_id)
+            finished = job is None or job['status'] in JOB_FINAL_STATUSES
+            if finished and not pending:
+                yield 'event: end\ndata: {}\n\n'
+                return
+            if time.time() - last_sent_at >= keepalive:
+                yield ': keepalive\n\n'
+                last_sent_at = time.time()
+            
+            if not finished:
+                time.sleep(LOG_FOLLOW_POLL_SECONDS)
+            session_logger.flush()
+            current = session_log_index.entries(job_id) or []
+            # Compressing a log keeps its entries in order; only deleting it shrinks the index
+            seen = min(seen, len(current))
+            pending = filter_log_entries(current[seen:], event_types, since)
+            seen = len(current)
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,170 @@
+"""
+The spelling agent's transcribe engine on a county-sized contest list: how long
+matching a ballot's transcription takes with the trigram CandidateIndex against
+ranking every official name by edit distance, whether it finds the misspellings
+planted in the transcriptions, and how much smaller the transcription request
+is than the compare engine's, which carries the whole contest list.
+
+    python benchmarks/bench_candidate_index.py --contests 400 --ballots 200
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import statistics
+import string
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRATCH_DIR = tempfile.mkdtemp(prefix='bench-candidate-index-')
+
+# Keep the app's side effects (database, uploads) out of the working tree
+os.environ.setdefault('OPENAI_API_KEY', 'benchmark')
+os.environ.setdefault('DATABASE_PATH', os.path.join(SCRATCH_DIR, 'jobs.db'))
+os.environ.setdefault('UPLOAD_FOLDER', os.path.join(SCRATCH_DIR, 'uploads'))
+os.environ.setdefault('OPENAI_SESSIONS_DIR', os.path.join(SCRATCH_DIR, 'openai-sessions'))
+os.environ.setdefault('RETENTION_INTERVAL_SECONDS', '0')
+sys.path.insert(0, BACKEND_DIR)
+
+import app  # noqa: E402
+
+FIRST_NAMES = ['Mary', 'James', 'Linda', 'Robert', 'Patricia', 'Michael', 'Jennifer', 'David',
+               'Susan', 'Thomas', 'Karen', 'Daniel', 'Nancy', 'Paul', 'Lisa', 'Mark', 'Abigail', 'Scott']
+SYLLABLES = ['an', 'ber', 'by', 'cal', 'da', 'er', 'gar', 'hold', 'kin', 'la', 'lee', 'mar', 'mel',
+             'nash', 'or', 'pet', 'rat', 'sch', 'ser', 'ski', 'son', 'ter', 'vas', 'wen', 'zel']
+
+
+def last_name(rng):
+    return ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))).capitalize()
+
+
+def contest_list(contest_count, rng):
+    """A synthetic contest list text in the upload format"""
+    lines = []
+    for n in range(contest_count):
+        lines.append(f"Office {n} {rng.choice(['Board Supervisor', 'Trustee', 'Clerk', 'Judge'])}")
+        for _ in range(rng.randint(1, 5)):
+            middle = f" {rng.choice(string.ascii_uppercase)}." if rng.random() < 0.3 else ''
+            lines.append(f"  {rng.choice(FIRST_NAMES)}{middle} {last_name(rng)}")
+        lines.append('  Reporting Units: All Reporting Units')
+        lines.append('')
+    return '\n'.join(lines)
+
+
+def misspell(name, rng):
+    """One typo a printer's proof might have: a dropped, doubled, swapped or changed letter"""
+    position = rng.randrange(1, len(name) - 1)
+    kind = rng.choice(['drop', 'double', 'swap', 'change'])
+    if kind == 'drop':
+        return name[:position] + name[position + 1:]
+    if kind == 'double':
+        return name[:position] + name[position] + name[position:]
+    if kind == 'swap':
+        return name[:position - 1] + name[position] + name[position - 1] + name[position + 1:]
+    return name[:position] + rng.choice(string.ascii_lowercase) + name[position + 1:]
+
+
+def ballot_transcriptions(contests, ballots, contests_per_ballot, typo_rate, rng):
+    """Transcriptions of random ballots, each with the misspellings planted in it"""
+    planted = []
+    transcriptions = []
+    for _ in range(ballots):
+        transcription = []
+        typos = set()
+        for contest in rng.sample(contests, contests_per_ballot):
+            names = []
+            for name in contest['candidates']:
+                if rng.random() < typo_rate:
+                    typo = misspell(name, rng)
+                    if app.printed_name(typo) != app.printed_name(name):
+                        typos.add((typo, name))
+                        name = typo
+                names.append(name)
+            transcription.append({'title': contest['title'], 'candidates': names})
+        transcriptions.append(transcription)
+        planted.append(typos)
+    return transcriptions, planted
+
+
+class LinearIndex(app.CandidateIndex):
+    """CandidateIndex without the trigram shortlist: every official name is ranked by edit distance"""
+
+    def lookup(self, name, contest=None, shortlist=8):
+        key = app.normalize_candidate_name(name)
+        name_ids = self.contest_names(contest) if contest is not None else range(len(self.names))
+        return sorted(((app.name_similarity(key, self.names[name_id].key), name_id) for name_id in name_ids),
+                      reverse=True)[:shortlist]
+
+
+def run(name, index, contest_data, transcriptions, planted):
+    app._candidate_indexes.clear()
+    app._candidate_indexes[(contest_data['data_id'], 'null')] = index
+    seconds = []
+    found = missed = extra = 0
+    for transcription, typos in zip(transcriptions, planted):
+        started = time.perf_counter()
+        structured = app.match_transcription(transcription, contest_data)
+        seconds.append(time.perf_counter() - started)
+        reported = {(error['candidate_found'], error['candidate_expected'])
+                    for error in structured['findings']['spelling_errors']}
+        found += len(reported & typos)
+        missed += len(typos - reported)
+        extra += len(reported - typos)
+    return {
+        'index': name,
+        'ballots': len(transcriptions),
+        'mean_ms_per_ballot': round(statistics.mean(seconds) * 1000, 2),
+        'p99_ms_per_ballot': round(sorted(seconds)[int(len(seconds) * 0.99)] * 1000, 2),
+        'planted_misspellings_found': found,
+        'missed': missed,
+        'unplanted_reported': extra
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark transcription matching against a large contest list')
+    parser.add_argument('--contests', type=int, default=400)
+    parser.add_argument('--ballots', type=int, default=200)
+    parser.add_argument('--contests-per-ballot', type=int, default=25)
+    parser.add_argument('--typo-rate', type=float, default=0.05)
+    parser.add_argument('--linear-ballots', type=int, default=10,
+                        help='Ballots to match with the linear scan, which is much slower')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    try:
+        text = contest_list(args.contests, rng)
+        contest_data = {'data_id': 'benchmark', 'parsed_data': app.parse_contest_text(text)}
+        contests = contest_data['parsed_data']['contests']
+        transcriptions, planted = ballot_transcriptions(contests, args.ballots, args.contests_per_ballot,
+                                                        args.typo_rate, rng)
+
+        started = time.perf_counter()
+        index = app.CandidateIndex(contests)
+        build_ms = round((time.perf_counter() - started) * 1000, 2)
+        results = [run('trigram', index, contest_data, transcriptions, planted),
+                   run('linear scan', LinearIndex(contests), contest_data,
+                       transcriptions[:args.linear_ballots], planted[:args.linear_ballots])]
+        for result in results:
+            print(json.dumps(result))
+
+        compare_tokens = (app.estimate_tokens(app.load_agent_prompt('spelling', 'json_schema')) +
+                          app.estimate_tokens(app.CONTEST_DATA_PROMPT.format(contest_text=text)))
+        app.app.config['SPELLING_ENGINE'] = 'transcribe'
+        transcribe_tokens = app.estimate_tokens(app.load_agent_prompt('spelling'))
+        print(json.dumps({
+            'official_names': len(index.names),
+            'index_build_ms': build_ms,
+            'compare_prompt_tokens': compare_tokens,
+            'transcribe_prompt_tokens': transcribe_tokens
+        }))
+    finally:
+        shutil.rmtree(SCRATCH_DIR, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,511 @@
+"""
+Speed of the single-pass response parser against the implementation it
+replaced, and a check that both give the same findings.
+
+The corpus is the answers in parser_corpus.jsonl, every agent answer recorded
+in openai-sessions/*.log, and generated ones: clean structured output,
+free-text answers that only the keyword fallback understands, and broken or
+unterminated YAML blocks. parser_corpus.jsonl holds hand-written answers in the
+layouts the parsers have to cope with (markdown, fenced YAML blocks, placeholder
+entries, cut-off and unparseable blocks, free text); add recorded answers to it
+as {"agent", "note", "content"} lines.
+
+--check only compares the parsers: both full parsers and the legacy entry
+points on every answer, and the streaming parser (PartialFindingsParser)
+against parse_partial_findings at every chunk of every answer. It times
+nothing and exits non-zero on any difference.
+
+    python benchmarks/bench_parser.py --check
+    python benchmarks/bench_parser.py --repeat 20
+    python benchmarks/bench_parser.py --sessions-dir /path/to/openai-sessions
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'parser_corpus.jsonl')
+SCRATCH_DIR = tempfile.mkdtemp(prefix='bench-parser-')
+
+# Keep the app's side effects (database, uploads) out of the working tree
+os.environ.setdefault('OPENAI_API_KEY', 'benchmark')
+os.environ.setdefault('DATABASE_PATH', os.path.join(SCRATCH_DIR, 'jobs.db'))
+os.environ.setdefault('UPLOAD_FOLDER', os.path.join(SCRATCH_DIR, 'uploads'))
+os.environ.setdefault('RETENTION_INTERVAL_SECONDS', '0')
+sys.path.insert(0, BACKEND_DIR)
+
+import app  # noqa: E402
+import mock_openai_server  # noqa: E402
+
+yaml = app.yaml
+clean_markdown = app.clean_markdown
+
+
+# --- The parser as it was before the single-pass engine, kept verbatim for comparison ---
+
+def baseline_extract_structured_output(analysis_text):
+    start_idx = analysis_text.find(app.STRUCTURED_OUTPUT_START)
+    if start_idx == -1:
+        return None
+    start_idx += len(app.STRUCTURED_OUTPUT_START)
+    end_idx = analysis_text.find(app.STRUCTURED_OUTPUT_END, start_idx)
+    if end_idx == -1:
+        return None
+    try:
+        return yaml.safe_load(analysis_text[start_idx:end_idx].strip())
+    except yaml.YAMLError:
+        return None
+
+
+def baseline_parse(analysis_text, agent_name):
+    """parse_structured_results without the session logging"""
+    structured_data = baseline_extract_structured_output(analysis_text)
+    if structured_data and isinstance(structured_data, dict) and 'findings' in structured_data:
+        try:
+            findings = app.convert_yaml_to_findings(structured_data, agent_name)
+            if findings:
+                findings['detailed_analysis'] = analysis_text
+                return findings
+        except Exception:
+            pass
+    if agent_name == 'missing_ovals':
+        findings = parse_analysis_results(analysis_text)
+    else:
+        findings = parse_spelling_results_legacy(analysis_text)
+    findings['parsing_method'] = 'legacy_keywords'
+    findings['detailed_analysis'] = analysis_text
+    return findings
+
+
+def parse_spelling_results_legacy(analysis_text):
+    """Parse OpenAI spelling analysis results into structured format"""
+    findings = {
+        'spelling_errors': [],
+        'other_issues': [],
+        'summary': '',
+        'total_issues': 0,
+        'confidence_summary': '',
+        'detailed_analysis': analysis_text,
+        'sections': {
+            'general_observations': [],
+            'specific_findings': [],
+            'recommendations': []
+        }
+    }
+
+    # Split the text into lines for parsing
+    lines = analysis_text.split('\n')
+    current_section = None
+
+    # Keywords for different types of issues
+    spelling_keywords = ['misspell', 'spelling', 'typo', 'incorrect', 'wrong name', 'name error', 'discrepancy']
+    confidence_keywords = ['confidence:', 'confidence level:', 'high confidence', 'medium confidence', 'low confidence']
+
+    for i, line in enumerate(lines):
+        line = line.strip()
+        if not line:
+            continue
+
+        # Detect sections
+        if any(header in line.lower() for header in ['general observation', 'overall', 'summary']):
+            current_section = 'general_observations'
+            continue
+        elif any(header in line.lower() for header in ['specific finding', 'findings', 'issues found']):
+            current_section = 'specific_findings'
+            continue
+        elif any(header in line.lower() for header in ['recommendation', 'suggest', 'next steps']):
+            current_section = 'recommendations'
+            continue
+
+        # Parse spelling errors specifically
+        line_lower = line.lower()
+        if any(keyword in line_lower for keyword in spelling_keywords):
+            # Extract candidate/contest info
+            candidate_name = extract_candidate_name(line)
+            contest_name = extract_contest_name(line, lines, i)
+            confidence = extract_confidence(line)
+
+            spelling_error = {
+                'description': clean_markdown(line),
+                'candidate': candidate_name,
+                'contest': contest_name,
+                'confidence': confidence,
+                'raw_text': line
+            }
+            findings['spelling_errors'].append(spelling_error)
+
+        # Categorize other issues
+        elif any(keyword in line_lower for keyword in ['issue', 'problem', 'error', 'anomaly', 'concern']):
+            if not any(keyword in line_lower for keyword in spelling_keywords):  # Avoid double-counting
+                other_issue = {
+                    'description': clean_markdown(line),
+                    'type': classify_issue_type(line),
+                    'severity': extract_severity(line),
+                    'raw_text': line
+                }
+                findings['other_issues'].append(other_issue)
+
+        # Add to appropriate section
+        if current_section and line:
+            findings['sections'][current_section].append(clean_markdown(line))
+
+    # Generate summary
+    spelling_count = len(findings['spelling_errors'])
+    other_count = len(findings['other_issues'])
+    findings['total_issues'] = spelling_count + other_count
+
+    if spelling_count == 0 and other_count == 0:
+        findings['summary'] = 'No spelling errors detected. All candidate names appear to match the official list.'
+        findings['confidence_summary'] = 'Spelling analysis completed successfully with no concerns found.'
+    else:
+        parts = []
+        if spelling_count > 0:
+            parts.append(f"{spelling_count} spelling error{'s' if spelling_count != 1 else ''}")
+        if other_count > 0:
+            parts.append(f"{other_count} other issue{'s' if other_count != 1 else ''}")
+
+        findings['summary'] = f"Found {' and '.join(parts)} that require attention."
+
+        # Count confidence levels
+        high_confidence = sum(1 for error in findings['spelling_errors'] if error.get('confidence') == 'high')
+        if high_confidence > 0:
+            findings['confidence_summary'] = f"{high_confidence} high-confidence finding{'s' if high_confidence != 1 else ''}"
+        else:
+            findings['confidence_summary'] = "Mixed confidence levels in findings"
+
+    return findings
+
+
+def parse_analysis_results(analysis_text):
+    """Parse OpenAI analysis results into structured format with better organization"""
+    findings = {
+        'missing_ovals': [],
+        'other_issues': [],
+        'summary': '',
+        'total_issues': 0,
+        'confidence_summary': '',
+        'detailed_analysis': analysis_text,
+        'sections': {
+            'general_observations': [],
+            'specific_findings': [],
+            'recommendations': []
+        }
+    }
+
+    # Split the text into lines for parsing
+    lines = analysis_text.split('\n')
+    current_section = None
+    current_item = None
+
+    # Keywords for different types of issues
+    missing_oval_keywords = ['missing oval', 'no oval', 'oval missing', 'without oval', 'lacks oval']
+    confidence_keywords = ['confidence:', 'confidence level:', 'high confidence', 'medium confidence', 'low confidence']
+
+    for i, line in enumerate(lines):
+        line = line.strip()
+        if not line:
+            continue
+
+        # Detect sections
+        if any(header in line.lower() for header in ['general observation', 'overall', 'summary']):
+            current_section = 'general_observations'
+            continue
+        elif any(header in line.lower() for header in ['specific finding', 'findings', 'issues found']):
+            current_section = 'specific_findings'
+            continue
+        elif any(header in line.lower() for header in ['recommendation', 'suggest', 'next steps']):
+            current_section = 'recommendations'
+            continue
+
+        # Parse missing ovals specifically
+        line_lower = line.lower()
+        if any(keyword in line_lower for keyword in missing_oval_keywords):
+            # Extract candidate/contest info
+            candidate_name = extract_candidate_name(line)
+            contest_name = extract_contest_name(line, lines, i)
+            confidence = extract_confidence(line)
+
+            missing_oval = {
+                'description': clean_markdown(line),
+                'candidate': candidate_name,
+                'contest': contest_name,
+                'confidence': confidence,
+                'raw_text': line
+            }
+            findings['missing_ovals'].append(missing_oval)
+
+        # Check for confidence levels
+        elif any(keyword in line_lower for keyword in confidence_keywords):
+            confidence_info = extract_confidence_info(line)
+            if current_item:
+                current_item['confidence_details'] = confidence_info
+
+        # Categorize other issues
+        elif any(keyword in line_lower for keyword in ['issue', 'problem', 'error', 'anomaly', 'concern']):
+            other_issue = {
+                'description': clean_markdown(line),
+                'type': classify_issue_type(line),
+                'severity': extract_severity(line),
+                'raw_text': line
+            }
+            findings['other_issues'].append(other_issue)
+
+        # Add to appropriate section
+        if current_section and line:
+            findings['sections'][current_section].append(clean_markdown(line))
+
+    # Generate improved summary
+    missing_count = len(findings['missing_ovals'])
+    other_count = len(findings['other_issues'])
+    findings['total_issues'] = missing_count + other_count
+
+    if missing_count == 0 and other_count == 0:
+        findings['summary'] = 'No issues detected. All candidates and choices appear to have proper voting ovals.'
+        findings['confidence_summary'] = 'Analysis completed successfully with no concerns found.'
+    else:
+        parts = []
+        if missing_count > 0:
+            parts.append(f"{missing_count} missing oval{'s' if missing_count != 1 else ''}")
+        if other_count > 0:
+            parts.append(f"{other_count} other issue{'s' if other_count != 1 else ''}")
+
+        findings['summary'] = f"Found {' and '.join(parts)} that require attention."
+
+        # Count confidence levels
+        high_confidence = sum(1 for oval in findings['missing_ovals'] if oval.get('confidence') == 'high')
+        if high_confidence > 0:
+            findings['confidence_summary'] = f"{high_confidence} high-confidence finding{'s' if high_confidence != 1 else ''}"
+        else:
+            findings['confidence_summary'] = "Mixed confidence levels in findings"
+
+    return findings
+
+
+def extract_candidate_name(text):
+    """Extract candidate name from analysis text"""
+    # Look for common patterns where candidate names appear
+    text_lower = text.lower()
+
+    # Pattern: "for [candidate name]" or "candidate [name]"
+    if 'for ' in text_lower:
+        parts = text.split('for ')
+        if len(parts) > 1:
+            candidate_part = parts[1].split(' ')[0:3]  # Take first few words
+            return ' '.join(candidate_part).strip('.,')
+
+    if 'candidate ' in text_lower:
+        parts = text.split('candidate ')
+        if len(parts) > 1:
+            candidate_part = parts[1].split(' ')[0:3]
+            return ' '.join(candidate_part).strip('.,')
+
+    return None
+
+def extract_contest_name(text, all_lines, current_index):
+    """Extract contest name by looking at context around the line"""
+    # Look in nearby lines for contest context
+    context_range = 3
+    start_idx = max(0, current_index - context_range)
+    end_idx = min(len(all_lines), current_index + context_range + 1)
+
+    contest_keywords = ['contest', 'race', 'election', 'office', 'position']
+
+    for i in range(start_idx, end_idx):
+        line = all_lines[i].lower()
+        if any(keyword in line for keyword in contest_keywords):
+            # Extract the contest name
+            for keyword in contest_keywords:
+                if keyword in line:
+                    parts = all_lines[i].split(keyword)
+                    if len(parts) > 1:
+                        return parts[1].strip('.,: ').split(' ')[0:5]  # Take first few words
+
+    return None
+
+def extract_confidence(text):
+    """Extract confidence level from text"""
+    text_lower = text.lower()
+    if 'high confidence' in text_lower or 'high' in text_lower:
+        return 'high'
+    elif 'medium confidence' in text_lower or 'medium' in text_lower:
+        return 'medium'
+    elif 'low confidence' in text_lower or 'low' in text_lower:
+        return 'low'
+    return 'medium'  # Default
+
+def extract_confidence_info(text):
+    """Extract detailed confidence information"""
+    return text.strip()
+
+def classify_issue_type(text):
+    """Classify the type of issue found"""
+    text_lower = text.lower()
+    if any(word in text_lower for word in ['format', 'layout', 'alignment']):
+        return 'formatting'
+    elif any(word in text_lower for word in ['spelling', 'misspell', 'typo']):
+        return 'spelling'
+    elif any(word in text_lower for word in ['missing', 'absent', 'not found']):
+        return 'missing_content'
+    else:
+        return 'general'
+
+def extract_severity(text):
+    """Extract severity level from issue description"""
+    text_lower = text.lower()
+    if any(word in text_lower for word in ['critical', 'severe', 'major']):
+        return 'high'
+    elif any(word in text_lower for word in ['minor', 'small', 'slight']):
+        return 'low'
+    else:
+        return 'medium'
+
+
+# --- Corpus ---
+
+FREE_TEXT_LINES = [
+    '## Overall Assessment',
+    'The ballot layout is generally clean and consistent.',
+    '### Specific Findings',
+    '**Missing oval** for Jane Q. Public in the contest for County Clerk (high confidence).',
+    'Candidate John Smith appears without oval in the race for Mayor.',
+    'Confidence: medium',
+    'There is a minor alignment issue in column 2.',
+    'The name Jon Smyth is misspelled; the official list has John Smith. High confidence.',
+    'Possible typo in the Office of Treasurer heading.',
+    'A critical problem: the write-in line is absent from the Sheriff contest.',
+    'Spelling discrepancy for candidate Maria Gonzales vs Maria Gonzalez (low confidence).',
+    'Election for School Board, Position 3',
+    'No other concerns were noted.',
+    '## Recommendations',
+    'Suggest re-checking the proof against the certified candidate list.',
+    'Next steps: correct the items above and re-run the analysis.',
+    '',
+]
+
+
+def free_text_answer(rng, lines=30):
+    return '\n'.join(rng.choice(FREE_TEXT_LINES) for _ in range(lines))
+
+
+def build_corpus(sessions_dir, generated, seed):
+    """
+    (agent, text) pairs: the corpus file and recorded answers first, then generated ones
+
+    Returns:
+        Tuple of (corpus, answers from the corpus file, answers from session logs)
+    """
+    with open(CORPUS_PATH, encoding='utf-8') as f:
+        corpus = [(answer['agent'], answer['content']) for answer in map(json.loads, f)]
+    from_file = len(corpus)
+    if sessions_dir and os.path.isdir(sessions_dir):
+        mock_openai_server.load_replay_responses(sessions_dir)
+        for agent, answers in mock_openai_server.replay_responses.items():
+            corpus.extend((agent, answer['content']) for answer in answers)
+    recorded = len(corpus) - from_file
+
+    rng = random.Random(seed)
+    agents = ['missing_ovals', 'spelling']
+    for i in range(generated):
+        agent = agents[i % 2]
+        kind = i % 4
+        if kind == 0:
+            text = mock_openai_server.CANNED_RESPONSES[agent]
+            text = free_text_answer(rng, 10) + text[text.index('\n'):]
+        elif kind == 1:
+            text = free_text_answer(rng, rng.randint(10, 80))
+        elif kind == 2:
+            # Structured block that does not load as YAML
+            text = (free_text_answer(rng, 15) + f"\n{app.STRUCTURED_OUTPUT_START}\nfindings: [unclosed\n"
+                    f"  - {{ bad: yaml\n{app.STRUCTURED_OUTPUT_END}")
+        else:
+            # Unterminated block (answer cut off)
+            text = free_text_answer(rng, 20) + f"\n{app.STRUCTURED_OUTPUT_START}\nfindings:\n  other_issues: []"
+        corpus.append((agent, text))
+    return corpus, from_file, recorded
+
+
+def check_parsers(corpus, current):
+    """Number of answers any two implementations disagree on, printing each one"""
+    mismatches = 0
+    for agent, text in corpus:
+        if baseline_parse(text, agent) != current(text, agent):
+            mismatches += 1
+            print(f"Mismatch ({agent}): {text[:120]!r}")
+        legacy_before = parse_analysis_results(text) if agent == 'missing_ovals' else parse_spelling_results_legacy(text)
+        legacy_after = (app.parse_analysis_results(text) if agent == 'missing_ovals'
+                        else app.parse_spelling_results_legacy(text))
+        if legacy_before != legacy_after:
+            mismatches += 1
+            print(f"Legacy mismatch ({agent}): {text[:120]!r}")
+    return mismatches
+
+
+def check_streaming_parser(corpus, chunk_size=7):
+    """Number of answers on which PartialFindingsParser and parse_partial_findings disagree while streaming"""
+    mismatches = 0
+    for agent, text in corpus:
+        parser = app.PartialFindingsParser(agent)
+        for end in range(chunk_size, len(text) + chunk_size, chunk_size):
+            parser.feed(text[end - chunk_size:end])
+            if parser.findings() != app.parse_partial_findings(text[:end], agent):
+                mismatches += 1
+                print(f"Streaming mismatch ({agent}) after {min(end, len(text))} characters: {text[:120]!r}")
+                break
+    return mismatches
+
+
+def time_parser(name, parse, corpus, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for agent, text in corpus:
+            parse(text, agent)
+    seconds = time.perf_counter() - started
+    parses = repeat * len(corpus)
+    return {'implementation': name, 'parses': parses, 'seconds': round(seconds, 3),
+            'us_per_parse': round(seconds / parses * 1e6, 1) if parses else None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the agent response parser')
+    parser.add_argument('--sessions-dir', default=app.OPENAI_SESSIONS_DIR,
+                        help='Session logs to take recorded answers from')
+    parser.add_argument('--generated', type=int, default=400, help='Generated answers to add to the corpus')
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--check', action='store_true',
+                        help='Only check that the parsers agree (no timing); exits 1 on any difference')
+    args = parser.parse_args()
+
+    try:
+        corpus, from_file, recorded = build_corpus(args.sessions_dir, args.generated, args.seed)
+        # parse_structured_results logs what it did; there is no job to log to here
+        app.log_openai_session = lambda *args, **kwargs: None
+        current = lambda text, agent: app.parse_structured_results(text, agent, None)
+
+        # Same findings for every answer, and for the legacy entry points on their own
+        mismatches = check_parsers(corpus, current)
+        if args.check:
+            mismatches += check_streaming_parser(corpus)
+        if mismatches:
+            raise SystemExit(f"{mismatches} answers parsed differently")
+        print(json.dumps({'corpus': len(corpus), 'corpus_file': from_file, 'recorded': recorded, 'equivalent': True,
+                          'yaml_loader': app.YAML_LOADER.__name__}))
+        if args.check:
+            return
+
+        before = time_parser('previous parser', baseline_parse, corpus, args.repeat)
+        after = time_parser('single-pass parser', current, corpus, args.repeat)
+        for result in (before, after):
+            print(json.dumps(result))
+        print(f"{before['seconds'] / after['seconds']:.1f}x faster")
+    finally:
+        shutil.rmtree(SCRATCH_DIR, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
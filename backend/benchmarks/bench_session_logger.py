@@ -0,0 +1,163 @@
+"""
+Per-event overhead of the session logger: the buffered JSONL writer against the
+previous open/indent-dump/close-per-event implementation.
+
+Each run logs the same mix of events (a large request, metadata, a response)
+for several jobs from several threads, then reads every log back with
+parse_session_log to check that nothing was lost.
+
+    python benchmarks/bench_session_logger.py --jobs 50 --events 15 --threads 8
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRATCH_DIR = tempfile.mkdtemp(prefix='bench-session-logger-')
+
+# Keep the app's side effects (database, uploads) out of the working tree
+os.environ.setdefault('OPENAI_API_KEY', 'benchmark')
+os.environ.setdefault('DATABASE_PATH', os.path.join(SCRATCH_DIR, 'jobs.db'))
+os.environ.setdefault('UPLOAD_FOLDER', os.path.join(SCRATCH_DIR, 'uploads'))
+os.environ.setdefault('OPENAI_SESSIONS_DIR', os.path.join(SCRATCH_DIR, 'openai-sessions'))
+os.environ.setdefault('RETENTION_INTERVAL_SECONDS', '0')
+sys.path.insert(0, BACKEND_DIR)
+
+import app  # noqa: E402
+
+
+def legacy_log(log_dir, job_id, event_type, data):
+    """The per-event implementation the writer replaced"""
+    log_entry = {
+        'timestamp': app.datetime.now().isoformat(),
+        'job_id': job_id,
+        'event_type': event_type,
+        'data': data
+    }
+    with open(os.path.join(log_dir, f"{job_id}.log"), 'a', encoding='utf-8') as f:
+        f.write(json.dumps(log_entry, indent=2, ensure_ascii=False))
+        f.write('\n---\n')
+
+
+def buffered_log(writer, job_id, event_type, data):
+    """What log_openai_session does on the caller's thread"""
+    log_entry = {
+        'timestamp': app.datetime.now().isoformat(),
+        'job_id': job_id,
+        'event_type': event_type,
+        'data': data
+    }
+    writer.write(job_id, json.dumps(log_entry, ensure_ascii=False))
+
+
+def sample_events(count):
+    request = {
+        'model': app.AGENT_MODEL,
+        'messages': [{'role': 'user', 'content': [
+            {'type': 'text', 'text': 'Review this ballot for missing ovals. ' * 40},
+            {'type': 'image_url', 'image_url': {'url': 'data:image/png;base64,[REDACTED - 243,812 chars]'}}
+        ]}],
+        'parameters': app.AGENT_REQUEST_PARAMS
+    }
+    response = {
+        'id': 'chatcmpl-benchmark',
+        'model': app.AGENT_MODEL,
+        'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': 'Finding text. ' * 120}}],
+        'usage': {'prompt_tokens': 1400, 'completion_tokens': 420, 'total_tokens': 1820}
+    }
+    metadata = {'action': 'agent_progress', 'agent': 'spelling', 'progress': 50}
+    kinds = [('request', request), ('metadata', metadata), ('response', response)]
+    return [kinds[i % len(kinds)] for i in range(count)]
+
+
+def run(name, log_event, jobs, events, threads):
+    job_ids = [f"bench-{name}-{i}" for i in range(jobs)]
+    payloads = sample_events(events)
+    latencies = []
+    latencies_lock = threading.Lock()
+
+    def worker(assigned):
+        local = []
+        for job_id in assigned:
+            for event_type, data in payloads:
+                started = time.perf_counter()
+                log_event(job_id, event_type, data)
+                local.append(time.perf_counter() - started)
+        with latencies_lock:
+            latencies.extend(local)
+
+    workers = [threading.Thread(target=worker, args=(job_ids[i::threads],)) for i in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return job_ids, latencies, time.perf_counter() - started
+
+
+def summarize(name, latencies, wall_seconds, drain_seconds):
+    ordered = sorted(latencies)
+    return {
+        'implementation': name,
+        'events': len(latencies),
+        'mean_us': round(statistics.mean(ordered) * 1e6, 1),
+        'p50_us': round(ordered[len(ordered) // 2] * 1e6, 1),
+        'p99_us': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1e6, 1),
+        'caller_wall_seconds': round(wall_seconds, 3),
+        'until_on_disk_seconds': round(wall_seconds + drain_seconds, 3)
+    }
+
+
+def verify(log_dir, job_ids, events):
+    for job_id in job_ids:
+        with open(os.path.join(log_dir, f"{job_id}.log"), 'r', encoding='utf-8') as f:
+            entries = app.parse_session_log(f.read())
+        if len(entries) != events or any('raw' in entry for entry in entries):
+            raise SystemExit(f"{job_id}: expected {events} entries, read back {len(entries)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the session logger')
+    parser.add_argument('--jobs', type=int, default=50)
+    parser.add_argument('--events', type=int, default=15, help='Events per job')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--max-open-files', type=int, default=64)
+    args = parser.parse_args()
+
+    try:
+        legacy_dir = os.path.join(SCRATCH_DIR, 'legacy')
+        os.makedirs(legacy_dir)
+        job_ids, latencies, wall = run('legacy', lambda *event: legacy_log(legacy_dir, *event),
+                                       args.jobs, args.events, args.threads)
+        verify(legacy_dir, job_ids, args.events)
+        results = [summarize('legacy (open/indent/close per event)', latencies, wall, 0.0)]
+
+        buffered_dir = os.path.join(SCRATCH_DIR, 'buffered')
+        os.makedirs(buffered_dir)
+        writer = app.SessionLogWriter(buffered_dir, max_open_files=args.max_open_files)
+        job_ids, latencies, wall = run('buffered', lambda *event: buffered_log(writer, *event),
+                                       args.jobs, args.events, args.threads)
+        drain_started = time.perf_counter()
+        writer.close(timeout=60)
+        drain = time.perf_counter() - drain_started
+        verify(buffered_dir, job_ids, args.events)
+        results.append(summarize('buffered JSONL writer', latencies, wall, drain))
+        stats = writer.stats()
+
+        for result in results:
+            print(json.dumps(result))
+        print(json.dumps({'writer': stats}))
+        speedup = results[0]['mean_us'] / results[1]['mean_us'] if results[1]['mean_us'] else float('inf')
+        print(f"Per-event caller overhead: {speedup:.1f}x lower with the buffered writer")
+    finally:
+        shutil.rmtree(SCRATCH_DIR, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
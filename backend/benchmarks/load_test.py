@@ -0,0 +1,310 @@
+"""
+End-to-end throughput benchmark: drives /api/upload-image -> /api/analyze-ballot
+-> status -> results at a fixed concurrency and reports throughput, p50/p95/p99
+latency per phase and the backend's peak RSS.
+
+By default it starts its own mock OpenAI server and backend (with a scratch
+database and upload folder) so the numbers measure this code rather than
+OpenAI; --url points it at a backend that is already running instead.
+
+    python benchmarks/load_test.py --ballots 200 --concurrency 16 --mock-latency lognormal:2.5,0.4
+    python benchmarks/load_test.py --url http://localhost:5000 --backend-pid 12345 --ballots 50
+
+--engine compares the thread-per-job engine with the asyncio one; plain polling
+(--poll-interval) keeps status requests from holding server threads:
+
+    python benchmarks/load_test.py --engine threads --analysis-workers 64 --ballots 300 --concurrency 200 --poll-interval 1
+    python benchmarks/load_test.py --engine asyncio --ballots 300 --concurrency 200 --poll-interval 1
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEST_DATA_DIR = os.path.join(os.path.dirname(BACKEND_DIR), 'test-data')
+PHASES = ('upload', 'submit', 'analysis', 'results', 'total')
+
+
+def request_json(url, body=None, content_type='application/json', timeout=120):
+    """
+    Send a request and decode the JSON answer, waiting out 429s from the job queue
+
+    Returns:
+        Decoded JSON body
+
+    Raises:
+        RuntimeError: On any other non-2xx answer
+    """
+    if body is not None and content_type == 'application/json':
+        body = json.dumps(body).encode('utf-8')
+    while True:
+        req = urllib.request.Request(url, data=body, headers={'Content-Type': content_type} if body is not None else {})
+        try:
+            with urllib.request.urlopen(req, timeout=timeout) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            if e.code == 429:
+                time.sleep(float(e.headers.get('Retry-After') or 1))
+                continue
+            raise RuntimeError(f"{req.get_method()} {url}: {e.code} {e.read()[:200]!r}")
+
+
+def multipart_body(filename, data):
+    boundary = uuid.uuid4().hex
+    body = (f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+            f"Content-Type: image/png\r\n\r\n").encode('utf-8') + data + f"\r\n--{boundary}--\r\n".encode('utf-8')
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+def thread_count(pid):
+    """Current number of threads of a process, or None where /proc is unavailable"""
+    try:
+        with open(f"/proc/{pid}/status", 'r') as f:
+            for line in f:
+                if line.startswith('Threads:'):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+def sample_peak_threads(pid, stop, peak, interval=0.2):
+    """Record the highest thread count of a process in peak['threads'] until stop is set"""
+    while not stop.is_set():
+        count = thread_count(pid)
+        if count is not None:
+            peak['threads'] = max(peak.get('threads') or 0, count)
+        stop.wait(interval)
+
+
+def peak_rss_kb(pid):
+    """Peak resident set size of a process in KB (VmHWM), or None where /proc is unavailable"""
+    try:
+        with open(f"/proc/{pid}/status", 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+def run_ballot(base_url, image, contest_data_id, args):
+    """Take one ballot through the whole flow, returning seconds spent per phase"""
+    timings = {}
+    started = time.perf_counter()
+    body, content_type = multipart_body(image['name'], image['data'])
+    file_id = request_json(f"{base_url}/api/upload-image", body, content_type)['file_id']
+    timings['upload'] = time.perf_counter() - started
+
+    phase_started = time.perf_counter()
+    job_id = request_json(f"{base_url}/api/analyze-ballot", {
+        'image_file_id': file_id,
+        'contest_data_id': contest_data_id,
+        'execution_mode': args.execution_mode,
+        'use_cache': args.use_cache
+    })['job_id']
+    timings['submit'] = time.perf_counter() - phase_started
+
+    phase_started = time.perf_counter()
+    version = -1
+    while True:
+        if args.poll_interval:
+            status = request_json(f"{base_url}/api/analysis/{job_id}/status")
+        else:
+            status = request_json(f"{base_url}/api/analysis/{job_id}/status?since={version}&wait=30")
+            version = status.get('version', version)
+        if status['status'] in ('completed', 'error', 'cancelled'):
+            break
+        if args.poll_interval:
+            time.sleep(args.poll_interval)
+    timings['analysis'] = time.perf_counter() - phase_started
+
+    phase_started = time.perf_counter()
+    if status['status'] == 'completed':
+        request_json(f"{base_url}/api/analysis/{job_id}/results")
+    timings['results'] = time.perf_counter() - phase_started
+    timings['total'] = time.perf_counter() - started
+    return status['status'], timings
+
+
+def percentile(ordered, fraction):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def summarize(samples, wall_seconds, outcomes, rss_kb, peak_threads=None):
+    report = {
+        'ballots': sum(outcomes.values()),
+        'outcomes': outcomes,
+        'wall_seconds': round(wall_seconds, 2),
+        'throughput_per_minute': round(sum(outcomes.values()) / wall_seconds * 60, 1) if wall_seconds else None,
+        'latency_seconds': {},
+        'backend_peak_rss_mb': round(rss_kb / 1024, 1) if rss_kb else None,
+        'backend_peak_threads': peak_threads
+    }
+    for phase in PHASES:
+        ordered = sorted(sample[phase] for sample in samples)
+        report['latency_seconds'][phase] = {
+            name: round(value, 3) if value is not None else None
+            for name, value in (('p50', percentile(ordered, 0.5)),
+                                ('p95', percentile(ordered, 0.95)),
+                                ('p99', percentile(ordered, 0.99)))
+        }
+    return report
+
+
+def wait_until_up(url, process, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"{url} exited during startup with code {process.returncode}")
+        try:
+            with urllib.request.urlopen(url, timeout=2):
+                return
+        except urllib.error.HTTPError:
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise SystemExit(f"{url} did not come up within {timeout}s")
+
+
+def start_servers(args, scratch_dir):
+    """Start the mock OpenAI server and a backend pointed at it"""
+    mock = subprocess.Popen([
+        sys.executable, os.path.join(BACKEND_DIR, 'mock_openai_server.py'),
+        '--port', str(args.mock_port),
+        '--latency', args.mock_latency,
+        '--error-rate', str(args.mock_error_rate),
+        '--rate-limit-rate', str(args.mock_rate_limit_rate),
+        '--rpm-limit', str(args.mock_rpm_limit)
+    ], cwd=BACKEND_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    env = dict(os.environ,
+               OPENAI_API_KEY='mock',
+               OPENAI_BASE_URL=f"http://127.0.0.1:{args.mock_port}/v1",
+               DATABASE_PATH=os.path.join(scratch_dir, 'jobs.db'),
+               UPLOAD_FOLDER=os.path.join(scratch_dir, 'uploads'),
+               RESULT_CACHE_DIR=os.path.join(scratch_dir, 'result-cache'),
+               DEFERRED_BATCH_DIR=os.path.join(scratch_dir, 'deferred-batches'),
+               # Keep the run's session logs out of the directory the mock replays answers from
+               OPENAI_SESSIONS_DIR=os.path.join(scratch_dir, 'openai-sessions'),
+               RETENTION_INTERVAL_SECONDS='0',
+               ANALYSIS_ENGINE=args.engine,
+               ANALYSIS_QUEUE_SIZE=str(args.queue_size))
+    if args.analysis_workers:
+        # Each job runs two agents on the shared agent pool
+        env['ANALYSIS_WORKERS'] = str(args.analysis_workers)
+        env['AGENT_MAX_WORKERS'] = str(2 * args.analysis_workers)
+    # Run without the debug reloader so the PID measured is the one serving requests
+    backend = subprocess.Popen([
+        sys.executable, '-c',
+        f"import app; app.app.run(host='127.0.0.1', port={args.port}, threaded=True)"
+    ], cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wait_until_up(f"http://127.0.0.1:{args.mock_port}/v1/batches/none", mock)
+    wait_until_up(f"http://127.0.0.1:{args.port}/api/health", backend)
+    return [mock, backend]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end throughput benchmark')
+    parser.add_argument('--ballots', type=int, default=50, help='Ballots to analyze in total')
+    parser.add_argument('--concurrency', type=int, default=8, help='Ballots in flight at once')
+    parser.add_argument('--images', nargs='+', default=[os.path.join(TEST_DATA_DIR, 'test-ballot-1.png'),
+                                                        os.path.join(TEST_DATA_DIR, 'test-ballot-2.png')])
+    parser.add_argument('--contests', default=os.path.join(TEST_DATA_DIR, 'test-contest-data.txt'))
+    parser.add_argument('--execution-mode', default='interactive')
+    parser.add_argument('--use-cache', action='store_true', help='Allow result cache hits (off by default)')
+    parser.add_argument('--url', help='Benchmark a backend that is already running instead of starting one')
+    parser.add_argument('--backend-pid', type=int, help='PID of the --url backend, for peak RSS')
+    parser.add_argument('--port', type=int, default=5050, help='Port for the backend started by the benchmark')
+    parser.add_argument('--engine', choices=('threads', 'asyncio'), default='threads',
+                        help='ANALYSIS_ENGINE of the backend started by the benchmark')
+    parser.add_argument('--analysis-workers', type=int, help='ANALYSIS_WORKERS (and twice as many AGENT_MAX_WORKERS) for the threads engine')
+    parser.add_argument('--queue-size', type=int, default=1000, help='ANALYSIS_QUEUE_SIZE of the started backend')
+    parser.add_argument('--poll-interval', type=float, default=0,
+                        help='Poll job status every N seconds instead of long-polling')
+    parser.add_argument('--mock-port', type=int, default=5051)
+    parser.add_argument('--mock-latency', default='lognormal:2.0,0.4')
+    parser.add_argument('--mock-error-rate', type=float, default=0.0)
+    parser.add_argument('--mock-rate-limit-rate', type=float, default=0.0)
+    parser.add_argument('--mock-rpm-limit', type=int, default=0)
+    args = parser.parse_args()
+
+    images = []
+    for path in args.images:
+        with open(path, 'rb') as f:
+            images.append({'name': os.path.basename(path), 'data': f.read()})
+    with open(args.contests, 'r', encoding='utf-8') as f:
+        contest_text = f.read()
+
+    scratch_dir = tempfile.mkdtemp(prefix='load-test-')
+    processes = []
+    try:
+        if args.url:
+            base_url, backend_pid = args.url.rstrip('/'), args.backend_pid
+        else:
+            processes = start_servers(args, scratch_dir)
+            base_url, backend_pid = f"http://127.0.0.1:{args.port}", processes[1].pid
+
+        contest_data_id = request_json(f"{base_url}/api/upload-contests", {'text': contest_text})['data_id']
+
+        samples = []
+        outcomes = {}
+        lock = threading.Lock()
+        counter = iter(range(args.ballots))
+
+        def worker():
+            while True:
+                with lock:
+                    index = next(counter, None)
+                if index is None:
+                    return
+                try:
+                    outcome, timings = run_ballot(base_url, images[index % len(images)], contest_data_id, args)
+                except Exception as e:
+                    outcome, timings = f"failed: {e}", None
+                with lock:
+                    outcomes[outcome] = outcomes.get(outcome, 0) + 1
+                    if timings:
+                        samples.append(timings)
+
+        peak = {}
+        stop_sampling = threading.Event()
+        if backend_pid:
+            threading.Thread(target=sample_peak_threads, args=(backend_pid, stop_sampling, peak),
+                             daemon=True).start()
+        threads = [threading.Thread(target=worker) for _ in range(args.concurrency)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - started
+        stop_sampling.set()
+
+        report = summarize(samples, wall, outcomes, peak_rss_kb(backend_pid) if backend_pid else None,
+                           peak.get('threads'))
+        report['concurrency'] = args.concurrency
+        if not args.url:
+            report['engine'] = args.engine
+        print(json.dumps(report, indent=2))
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait(timeout=10)
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,494 @@
+"""
+Local stand-in for the parts of the OpenAI API used by the backend.
+
+Implements chat completions (blocking and streamed) and the Files and Batch
+endpoints, so every execution mode can be exercised and load-tested without an
+OpenAI account. Chat completions replay answers recorded in the backend's
+openai-sessions logs when there are any (canned answers otherwise), after a
+configurable latency, and can inject server errors and 429 rate limits.
+Usage reports cached prompt tokens for prefixes it has already seen, roughly
+as OpenAI's prompt cache would.
+Point the backend at it with:
+
+    python mock_openai_server.py --port 5001 --latency lognormal:2.5,0.4 --rate-limit-rate 0.02
+    OPENAI_BASE_URL=http://localhost:5001/v1 python app.py
+"""
+from flask import Flask, request, jsonify, Response, stream_with_context
+from collections import deque
+import argparse
+import glob
+import gzip
+import hashlib
+import json
+import math
+import os
+import random
+import threading
+import time
+import uuid
+import yaml
+
+app = Flask(__name__)
+
+# Behaviour knobs (overridable from the command line)
+settings = {
+    'batch_delay': 5.0,       # seconds before a submitted batch completes
+    'batch_error_rate': 0.0,  # fraction of batch requests answered with an error
+    'latency': 'fixed:1.0',   # chat completion latency distribution (see sample_latency)
+    'first_token_share': 0.3, # share of the latency spent before the first streamed token
+    'error_rate': 0.0,        # fraction of chat completions answered with a 500
+    'rate_limit_rate': 0.0,   # fraction of chat completions answered with a 429
+    'rpm_limit': 0,           # requests per minute before answering 429 (0 = unlimited)
+}
+
+files = {}
+batches = {}
+state_lock = threading.Lock()
+
+# Canned structured answers, one per agent
+CANNED_RESPONSES = {
+    'missing_ovals': """I examined each column of the ballot. Every candidate and choice has a voting oval.
+
+-- BEGIN STRUCTURED OUTPUT --
+findings:
+  missing_ovals: []
+  other_issues: []
+summary: "No issues detected. All candidates and choices have proper voting ovals."
+analysis_status: "no_issues_found"
+-- END STRUCTURED OUTPUT --""",
+    'spelling': """I compared every candidate name on the ballot with the official list.
+
+-- BEGIN STRUCTURED OUTPUT --
+findings:
+  spelling_errors: []
+  other_issues: []
+summary: "No spelling errors detected. All candidate names match the official list."
+analysis_status: "no_issues_found"
+-- END STRUCTURED OUTPUT --""",
+}
+
+# Canned answer to the spelling agent's transcribe engine (some of the names on test-data/test-ballot-1.png)
+CANNED_TRANSCRIPTION = json.dumps({'contests': [
+    {'title': 'State Superintendent', 'candidates': ['Brittany Kinser', 'Jill Underly']},
+    {'title': 'Justice of the Supreme Court', 'candidates': ['Brad Schimel', 'Susan Crawford']},
+    {'title': 'County Executive', 'candidates': ['Stephen W. Ratzlaff, Jr.', 'Melissa Agard']}
+]})
+
+# Recorded answers per agent, loaded from session logs at startup
+replay_responses = {}
+request_times = deque()
+
+# Prompt cache: chained hashes of every prompt prefix seen, in blocks of PROMPT_CACHE_BLOCK_TOKENS
+PROMPT_CACHE_BLOCK_TOKENS = 128
+PROMPT_CACHE_MIN_TOKENS = 1024
+PROMPT_CACHE_MAX_ENTRIES = 1_000_000
+prompt_prefixes = set()
+
+def read_log_entries(path):
+    """Entries of a backend session log (JSON lines or the older '---'-separated format, optionally gzipped)"""
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        content = f.read()
+    entries = []
+    for chunk in content.split('\n---\n'):
+        chunk = chunk.strip()
+        if not chunk:
+            continue
+        try:
+            entries.append(json.loads(chunk))
+            continue
+        except json.JSONDecodeError:
+            pass
+        for line in chunk.splitlines():
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return entries
+
+def load_replay_responses(sessions_dir):
+    """
+    Collect the answers recorded in session logs, keyed by agent
+
+    Agents run concurrently, so requests and responses interleave in a log;
+    each response is attributed by the findings key its structured output uses.
+
+    Returns:
+        Number of responses loaded
+    """
+    loaded = 0
+    paths = glob.glob(os.path.join(sessions_dir, '*.log')) + glob.glob(os.path.join(sessions_dir, '*.log.gz'))
+    for path in paths:
+        try:
+            entries = read_log_entries(path)
+        except (OSError, UnicodeDecodeError):
+            continue
+        for entry in entries:
+            data = entry.get('data')
+            if entry.get('event_type') != 'response' or not isinstance(data, dict):
+                continue
+            try:
+                content = data['choices'][0]['message']['content']
+            except (KeyError, IndexError, TypeError):
+                continue
+            if not content or '-- BEGIN STRUCTURED OUTPUT --' not in content:
+                continue
+            agent = 'spelling' if 'spelling_errors:' in content else 'missing_ovals'
+            replay_responses.setdefault(agent, []).append({'content': content, 'usage': data.get('usage')})
+            loaded += 1
+    return loaded
+
+def sample_latency():
+    """
+    Draw a chat completion latency in seconds from settings['latency']:
+    fixed:S, uniform:LOW,HIGH, normal:MEAN,STDDEV or lognormal:MEDIAN,SIGMA
+    """
+    kind, _, params = settings['latency'].partition(':')
+    values = [float(value) for value in params.split(',') if value]
+    if kind == 'uniform':
+        return random.uniform(values[0], values[1])
+    if kind == 'normal':
+        return max(0.0, random.gauss(values[0], values[1]))
+    if kind == 'lognormal':
+        return random.lognormvariate(math.log(values[0]), values[1])
+    return values[0] if values else 0.0
+
+def rate_limit_headers(remaining):
+    limit = settings['rpm_limit'] or 10000
+    return {
+        'x-ratelimit-limit-requests': str(limit),
+        'x-ratelimit-remaining-requests': str(max(0, remaining)),
+        'x-ratelimit-reset-requests': '1s',
+        # Token limits are not simulated; report a budget no test run will reach
+        'x-ratelimit-limit-tokens': '100000000',
+        'x-ratelimit-remaining-tokens': '100000000',
+        'x-ratelimit-reset-tokens': '0s'
+    }
+
+def check_rate_limit():
+    """
+    Apply the requests-per-minute limit and the injected 429 rate
+
+    Returns:
+        Tuple of (rejected, remaining requests in the current minute)
+    """
+    now = time.time()
+    with state_lock:
+        while request_times and now - request_times[0] >= 60:
+            request_times.popleft()
+        if settings['rpm_limit'] and len(request_times) >= settings['rpm_limit']:
+            return True, 0
+        request_times.append(now)
+        remaining = (settings['rpm_limit'] or 10000) - len(request_times)
+    return random.random() < settings['rate_limit_rate'], remaining
+
+def detect_agent(custom_id, body):
+    """Work out which agent a request came from (custom_id is '<job_id>:<agent>')"""
+    if custom_id and ':' in custom_id:
+        agent = custom_id.rsplit(':', 1)[1]
+        if agent in CANNED_RESPONSES:
+            return agent
+    text = json.dumps(body.get('messages', [])).lower()
+    return 'spelling' if 'official' in text else 'missing_ovals'
+
+def pick_response(agent, body=None):
+    """
+    A recorded answer for the agent when there is one, the canned answer otherwise
+
+    Requests with a json_schema response_format get the answer's structured
+    block as a JSON object, as the real API would return; transcription
+    requests get CANNED_TRANSCRIPTION.
+    """
+    response_format = (body or {}).get('response_format') or {}
+    if (response_format.get('json_schema') or {}).get('name') == 'spelling_transcription':
+        return {'content': CANNED_TRANSCRIPTION, 'usage': None}
+    recorded = replay_responses.get(agent)
+    answer = random.choice(recorded) if recorded else {'content': CANNED_RESPONSES[agent], 'usage': None}
+    if response_format.get('type') == 'json_schema':
+        answer = {'content': as_json_answer(answer['content']), 'usage': None}
+    return answer
+
+def as_json_answer(content):
+    """The YAML structured block of an answer re-encoded as a schema-conforming JSON object"""
+    block = content.split('-- BEGIN STRUCTURED OUTPUT --', 1)[-1].split('-- END STRUCTURED OUTPUT --', 1)[0]
+    data = yaml.safe_load(block)
+    findings = {key: [{field: str(value) for field, value in item.items()} for item in (items or [])]
+                for key, items in data['findings'].items()}
+    return json.dumps({
+        'findings': findings,
+        'summary': data.get('summary', ''),
+        'analysis_status': data.get('analysis_status', 'completed'),
+        'notes': None
+    })
+
+def cached_prompt_tokens(prompt):
+    """
+    Tokens of the longest prefix of the prompt seen in an earlier request, counted
+    in whole blocks and only from PROMPT_CACHE_MIN_TOKENS up (about 4 characters a token)
+    """
+    block_chars = PROMPT_CACHE_BLOCK_TOKENS * 4
+    digest = hashlib.blake2b(digest_size=16)
+    cached_blocks = 0
+    with state_lock:
+        if len(prompt_prefixes) > PROMPT_CACHE_MAX_ENTRIES:
+            prompt_prefixes.clear()
+        for start in range(0, len(prompt) - block_chars + 1, block_chars):
+            digest.update(prompt[start:start + block_chars].encode('utf-8'))
+            key = digest.digest()
+            if key in prompt_prefixes and cached_blocks == start // block_chars:
+                cached_blocks += 1
+            prompt_prefixes.add(key)
+    cached_tokens = cached_blocks * PROMPT_CACHE_BLOCK_TOKENS
+    return cached_tokens if cached_tokens >= PROMPT_CACHE_MIN_TOKENS else 0
+
+def build_usage(body, content, recorded_usage=None):
+    prompt = json.dumps(body.get('messages', []))
+    cached_tokens = cached_prompt_tokens(prompt)
+    if recorded_usage:
+        usage = dict(recorded_usage)
+        usage['prompt_tokens_details'] = dict(usage.get('prompt_tokens_details') or {},
+                                              cached_tokens=min(cached_tokens, usage.get('prompt_tokens') or 0))
+        return usage
+    prompt_tokens = len(prompt) // 4
+    completion_tokens = len(content) // 4
+    return {
+        'prompt_tokens': prompt_tokens,
+        'completion_tokens': completion_tokens,
+        'total_tokens': prompt_tokens + completion_tokens,
+        'prompt_tokens_details': {'cached_tokens': cached_tokens}
+    }
+
+def build_chat_completion(body, content, usage=None):
+    """Build a chat.completion object in the shape the OpenAI API returns"""
+    return {
+        'id': f"chatcmpl-{uuid.uuid4().hex[:24]}",
+        'object': 'chat.completion',
+        'created': int(time.time()),
+        'model': body.get('model', 'gpt-4o'),
+        'choices': [{
+            'index': 0,
+            'message': {'role': 'assistant', 'content': content},
+            'finish_reason': 'stop'
+        }],
+        'usage': build_usage(body, content, usage)
+    }
+
+def stream_chat_completion(body, content, usage, latency):
+    """Yield a streamed chat completion as server-sent events, spread over the latency"""
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+    created = int(time.time())
+    pieces = [content[i:i + 16] for i in range(0, len(content), 16)] or ['']
+    time.sleep(latency * settings['first_token_share'])
+    delay = latency * (1 - settings['first_token_share']) / len(pieces)
+
+    def chunk(delta, finish_reason=None, chunk_usage=None):
+        return 'data: ' + json.dumps({
+            'id': completion_id,
+            'object': 'chat.completion.chunk',
+            'created': created,
+            'model': body.get('model', 'gpt-4o'),
+            'choices': [] if chunk_usage else [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}],
+            'usage': chunk_usage
+        }) + '\n\n'
+
+    yield chunk({'role': 'assistant', 'content': ''})
+    for piece in pieces:
+        yield chunk({'content': piece})
+        time.sleep(delay)
+    yield chunk({}, finish_reason='stop')
+    if (body.get('stream_options') or {}).get('include_usage'):
+        yield chunk(None, chunk_usage=build_usage(body, content, usage))
+    yield 'data: [DONE]\n\n'
+
+def file_object(file_id):
+    info = files[file_id]
+    return {
+        'id': file_id,
+        'object': 'file',
+        'bytes': len(info['content']),
+        'created_at': info['created_at'],
+        'filename': info['filename'],
+        'purpose': info['purpose'],
+        'status': 'processed'
+    }
+
+def store_file(content, filename, purpose):
+    file_id = f"file-{uuid.uuid4().hex[:24]}"
+    with state_lock:
+        files[file_id] = {
+            'content': content,
+            'filename': filename,
+            'purpose': purpose,
+            'created_at': int(time.time())
+        }
+    return file_id
+
+def run_batch(batch_id):
+    """Answer every request in a batch after the configured delay"""
+    time.sleep(settings['batch_delay'])
+    with state_lock:
+        batch = batches[batch_id]
+        if batch['status'] == 'cancelling':
+            batch['status'] = 'cancelled'
+            return
+        batch['status'] = 'in_progress'
+        batch['in_progress_at'] = int(time.time())
+        input_content = files[batch['input_file_id']]['content'].decode('utf-8')
+
+    output_lines = []
+    error_lines = []
+    for line in input_content.splitlines():
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        custom_id = record['custom_id']
+        result = {'id': f"batch_req_{uuid.uuid4().hex[:24]}", 'custom_id': custom_id}
+        if random.random() < settings['batch_error_rate']:
+            result['response'] = {
+                'status_code': 500,
+                'request_id': uuid.uuid4().hex,
+                'body': {'error': {'message': 'Simulated server error', 'type': 'server_error'}}
+            }
+            result['error'] = None
+            error_lines.append(json.dumps(result))
+        else:
+            answer = pick_response(detect_agent(custom_id, record['body']), record['body'])
+            result['response'] = {
+                'status_code': 200,
+                'request_id': uuid.uuid4().hex,
+                'body': build_chat_completion(record['body'], answer['content'], answer['usage'])
+            }
+            result['error'] = None
+            output_lines.append(json.dumps(result))
+
+    output_file_id = store_file('\n'.join(output_lines).encode('utf-8'), f"{batch_id}_output.jsonl", 'batch_output')
+    error_file_id = None
+    if error_lines:
+        error_file_id = store_file('\n'.join(error_lines).encode('utf-8'), f"{batch_id}_error.jsonl", 'batch_output')
+
+    with state_lock:
+        batch.update({
+            'status': 'completed',
+            'output_file_id': output_file_id,
+            'error_file_id': error_file_id,
+            'completed_at': int(time.time()),
+            'request_counts': {
+                'total': len(output_lines) + len(error_lines),
+                'completed': len(output_lines),
+                'failed': len(error_lines)
+            }
+        })
+
+@app.route('/v1/chat/completions', methods=['POST'])
+def chat_completions():
+    body = request.get_json() or {}
+    rejected, remaining = check_rate_limit()
+    headers = rate_limit_headers(remaining)
+    if rejected:
+        headers['retry-after'] = '1'
+        return jsonify({'error': {
+            'message': 'Rate limit reached for requests (simulated)',
+            'type': 'requests',
+            'code': 'rate_limit_exceeded'
+        }}), 429, headers
+    if random.random() < settings['error_rate']:
+        return jsonify({'error': {'message': 'Simulated server error', 'type': 'server_error'}}), 500, headers
+
+    answer = pick_response(detect_agent(None, body), body)
+    latency = sample_latency()
+    if body.get('stream'):
+        return Response(stream_with_context(stream_chat_completion(body, answer['content'], answer['usage'], latency)),
+                        mimetype='text/event-stream', headers=headers)
+    time.sleep(latency)
+    return jsonify(build_chat_completion(body, answer['content'], answer['usage'])), 200, headers
+
+@app.route('/v1/files', methods=['POST'])
+def create_file():
+    upload = request.files.get('file')
+    if upload is None:
+        return jsonify({'error': {'message': 'file is required', 'type': 'invalid_request_error'}}), 400
+    file_id = store_file(upload.read(), upload.filename or 'upload.jsonl', request.form.get('purpose', 'batch'))
+    return jsonify(file_object(file_id))
+
+@app.route('/v1/files/<file_id>', methods=['GET'])
+def retrieve_file(file_id):
+    if file_id not in files:
+        return jsonify({'error': {'message': 'No such file', 'type': 'invalid_request_error'}}), 404
+    return jsonify(file_object(file_id))
+
+@app.route('/v1/files/<file_id>/content', methods=['GET'])
+def file_content(file_id):
+    if file_id not in files:
+        return jsonify({'error': {'message': 'No such file', 'type': 'invalid_request_error'}}), 404
+    return Response(files[file_id]['content'], mimetype='application/jsonl')
+
+@app.route('/v1/batches', methods=['POST'])
+def create_batch():
+    data = request.get_json()
+    if not data or data.get('input_file_id') not in files:
+        return jsonify({'error': {'message': 'input_file_id not found', 'type': 'invalid_request_error'}}), 400
+
+    batch_id = f"batch_{uuid.uuid4().hex[:24]}"
+    now = int(time.time())
+    with state_lock:
+        batches[batch_id] = {
+            'id': batch_id,
+            'object': 'batch',
+            'endpoint': data.get('endpoint', '/v1/chat/completions'),
+            'errors': None,
+            'input_file_id': data['input_file_id'],
+            'completion_window': data.get('completion_window', '24h'),
+            'status': 'validating',
+            'output_file_id': None,
+            'error_file_id': None,
+            'created_at': now,
+            'in_progress_at': None,
+            'expires_at': now + 24 * 3600,
+            'completed_at': None,
+            'request_counts': {'total': 0, 'completed': 0, 'failed': 0},
+            'metadata': data.get('metadata')
+        }
+    threading.Thread(target=run_batch, args=(batch_id,), daemon=True).start()
+    return jsonify(batches[batch_id])
+
+@app.route('/v1/batches/<batch_id>', methods=['GET'])
+def retrieve_batch(batch_id):
+    if batch_id not in batches:
+        return jsonify({'error': {'message': 'No such batch', 'type': 'invalid_request_error'}}), 404
+    return jsonify(batches[batch_id])
+
+@app.route('/v1/batches/<batch_id>/cancel', methods=['POST'])
+def cancel_batch(batch_id):
+    if batch_id not in batches:
+        return jsonify({'error': {'message': 'No such batch', 'type': 'invalid_request_error'}}), 404
+    with state_lock:
+        if batches[batch_id]['status'] in ('validating', 'in_progress'):
+            batches[batch_id]['status'] = 'cancelling'
+    return jsonify(batches[batch_id])
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local stand-in for the OpenAI API')
+    parser.add_argument('--port', type=int, default=5001)
+    parser.add_argument('--batch-delay', type=float, default=settings['batch_delay'],
+                        help='Seconds before a submitted batch completes')
+    parser.add_argument('--batch-error-rate', type=float, default=settings['batch_error_rate'],
+                        help='Fraction of batch requests answered with an error')
+    parser.add_argument('--latency', default=settings['latency'],
+                        help='Chat completion latency: fixed:S, uniform:LOW,HIGH, normal:MEAN,STDDEV or lognormal:MEDIAN,SIGMA')
+    parser.add_argument('--error-rate', type=float, default=settings['error_rate'],
+                        help='Fraction of chat completions answered with a 500')
+    parser.add_argument('--rate-limit-rate', type=float, default=settings['rate_limit_rate'],
+                        help='Fraction of chat completions answered with a 429')
+    parser.add_argument('--rpm-limit', type=int, default=settings['rpm_limit'],
+                        help='Chat completions per minute before answering 429 (0 = unlimited)')
+    parser.add_argument('--replay-dir', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'openai-sessions'),
+                        help='Session log directory to replay recorded answers from')
+    args = parser.parse_args()
+    settings['batch_delay'] = args.batch_delay
+    settings['batch_error_rate'] = args.batch_error_rate
+    settings['latency'] = args.latency
+    settings['error_rate'] = args.error_rate
+    settings['rate_limit_rate'] = args.rate_limit_rate
+    settings['rpm_limit'] = args.rpm_limit
+    print(f"Loaded {load_replay_responses(args.replay_dir)} recorded responses from {args.replay_dir}")
+    app.run(host='127.0.0.1', port=args.port, threaded=True)